@@ -0,0 +1,86 @@
+"""
+Agendador de Remarketing - Plena Saúde
+Fila de prioridade por horário previsto, para tocar apenas os leads cujo envio já venceu
+"""
+
+import heapq
+import itertools
+
+
+class AgendadorRemarketing:
+    """Agenda o próximo envio de remarketing de cada telefone.
+
+    Cada telefone tem no máximo um agendamento válido; reagendar ou cancelar apenas
+    invalida a entrada antiga no heap (remoção preguiçosa), que é descartada quando
+    chega ao topo ou quando o heap é compactado.
+    """
+
+    def __init__(self):
+        self._heap = []          # (instante, sequencia, telefone)
+        self._agendados = {}     # telefone -> (instante, sequencia) válido
+        self._sequencia = itertools.count()
+
+    def agendar(self, telefone, instante):
+        """Agenda (ou reagenda) o próximo envio do telefone para o instante informado"""
+        sequencia = next(self._sequencia)
+        self._agendados[telefone] = (instante, sequencia)
+        heapq.heappush(self._heap, (instante, sequencia, telefone))
+        self._compactar_se_necessario()
+
+    # Reagendar é o mesmo que agendar: a entrada anterior fica inválida
+    reagendar = agendar
+
+    def cancelar(self, telefone):
+        """Remove o agendamento do telefone, se existir"""
+        if self._agendados.pop(telefone, None) is not None:
+            self._compactar_se_necessario()
+
+    def instante_agendado(self, telefone):
+        """Retorna o instante agendado para o telefone (ou None)"""
+        agendamento = self._agendados.get(telefone)
+        return agendamento[0] if agendamento else None
+
+    def vencidos(self, agora):
+        """Remove e retorna os telefones com envio vencido (instante < agora), do mais antigo ao mais novo"""
+        return list(self.iterar_vencidos(agora))
+
+    def iterar_vencidos(self, agora):
+        """Como ``vencidos``, mas remove e entrega um telefone de cada vez.
+
+        Agendamentos feitos durante a iteração para instantes anteriores a ``agora``
+        também são entregues.
+        """
+        # self._heap é relido a cada volta: agendar durante a iteração pode compactá-lo
+        while self._heap and self._heap[0][0] < agora:
+            instante, sequencia, telefone = heapq.heappop(self._heap)
+            if self._agendados.get(telefone) == (instante, sequencia):
+                del self._agendados[telefone]
+                yield telefone
+
+    def proximos_envios(self, limite):
+        """Retorna até ``limite`` pares (telefone, instante) em ordem de vencimento, sem removê-los"""
+        resultado = []
+        heap = self._heap
+        candidatos = [(heap[0], 0)] if heap else []
+        # Percorre a árvore do heap em ordem (melhor primeiro), tocando só O(limite) nós válidos
+        while candidatos and len(resultado) < limite:
+            (instante, sequencia, telefone), posicao = heapq.heappop(candidatos)
+            if self._agendados.get(telefone) == (instante, sequencia):
+                resultado.append((telefone, instante))
+            for filho in (2 * posicao + 1, 2 * posicao + 2):
+                if filho < len(heap):
+                    heapq.heappush(candidatos, (heap[filho], filho))
+        return resultado
+
+    def _compactar_se_necessario(self):
+        """Reconstrói o heap quando as entradas inválidas passam a dominar"""
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._agendados):
+            self._heap = [(instante, sequencia, telefone)
+                          for telefone, (instante, sequencia) in self._agendados.items()]
+            heapq.heapify(self._heap)
+
+    def __contains__(self, telefone):
+        return telefone in self._agendados
+
+    def __len__(self):
+        return len(self._agendados)
@@ -0,0 +1,211 @@
+"""
+Armazenamento Persistente de Sessões - Plena Saúde
+Backends de armazenamento (memória e SQLite) e gravação adiada (write-behind) em lotes
+"""
+
+import atexit
+import json
+import sqlite3
+import threading
+import time
+
+
+class ArmazenamentoMemoria:
+    """Backend em memória, com a mesma interface do SQLite (usado em testes)"""
+
+    def __init__(self):
+        self.tabelas = {}
+        self.lotes_gravados = 0
+
+    def gravar_lote(self, tabela, alteracoes):
+        """Aplica {chave: (atualizado_em, registro)} de uma vez; registro None remove a chave"""
+        dados = self.tabelas.setdefault(tabela, {})
+        for chave, (atualizado_em, registro) in alteracoes.items():
+            if registro is None:
+                dados.pop(chave, None)
+            else:
+                # Cópia via JSON para ter o mesmo comportamento do SQLite
+                dados[chave] = (atualizado_em, json.dumps(registro, ensure_ascii=False))
+        self.lotes_gravados += 1
+
+    def ler(self, tabela, chave):
+        """Retorna o registro da chave (ou None)"""
+        item = self.tabelas.get(tabela, {}).get(chave)
+        return json.loads(item[1]) if item else None
+
+    def ler_recentes(self, tabela, desde=None):
+        """Gera (chave, registro) atualizados a partir de ``desde`` (todos se None)"""
+        for chave, (atualizado_em, texto) in list(self.tabelas.get(tabela, {}).items()):
+            if desde is None or atualizado_em >= desde:
+                yield chave, json.loads(texto)
+
+    def fechar(self):
+        pass
+
+
+class ArmazenamentoSQLite:
+    """Backend SQLite: uma tabela por tipo de registro, com chave primária (telefone)"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._trava = threading.Lock()
+        self._tabelas_criadas = set()
+        self.lotes_gravados = 0
+
+    def _garantir_tabela(self, tabela):
+        if tabela in self._tabelas_criadas:
+            return
+        if not tabela.isidentifier():
+            raise ValueError(f"Nome de tabela inválido: {tabela}")
+        self._conexao.execute(
+            f"CREATE TABLE IF NOT EXISTS {tabela} ("
+            "chave TEXT PRIMARY KEY, atualizado_em REAL NOT NULL, registro TEXT NOT NULL)")
+        self._conexao.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{tabela}_atualizado_em ON {tabela} (atualizado_em)")
+        self._tabelas_criadas.add(tabela)
+
+    def gravar_lote(self, tabela, alteracoes):
+        """Aplica {chave: (atualizado_em, registro)} em uma única transação; registro None remove"""
+        gravar = [(chave, atualizado_em, json.dumps(registro, ensure_ascii=False))
+                  for chave, (atualizado_em, registro) in alteracoes.items() if registro is not None]
+        remover = [(chave,) for chave, (_, registro) in alteracoes.items() if registro is None]
+        with self._trava, self._conexao:
+            self._garantir_tabela(tabela)
+            if gravar:
+                self._conexao.executemany(
+                    f"INSERT OR REPLACE INTO {tabela} (chave, atualizado_em, registro) VALUES (?, ?, ?)", gravar)
+            if remover:
+                self._conexao.executemany(f"DELETE FROM {tabela} WHERE chave = ?", remover)
+        self.lotes_gravados += 1
+
+    def ler(self, tabela, chave):
+        """Retorna o registro da chave (ou None)"""
+        with self._trava:
+            self._garantir_tabela(tabela)
+            linha = self._conexao.execute(f"SELECT registro FROM {tabela} WHERE chave = ?", (chave,)).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def ler_recentes(self, tabela, desde=None):
+        """Gera (chave, registro) atualizados a partir de ``desde`` (todos se None)"""
+        with self._trava:
+            self._garantir_tabela(tabela)
+            if desde is None:
+                linhas = self._conexao.execute(f"SELECT chave, registro FROM {tabela}").fetchall()
+            else:
+                linhas = self._conexao.execute(
+                    f"SELECT chave, registro FROM {tabela} WHERE atualizado_em >= ?", (desde,)).fetchall()
+        for chave, texto in linhas:
+            yield chave, json.loads(texto)
+
+    def fechar(self):
+        with self._trava:
+            self._conexao.close()
+
+
+class GravacaoAdiada:
+    """Acumula alterações e as grava em lote (write-behind).
+
+    Várias alterações da mesma chave antes da gravação viram uma só. O registro pode
+    ser passado como uma função sem argumentos, chamada apenas no momento da gravação,
+    de modo que uma sessão alterada por dez mensagens é serializada uma única vez.
+    A gravação acontece em uma thread própria, quando há ``tamanho_lote`` chaves
+    pendentes ou a mais antiga tem ``intervalo`` segundos, mesmo sem novas mensagens;
+    ``fechar`` (também chamado na saída do processo) grava o que falta.
+    """
+
+    def __init__(self, armazenamento, tamanho_lote=500, intervalo=1.0):
+        self.armazenamento = armazenamento
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self._pendentes = {}      # tabela -> {chave: (atualizado_em, registro ou função)}
+        self._quantidade_pendente = 0
+        self._primeira_pendente = None
+        # Sessões e remarketing podem marcar de threads diferentes; a gravação do lote
+        # também fica sob a trava para que um lote mais novo nunca seja gravado antes
+        self._trava = threading.RLock()
+        self._fechado = False
+
+        # Lotes que falharam na thread de gravação (as alterações do lote são perdidas)
+        self.erros = 0
+
+        self._acordar = threading.Event()
+        self._thread = threading.Thread(target=self._gravar_em_segundo_plano, name="gravacao-adiada",
+                                        daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    def marcar(self, tabela, chave, registro):
+        """Agenda a gravação do registro (ou a remoção, se registro for None)"""
+        with self._trava:
+            pendentes = self._pendentes.setdefault(tabela, {})
+            if chave not in pendentes:
+                self._quantidade_pendente += 1
+            pendentes[chave] = (time.time(), registro)
+            if self._primeira_pendente is None:
+                self._primeira_pendente = time.monotonic()
+                self._acordar.set()  # a thread passa a esperar pelo intervalo desta alteração
+            elif self._quantidade_pendente >= self.tamanho_lote:
+                self._acordar.set()
+
+    def _gravar_em_segundo_plano(self):
+        """Laço da thread de gravação: dorme até o lote encher ou a pendência mais antiga vencer"""
+        while not self._fechado:
+            with self._trava:
+                if self._quantidade_pendente >= self.tamanho_lote:
+                    espera = 0
+                elif self._primeira_pendente is None:
+                    espera = None
+                else:
+                    espera = self._primeira_pendente + self.intervalo - time.monotonic()
+            if espera is None or espera > 0:
+                self._acordar.wait(espera)
+                self._acordar.clear()
+                continue
+            try:
+                self.descarregar()
+            except Exception:
+                # A thread continua viva para os próximos lotes
+                self.erros += 1
+
+    def ler(self, tabela, chave):
+        """Lê o registro, considerando as alterações ainda não gravadas"""
+        with self._trava:
+            pendente = self._pendentes.get(tabela, {}).get(chave)
+            if pendente is not None:
+                registro = pendente[1]
+                return registro() if callable(registro) else registro
+            return self.armazenamento.ler(tabela, chave)
+
+    def ler_recentes(self, tabela, desde=None):
+        """Grava as pendências e lê os registros recentes do armazenamento"""
+        self.descarregar()
+        return self.armazenamento.ler_recentes(tabela, desde)
+
+    def descarregar(self):
+        """Grava imediatamente todas as alterações pendentes, um lote por tabela"""
+        with self._trava:
+            pendentes, self._pendentes = self._pendentes, {}
+            self._quantidade_pendente = 0
+            self._primeira_pendente = None
+            for tabela, alteracoes in pendentes.items():
+                lote = {chave: (atualizado_em, registro() if callable(registro) else registro)
+                        for chave, (atualizado_em, registro) in alteracoes.items()}
+                self.armazenamento.gravar_lote(tabela, lote)
+
+    @property
+    def pendentes(self):
+        return self._quantidade_pendente
+
+    def fechar(self):
+        """Encerra a thread de gravação, grava as pendências e fecha o armazenamento"""
+        if self._fechado:
+            return
+        self._fechado = True
+        atexit.unregister(self.fechar)
+        self._acordar.set()
+        self._thread.join()
+        self.descarregar()
+        self.armazenamento.fechar()
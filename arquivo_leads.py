@@ -0,0 +1,313 @@
+"""
+Arquivo de Leads em Remarketing - Plena Saúde
+Registros de tamanho fixo em um arquivo mapeado em memória (mmap), para acompanhar milhões de leads inativos
+"""
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+from collections import namedtuple
+from collections.abc import MutableMapping
+
+from sessoes import TEXTOS, Coparticipacao, Estado, TipoCobertura, TipoPlano, codificar
+
+MAGICO = b"PLNLEAD2"
+
+# Cabeçalho: identificador, capacidade (registros), ocupados, removidos,
+# bytes do arquivo de dados ainda referenciados por algum registro
+_CABECALHO = struct.Struct("<8sQQQQ")
+TAMANHO_CABECALHO = 64
+
+# Registro de um lead (104 bytes). Os três primeiros campos vêm antes para que a
+# varredura da agenda leia só situação, telefone e próximo envio de cada registro.
+# O valor da cotação fica em centavos de 64 bits (grupos PME grandes passam de R$ 42 milhões).
+_REGISTRO = struct.Struct("<B20sdddBBBBBHQ32sQI")
+_VARREDURA = struct.Struct(f"<B20sd{_REGISTRO.size - struct.calcsize('<B20sd')}x")
+_PROXIMO_ENVIO = struct.calcsize("<B20s")
+_ULTIMA_TENTATIVA = struct.calcsize("<B20sd")
+_TENTATIVAS = struct.calcsize("<B20sdddB")
+_DOUBLE = struct.Struct("<d")
+_BYTE = struct.Struct("<B")
+
+# Registros copiados do mapeamento por vez na varredura
+REGISTROS_POR_BLOCO = 4096
+
+# Situação de cada posição da tabela
+LIVRE, OCUPADO, REMOVIDO = 0, 1, 2
+
+# Ocupação máxima (incluindo removidos) antes de dobrar a capacidade
+CARGA_MAXIMA = 0.7
+
+# O arquivo de dados é compactado quando as versões antigas de dados_cliente passam
+# desta fração do arquivo (e o arquivo tem ao menos COMPACTAR_A_PARTIR bytes)
+FRACAO_DADOS_MORTOS = 0.5
+COMPACTAR_A_PARTIR = 1 << 20
+
+ResumoLead = namedtuple("ResumoLead", [
+    "telefone", "estado", "tentativas", "nome", "ultima_interacao", "ultima_tentativa", "proximo_envio",
+    "tipo_plano", "tipo_cobertura", "coparticipacao", "quantidade_vidas", "valor_mensal",
+])
+
+
+def _hash(telefone):
+    """Hash de 64 bits estável entre execuções (o arquivo sobrevive ao processo)"""
+    return int.from_bytes(hashlib.blake2b(telefone, digest_size=8).digest(), "big")
+
+
+def _texto_fixo(texto, tamanho):
+    """Codifica em UTF-8 cortando em até ``tamanho`` bytes sem partir caracteres"""
+    dados = texto.encode("utf-8")
+    if len(dados) <= tamanho:
+        return dados
+    return dados[:tamanho].decode("utf-8", "ignore").encode("utf-8")
+
+
+class ArquivoLeads(MutableMapping):
+    """Leads em remarketing guardados em um arquivo de registros fixos mapeado em memória.
+
+    Funciona como um dicionário telefone -> {"dados_cliente", "estado",
+    "ultima_tentativa"} (o registro de um lead do MotorRemarketing), mas nada fica no heap: o arquivo é uma tabela hash
+    (sondagem linear) com um registro de 104 bytes por lead, contendo telefone, código
+    do estado, tentativas, instantes e um resumo da cotação. O ``dados_cliente``
+    completo vai para um arquivo auxiliar (``caminho + ".dados"``) e só é lido quando
+    o cliente volta a conversar; cada atualização anexa uma nova versão, e o arquivo
+    auxiliar é compactado sozinho quando as versões antigas passam da metade dele.
+    O ciclo de remarketing usa ``ler_resumo``, ``registrar_tentativa`` e ``vencendo``,
+    que leem e escrevem direto no mapeamento.
+    """
+
+    def __init__(self, caminho, capacidade=1024):
+        self.caminho = caminho
+        self.caminho_dados = caminho + ".dados"
+        if not os.path.exists(caminho):
+            self._criar(caminho, max(16, 1 << (capacidade - 1).bit_length()))
+        self._abrir()
+
+    @staticmethod
+    def _criar(caminho, capacidade):
+        with open(caminho, "wb") as arquivo:
+            arquivo.write(_CABECALHO.pack(MAGICO, capacidade, 0, 0, 0).ljust(TAMANHO_CABECALHO, b"\0"))
+            arquivo.truncate(TAMANHO_CABECALHO + capacidade * _REGISTRO.size)
+
+    def _abrir(self):
+        self._arquivo = open(self.caminho, "r+b")
+        self._mapa = mmap.mmap(self._arquivo.fileno(), 0)
+        magico, self.capacidade, self._ocupados, self._removidos, self._bytes_vivos = _CABECALHO.unpack_from(
+            self._mapa, 0)
+        if magico != MAGICO:
+            raise ValueError(f"Arquivo de leads inválido ou de outra versão: {self.caminho}")
+        self._dados = open(self.caminho_dados, "a+b")
+        self._tamanho_dados = self._dados.seek(0, os.SEEK_END)
+
+    def _gravar_cabecalho(self):
+        _CABECALHO.pack_into(self._mapa, 0, MAGICO, self.capacidade, self._ocupados, self._removidos,
+                             self._bytes_vivos)
+
+    def _posicao(self, indice):
+        return TAMANHO_CABECALHO + indice * _REGISTRO.size
+
+    def _localizar(self, chave):
+        """Retorna (posição do registro ou None, posição livre para inserir)"""
+        mapa = self._mapa
+        indice = _hash(chave) % self.capacidade
+        livre = None
+        while True:
+            posicao = self._posicao(indice)
+            situacao = mapa[posicao]
+            if situacao == LIVRE:
+                return None, (livre if livre is not None else posicao)
+            if situacao == REMOVIDO:
+                if livre is None:
+                    livre = posicao
+            elif mapa[posicao + 1:posicao + 1 + len(chave)] == chave and (
+                    len(chave) == 20 or mapa[posicao + 1 + len(chave)] == 0):
+                return posicao, None
+            indice = (indice + 1) % self.capacidade
+
+    def _chave(self, telefone):
+        chave = telefone.encode("utf-8")
+        if not chave or len(chave) > 20:
+            raise ValueError(f"Telefone inválido para o arquivo de leads: {telefone!r}")
+        return chave
+
+    def _registro(self, telefone):
+        posicao, _ = self._localizar(self._chave(telefone))
+        if posicao is None:
+            raise KeyError(telefone)
+        return posicao
+
+    def _ler_dados(self, posicao_dados, tamanho_dados):
+        self._dados.flush()
+        return json.loads(os.pread(self._dados.fileno(), tamanho_dados, posicao_dados))
+
+    def _anexar_dados(self, dados):
+        texto = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+        posicao_dados = self._tamanho_dados
+        self._dados.write(texto)
+        self._tamanho_dados += len(texto)
+        return posicao_dados, len(texto)
+
+    # Interface de dicionário
+
+    def __getitem__(self, telefone):
+        registro = _REGISTRO.unpack_from(self._mapa, self._registro(telefone))
+        dados = self._ler_dados(registro[13], registro[14])
+        # As tentativas são atualizadas só no registro fixo
+        dados["tentativas_remarketing"] = registro[6]
+        return {"dados_cliente": dados, "estado": TEXTOS[Estado][registro[5]], "ultima_tentativa": registro[3]}
+
+    def __setitem__(self, telefone, lead):
+        chave = self._chave(telefone)
+        dados = lead["dados_cliente"]
+        estado = codificar(Estado, lead["estado"])
+        cotacao = dados.get("cotacao") or {}
+        valor_mensal = cotacao.get("valor_mensal")
+
+        posicao, livre = self._localizar(chave)
+        if posicao is None:
+            if self._ocupados + self._removidos + 1 > self.capacidade * CARGA_MAXIMA:
+                self._reconstruir(self.capacidade * 2)
+                return self.__setitem__(telefone, lead)
+            if self._mapa[livre] == REMOVIDO:
+                self._removidos -= 1
+            self._ocupados += 1
+            posicao, proximo_envio, tamanho_anterior = livre, math.inf, 0  # ainda sem agendamento
+        else:
+            proximo_envio = _DOUBLE.unpack_from(self._mapa, posicao + _PROXIMO_ENVIO)[0]
+            tamanho_anterior = _REGISTRO.unpack_from(self._mapa, posicao)[14]
+
+        posicao_dados, tamanho_dados = self._anexar_dados(dados)
+        self._bytes_vivos += tamanho_dados - tamanho_anterior
+        self._gravar_cabecalho()
+        _REGISTRO.pack_into(
+            self._mapa, posicao, OCUPADO, chave, proximo_envio, lead["ultima_tentativa"],
+            dados.get("ultima_interacao", 0.0), estado, min(dados.get("tentativas_remarketing", 0), 255),
+            codificar(TipoPlano, dados.get("tipo_plano", "")),
+            codificar(TipoCobertura, dados.get("tipo_cobertura", "intermediario")),
+            codificar(Coparticipacao, dados.get("coparticipacao", "sem")),
+            min(dados.get("quantidade_vidas", 0), 0xFFFF),
+            round(valor_mensal * 100) if valor_mensal is not None else 0,
+            _texto_fixo(dados.get("nome", ""), 32), posicao_dados, tamanho_dados)
+        self._compactar_se_necessario()
+
+    def __delitem__(self, telefone):
+        posicao = self._registro(telefone)
+        self._mapa[posicao] = REMOVIDO
+        self._ocupados -= 1
+        self._removidos += 1
+        self._bytes_vivos -= _REGISTRO.unpack_from(self._mapa, posicao)[14]
+        self._gravar_cabecalho()
+        self._compactar_se_necessario()
+
+    def __contains__(self, telefone):
+        return self._localizar(self._chave(telefone))[0] is not None
+
+    def __iter__(self):
+        for situacao, chave, _ in self._varrer():
+            if situacao == OCUPADO:
+                yield chave.rstrip(b"\0").decode("utf-8")
+
+    def __len__(self):
+        return self._ocupados
+
+    def _varrer(self):
+        """Gera (situação, telefone, próximo envio) de cada registro, lendo o mapeamento em blocos.
+
+        Cada bloco é copiado antes de ser percorrido: nenhuma referência ao mapeamento fica
+        aberta entre um ``yield`` e outro, então compactar (que fecha e reabre o mapeamento)
+        durante a iteração não falha. Como num dict, alterar o arquivo durante a iteração
+        pode repetir ou omitir chaves.
+        """
+        tamanho_bloco = REGISTROS_POR_BLOCO * _REGISTRO.size
+        inicio = TAMANHO_CABECALHO
+        while inicio < len(self._mapa):
+            yield from _VARREDURA.iter_unpack(self._mapa[inicio:inicio + tamanho_bloco])
+            inicio += tamanho_bloco
+
+    # Acesso direto aos registros, usado pelo ciclo de remarketing
+
+    def ler_resumo(self, telefone):
+        """Lê os campos fixos do lead direto do mapeamento (None se não estiver no arquivo)"""
+        posicao, _ = self._localizar(self._chave(telefone))
+        if posicao is None:
+            return None
+        (_, _, proximo_envio, ultima_tentativa, ultima_interacao, estado, tentativas, tipo_plano,
+         tipo_cobertura, coparticipacao, quantidade_vidas, centavos, nome, _, _) = _REGISTRO.unpack_from(
+            self._mapa, posicao)
+        return ResumoLead(telefone, TEXTOS[Estado][estado], tentativas, nome.rstrip(b"\0").decode("utf-8"),
+                          ultima_interacao, ultima_tentativa, proximo_envio, TEXTOS[TipoPlano][tipo_plano],
+                          TEXTOS[TipoCobertura][tipo_cobertura], TEXTOS[Coparticipacao][coparticipacao],
+                          quantidade_vidas, centavos / 100 if centavos else None)
+
+    def registrar_tentativa(self, telefone, instante):
+        """Soma uma tentativa de remarketing no próprio registro e retorna o novo total"""
+        posicao = self._registro(telefone)
+        tentativas = min(self._mapa[posicao + _TENTATIVAS] + 1, 255)
+        _BYTE.pack_into(self._mapa, posicao + _TENTATIVAS, tentativas)
+        _DOUBLE.pack_into(self._mapa, posicao + _ULTIMA_TENTATIVA, instante)
+        return tentativas
+
+    def agendar(self, telefone, instante):
+        """Grava o instante do próximo envio do lead"""
+        _DOUBLE.pack_into(self._mapa, self._registro(telefone) + _PROXIMO_ENVIO, instante)
+
+    def vencendo(self, ate):
+        """Lista (telefone, instante) dos leads com próximo envio antes de ``ate``"""
+        return [(chave.rstrip(b"\0").decode("utf-8"), instante)
+                for situacao, chave, instante in self._varrer()
+                if situacao == OCUPADO and instante < ate]
+
+    # Manutenção
+
+    def _reconstruir(self, capacidade):
+        """Regrava a tabela com outra capacidade, descartando removidos e dados antigos"""
+        caminho_novo = self.caminho + ".novo"
+        if os.path.exists(caminho_novo + ".dados"):
+            os.remove(caminho_novo + ".dados")
+        self._criar(caminho_novo, capacidade)
+        novo = ArquivoLeads(caminho_novo)
+        for indice in range(self.capacidade):
+            posicao = self._posicao(indice)
+            if self._mapa[posicao] != OCUPADO:
+                continue
+            registro = list(_REGISTRO.unpack_from(self._mapa, posicao))
+            self._dados.flush()
+            texto = os.pread(self._dados.fileno(), registro[14], registro[13])
+            registro[13] = novo._tamanho_dados
+            novo._dados.write(texto)
+            novo._tamanho_dados += len(texto)
+            novo._bytes_vivos += len(texto)
+            _, livre = novo._localizar(registro[1].rstrip(b"\0"))
+            _REGISTRO.pack_into(novo._mapa, livre, *registro)
+            novo._ocupados += 1
+        novo._gravar_cabecalho()
+        novo.fechar()
+
+        self.fechar()
+        os.replace(caminho_novo + ".dados", self.caminho_dados)
+        os.replace(caminho_novo, self.caminho)
+        self._abrir()
+
+    def compactar(self):
+        """Descarta registros removidos e versões antigas de dados_cliente"""
+        self._reconstruir(self.capacidade)
+
+    def _compactar_se_necessario(self):
+        """Compacta quando as versões antigas de dados_cliente passam a dominar o arquivo de dados"""
+        if (self._tamanho_dados >= COMPACTAR_A_PARTIR and
+                self._tamanho_dados - self._bytes_vivos > self._tamanho_dados * FRACAO_DADOS_MORTOS):
+            self.compactar()
+
+    def sincronizar(self):
+        """Força a gravação em disco das alterações"""
+        self._dados.flush()
+        os.fsync(self._dados.fileno())
+        self._mapa.flush()
+
+    def fechar(self):
+        self._dados.close()
+        self._mapa.close()
+        self._arquivo.close()
@@ -0,0 +1,184 @@
+"""
+Benchmark de Conversas de Ponta a Ponta - Plena Saúde
+Gerador de carga que reproduz conversas roteirizadas contra as variantes da IA vendedora
+
+Uso:
+    python benchmark_conversas.py --sessoes 2000 --concorrencia 200 --saida resultados.json
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import ia_vendedora_integrada
+import ia_vendedora_modo_teste
+import ia_vendedora_remarketing
+from benchmark_cotacao import percentil
+from sessoes import GerenciadorSessoes, decodificar
+from sistema_cotacao import SistemaCotacaoPlena
+
+# Conversas roteirizadas (as mesmas dos exemplos das IAs, mais uma PME)
+ROTEIROS = {
+    "familiar": ["Olá", "Maria Silva", "11 98765-4321", "maria.silva@email.com", "2", "4",
+                 "35, 32, 5, 3", "2", "2", "2", "1", "Como funciona a carência?",
+                 "Sim, quero contratar", "Não, obrigado"],
+    "individual": ["Oi", "João Souza", "11 91234-5678", "joao@email.com", "1", "1", "42",
+                   "1", "2", "3", "2", "Quais documentos preciso levar?", "prosseguir", "obrigado"],
+    "empresarial": ["Bom dia", "Ana Lima", "11 95555-0000", "ana@empresa.com", "3", "Empresa ABC",
+                    "sim", "12", "25, 30, 35, 40, 45, 28, 32, 37, 42, 47, 29, 34", "3", "2", "2", "1",
+                    "Sim, quero contratar", "Não, obrigado"],
+}
+
+
+def criar_ia(variante, sistema_cotacao, pasta_log):
+    """Cria a IA da variante informada compartilhando o sistema de cotação"""
+    if variante == "integrada":
+        return ia_vendedora_integrada.IAVendedoraPlenaIntegrada(sistema_cotacao=sistema_cotacao)
+
+    modulo = ia_vendedora_modo_teste if variante == "modo_teste" else ia_vendedora_remarketing
+    ia = modulo.IAVendedoraPlenaIntegrada(sistema_cotacao=sistema_cotacao)
+    if variante == "modo_teste":
+        # Log do modo de teste em arquivo temporário
+        ia.modo_teste = True
+        ia.log_file = os.path.join(pasta_log, f"log_{variante}.jsonl")
+        ia.inicializar_log()
+    return ia
+
+
+def executar_carga(variante, sessoes, concorrencia, pasta_log):
+    """Reproduz os roteiros em ondas de ``concorrencia`` sessões intercaladas"""
+    sistema = SistemaCotacaoPlena()
+    ia = criar_ia(variante, sistema, pasta_log)
+    gerenciador = GerenciadorSessoes(ia=ia, sistema_cotacao=sistema)
+    nomes_roteiros = list(ROTEIROS)
+
+    latencias_por_estado = {}
+    latencias = []
+    mensagens = 0
+    contador = time.perf_counter_ns
+
+    tracemalloc.start()
+    memoria_inicial, _ = tracemalloc.get_traced_memory()
+    inicio = time.perf_counter()
+
+    for primeira in range(0, sessoes, concorrencia):
+        onda = range(primeira, min(sessoes, primeira + concorrencia))
+        # Mensagens intercaladas: a n-ésima mensagem de cada sessão da onda, depois a próxima...
+        roteiros = {indice: ROTEIROS[nomes_roteiros[indice % len(nomes_roteiros)]] for indice in onda}
+        passos = max(len(roteiro) for roteiro in roteiros.values())
+        for passo in range(passos):
+            for indice, roteiro in roteiros.items():
+                if passo >= len(roteiro):
+                    continue
+                telefone = f"5511{indice:09d}"
+                estado = decodificar(gerenciador.obter_sessao(telefone).estado_atual)
+                antes = contador()
+                gerenciador.processar_mensagem(telefone, roteiro[passo])
+                duracao = contador() - antes
+                latencias.append(duracao)
+                latencias_por_estado.setdefault(estado, []).append(duracao)
+                mensagens += 1
+
+    duracao_total = time.perf_counter() - inicio
+    memoria_final, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if getattr(ia, "log", None) is not None:
+        ia.log.fechar()
+
+    latencias.sort()
+    por_estado = {}
+    for estado, valores in sorted(latencias_por_estado.items()):
+        valores.sort()
+        por_estado[estado] = {
+            "mensagens": len(valores),
+            "p50_us": percentil(valores, 50) / 1000,
+            "p99_us": percentil(valores, 99) / 1000,
+        }
+
+    return {
+        "variante": variante,
+        "sessoes": sessoes,
+        "concorrencia": concorrencia,
+        "mensagens": mensagens,
+        "mensagens_por_segundo": mensagens / duracao_total if duracao_total else 0.0,
+        "latencia_p50_us": percentil(latencias, 50) / 1000,
+        "latencia_p99_us": percentil(latencias, 99) / 1000,
+        # Inclui sessões, cotações guardadas e o cache de cotações
+        "memoria_por_sessao_bytes": (memoria_final - memoria_inicial) / sessoes if sessoes else 0.0,
+        "latencia_por_estado": por_estado,
+    }
+
+
+def medir_ciclo_remarketing(leads, fracao_vencida=0.01, arquivo_leads=None):
+    """Mede o custo de um ciclo de verificar_inatividade com ``leads`` clientes em remarketing.
+
+    Com ``arquivo_leads`` (caminho), os leads ficam no arquivo mapeado em vez do dicionário.
+    """
+    ia = ia_vendedora_remarketing.IAVendedoraPlenaIntegrada()
+    agora = time.time()
+    vencidos = int(leads * fracao_vencida)
+    tracemalloc.start()
+    memoria_inicial = tracemalloc.get_traced_memory()[0]
+    if arquivo_leads is not None:
+        ia.arquivar_leads(arquivo_leads)
+    for indice in range(leads):
+        telefone = f"5511{indice:09d}"
+        dados = dict(ia.dados_cliente, telefone=telefone, nome=f"Cliente {indice}", tentativas_remarketing=1)
+        # Os primeiros leads já passaram do intervalo entre tentativas
+        ultima = agora - ia.intervalo_entre_tentativas - 10 if indice < vencidos else agora
+        ia.motor_remarketing.inscrever(telefone, dados, "coletar_idades", ultima)
+    del dados
+    memoria_final = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    inicio = time.perf_counter()
+    enviadas = ia.verificar_inatividade()
+    duracao = time.perf_counter() - inicio
+    return {
+        "leads": leads,
+        "vencidos": vencidos,
+        "mensagens_geradas": len(enviadas),
+        "duracao_ciclo_ms": duracao * 1000,
+        # Memória do heap Python mantida pelos leads e pela agenda (o arquivo mapeado não conta)
+        "memoria_por_lead_bytes": (memoria_final - memoria_inicial) / leads if leads else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga de conversas contra as variantes da IA vendedora")
+    parser.add_argument("--sessoes", type=int, default=2000, help="total de conversas reproduzidas")
+    parser.add_argument("--concorrencia", type=int, default=200, help="conversas abertas ao mesmo tempo")
+    parser.add_argument("--variantes", nargs="+", default=["integrada", "modo_teste", "remarketing"],
+                        choices=["integrada", "modo_teste", "remarketing"])
+    parser.add_argument("--leads-remarketing", type=int, default=100000,
+                        help="leads em remarketing no ciclo medido")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: imprime na tela)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta_log:
+        resultados = {
+            "variantes": [executar_carga(variante, args.sessoes, args.concorrencia, pasta_log)
+                          for variante in args.variantes],
+            "remarketing": medir_ciclo_remarketing(args.leads_remarketing),
+            "remarketing_arquivo": medir_ciclo_remarketing(args.leads_remarketing,
+                                                           arquivo_leads=os.path.join(pasta_log, "leads.bin")),
+        }
+
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+        for resultado in resultados["variantes"]:
+            print(f"{resultado['variante']:<12} {resultado['mensagens_por_segundo']:10.0f} msg/s  "
+                  f"p99 {resultado['latencia_p99_us']:8.1f} µs  "
+                  f"{resultado['memoria_por_sessao_bytes']:8.0f} bytes/sessão")
+        for chave, rotulo in (("remarketing", "memória"), ("remarketing_arquivo", "arquivo")):
+            print(f"Ciclo de remarketing ({rotulo}): {resultados[chave]['duracao_ciclo_ms']:.2f} ms, "
+                  f"{resultados[chave]['memoria_por_lead_bytes']:.0f} bytes/lead "
+                  f"({resultados[chave]['leads']} leads)")
+    else:
+        print(texto)
@@ -0,0 +1,244 @@
+"""
+Benchmark do Sistema de Cotação - Plena Saúde
+Mede a vazão e a latência do cálculo de preços com distribuições realistas de leads
+
+Uso:
+    python benchmark_cotacao.py --salvar-baseline  # grava os resultados como baseline desta máquina
+    python benchmark_cotacao.py                    # compara com a baseline salva
+
+A vazão depende da máquina, então a baseline não é versionada: gere-a no mesmo
+host (ex: no início do job de CI, a partir do commit de referência) antes de
+comparar. Cada cenário roda ``--rodadas`` vezes e vale a melhor rodada, o que
+reduz o efeito de ruído (outros processos, frequência da CPU) na comparação.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from sistema_cotacao import SistemaCotacaoPlena
+
+ARQUIVO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_cotacao_baseline.json")
+
+COBERTURAS = ["basico", "intermediario", "completo"]
+COPARTICIPACOES = ["sem", "com"]
+
+
+def gerar_leads(quantidade, semente=42):
+    """Gera leads com a distribuição usada no benchmark.
+
+    70% famílias de 1 a 5 vidas e 30% PMEs de 2 a 500 vidas (maioria pequena),
+    com 20% dos leads escolhendo um hospital premium.
+    """
+    aleatorio = random.Random(semente)
+    hospitais = list(SistemaCotacaoPlena().hospitais_premium)
+    leads = []
+    for _ in range(quantidade):
+        if aleatorio.random() < 0.7:
+            vidas = aleatorio.randint(1, 5)
+            tipo = "individual" if vidas == 1 else "familiar"
+            idades = [aleatorio.randint(25, 60)] + [aleatorio.randint(0, 65) for _ in range(vidas - 1)]
+        else:
+            tipo = "empresarial"
+            vidas = min(500, max(2, int(aleatorio.paretovariate(1.2) * 2)))
+            idades = [aleatorio.randint(18, 65) for _ in range(vidas)]
+        hospital = aleatorio.choice(hospitais) if aleatorio.random() < 0.2 else None
+        leads.append((tipo, idades, aleatorio.choice(COBERTURAS), aleatorio.choice(COPARTICIPACOES), hospital))
+    return leads
+
+
+def percentil(valores_ordenados, p):
+    """Percentil p (0-100) de uma lista já ordenada"""
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def melhores_duracoes(execucoes, rodadas):
+    """Menor duração de cada função em ``rodadas`` execuções, com o coletor de lixo desligado.
+
+    As rodadas são intercaladas entre as funções: um período lento da máquina atinge
+    uma rodada de cada cenário, e não todas as rodadas de um mesmo cenário.
+    """
+    melhores = [float("inf")] * len(execucoes)
+    coletor_ativo = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rodadas):
+            for indice, executar in enumerate(execucoes):
+                inicio = time.perf_counter()
+                executar()
+                melhores[indice] = min(melhores[indice], time.perf_counter() - inicio)
+    finally:
+        if coletor_ativo:
+            gc.enable()
+    return melhores
+
+
+def executar_todas(chamadas):
+    """Função que executa a lista de chamadas em sequência (uma rodada de um cenário)"""
+    def executar():
+        for chamada in chamadas:
+            chamada()
+    return executar
+
+
+def medir(nome, chamadas, duracao):
+    """Resultado do cenário: vazão da melhor rodada, latência individual e pico de memória"""
+    # Passadas separadas para latência e memória, sem distorcer a vazão
+    latencias = []
+    contador = time.perf_counter_ns
+    for chamada in chamadas:
+        antes = contador()
+        chamada()
+        latencias.append(contador() - antes)
+
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    for chamada in chamadas:
+        chamada()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencias.sort()
+    total = len(chamadas)
+    return {
+        "cenario": nome,
+        "cotacoes": total,
+        "cotacoes_por_segundo": total / duracao if duracao else 0.0,
+        "latencia_p50_us": percentil(latencias, 50) / 1000,
+        "latencia_p90_us": percentil(latencias, 90) / 1000,
+        "latencia_p99_us": percentil(latencias, 99) / 1000,
+        "pico_memoria_kb": (pico - base) / 1024,
+    }
+
+
+def executar_benchmark(quantidade=5000, semente=42, rodadas=10):
+    """Executa todos os cenários (``rodadas`` vezes, vale a melhor) e retorna a lista de resultados"""
+    leads = gerar_leads(quantidade, semente)
+    sistema = SistemaCotacaoPlena()
+    com_cache = SistemaCotacaoPlena(tamanho_cache=1024)
+
+    individuais = [(idades[0], cobertura, copart, hospital)
+                   for tipo, idades, cobertura, copart, hospital in leads]
+    familiares = [(idades, cobertura, copart, hospital)
+                  for tipo, idades, cobertura, copart, hospital in leads if tipo != "empresarial"]
+    empresariais = [(idades, cobertura, copart, hospital)
+                    for tipo, idades, cobertura, copart, hospital in leads if tipo == "empresarial"]
+
+    chamadas_por_cenario = {
+        "calcular_valor_individual": [lambda a=a: sistema.calcular_valor_individual(*a) for a in individuais],
+        "calcular_valor_familiar": [lambda a=a: sistema.calcular_valor_familiar(*a) for a in familiares],
+        "calcular_valor_empresarial": [lambda a=a: sistema.calcular_valor_empresarial(*a) for a in empresariais],
+        "gerar_cotacao_sem_cache": [lambda lead=lead: sistema.gerar_cotacao(*lead) for lead in leads],
+        "gerar_cotacao_com_cache": [lambda lead=lead: com_cache.gerar_cotacao(*lead) for lead in leads],
+    }
+
+    # Cotação em lote: uma única chamada para todos os leads
+    colunas = list(zip(*leads))
+
+    def cotar_em_lote():
+        sistema.gerar_cotacoes_em_lote(colunas[0], list(colunas[1]), None, colunas[2], colunas[3], colunas[4])
+
+    execucoes = [executar_todas(chamadas) for chamadas in chamadas_por_cenario.values()] + [cotar_em_lote]
+    *duracoes, duracao_lote = melhores_duracoes(execucoes, rodadas)
+
+    cenarios = [medir(nome, chamadas, duracao)
+                for (nome, chamadas), duracao in zip(chamadas_por_cenario.items(), duracoes)]
+    cenarios.append({
+        "cenario": "gerar_cotacoes_em_lote",
+        "cotacoes": len(leads),
+        "cotacoes_por_segundo": len(leads) / duracao_lote if duracao_lote else 0.0,
+        "latencia_p50_us": None,
+        "latencia_p90_us": None,
+        "latencia_p99_us": None,
+        "pico_memoria_kb": None,
+    })
+    return cenarios
+
+
+def parametros_divergentes(baseline, quantidade, semente):
+    """Lista os parâmetros da execução que diferem dos usados na baseline"""
+    atuais = {"quantidade": quantidade, "semente": semente}
+    return [f"{nome}={baseline.get(nome)!r} (atual {valor!r})"
+            for nome, valor in atuais.items() if baseline.get(nome) != valor]
+
+
+def comparar_com_baseline(resultados, baseline, limite_regressao):
+    """Retorna os cenários cuja vazão caiu mais que o limite em relação à baseline"""
+    referencia = {cenario["cenario"]: cenario for cenario in baseline["cenarios"]}
+    regressoes = []
+    for resultado in resultados:
+        anterior = referencia.get(resultado["cenario"])
+        if not anterior or not anterior["cotacoes_por_segundo"]:
+            continue
+        variacao = resultado["cotacoes_por_segundo"] / anterior["cotacoes_por_segundo"] - 1
+        resultado["variacao_vs_baseline"] = variacao
+        if variacao < -limite_regressao:
+            regressoes.append(resultado["cenario"])
+    return regressoes
+
+
+def imprimir(resultados):
+    print(f"{'Cenário':<30} {'cot/s':>12} {'p50 µs':>9} {'p90 µs':>9} {'p99 µs':>9} {'pico KB':>9} {'vs base':>8}")
+    for r in resultados:
+        def fmt(valor):
+            return f"{valor:9.1f}" if valor is not None else f"{'-':>9}"
+        variacao = r.get("variacao_vs_baseline")
+        texto_variacao = f"{variacao:+8.1%}" if variacao is not None else f"{'-':>8}"
+        print(f"{r['cenario']:<30} {r['cotacoes_por_segundo']:12.0f} {fmt(r['latencia_p50_us'])} "
+              f"{fmt(r['latencia_p90_us'])} {fmt(r['latencia_p99_us'])} {fmt(r['pico_memoria_kb'])} {texto_variacao}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do sistema de cotação da Plena Saúde")
+    parser.add_argument("--quantidade", type=int, default=5000, help="quantidade de leads gerados")
+    parser.add_argument("--semente", type=int, default=42, help="semente da geração de leads")
+    parser.add_argument("--rodadas", type=int, default=10, help="rodadas por cenário (vale a melhor)")
+    parser.add_argument("--baseline", default=ARQUIVO_BASELINE, help="arquivo JSON da baseline")
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava os resultados como baseline")
+    parser.add_argument("--limite-regressao", type=float, default=0.20,
+                        help="queda máxima de vazão aceita em relação à baseline (0.20 = 20%%)")
+    parser.add_argument("--json", action="store_true", help="imprime os resultados em JSON")
+    args = parser.parse_args()
+
+    baseline = None
+    if not args.salvar_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+            divergentes = parametros_divergentes(baseline, args.quantidade, args.semente)
+            if divergentes:
+                print(f"Baseline {args.baseline} gerada com outros parâmetros: {', '.join(divergentes)}")
+                print("Gere uma nova baseline com --salvar-baseline ou use os mesmos parâmetros.")
+                sys.exit(2)
+        else:
+            print(f"Sem baseline em {args.baseline}: gere uma nesta máquina com --salvar-baseline",
+                  file=sys.stderr)
+
+    resultados = executar_benchmark(args.quantidade, args.semente, args.rodadas)
+
+    regressoes = []
+    if baseline is not None:
+        regressoes = comparar_com_baseline(resultados, baseline, args.limite_regressao)
+
+    if args.json:
+        print(json.dumps({"cenarios": resultados, "regressoes": regressoes}, indent=2, ensure_ascii=False))
+    else:
+        imprimir(resultados)
+
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"quantidade": args.quantidade, "semente": args.semente, "rodadas": args.rodadas,
+                       "cenarios": resultados},
+                      f, indent=2, ensure_ascii=False)
+        print(f"Baseline salva em {args.baseline}")
+    elif regressoes:
+        print(f"REGRESSÃO de desempenho (> {args.limite_regressao:.0%}) em: {', '.join(regressoes)}")
+        sys.exit(1)
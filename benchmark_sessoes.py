@@ -0,0 +1,82 @@
+"""
+Benchmark de memória por sessão - Plena Saúde
+Compara o dados_cliente em dicionário com a SessaoCliente compacta
+"""
+
+import sys
+import time
+import tracemalloc
+
+from sessoes import DadosClienteSessao, SessaoCliente
+
+
+def preencher(dados, indice):
+    """Preenche os dados como ao final de uma conversa típica (antes da cotação)"""
+    dados["nome"] = f"Cliente {indice}"
+    dados["telefone"] = f"11 9{indice:08d}"
+    dados["email"] = f"cliente{indice}@email.com"
+    dados["tipo_plano"] = "familiar"
+    dados["quantidade_vidas"] = 3
+    dados["vidas_por_faixa"] = (1, 0, 0, 1, 1, 0, 0, 0, 0, 0)  # idades 35, 32 e 5
+    dados["regiao"] = "Caieiras"
+    dados["preferencia_hospital"] = "Sem preferência específica"
+    dados["tipo_cobertura"] = "completo"
+    dados["coparticipacao"] = "com"
+    dados["ultima_interacao"] = time.time()
+
+
+def criar_dicionario(indice):
+    """Cria o dados_cliente no formato original das IAs"""
+    dados = {
+        "nome": "",
+        "telefone": "",
+        "email": "",
+        "tipo_plano": "",
+        "quantidade_vidas": 0,
+        "vidas_por_faixa": (),
+        "empresa": "",
+        "cnpj_ativo": False,
+        "regiao": "",
+        "preferencia_hospital": "",
+        "tipo_cobertura": "intermediario",
+        "coparticipacao": "sem",
+        "cotacao": {},
+        "ultima_interacao": time.time(),
+        "tentativas_remarketing": 0,
+        "conversa_ativa": True
+    }
+    preencher(dados, indice)
+    return ("coletar_coparticipacao", dados)
+
+
+def criar_sessao(indice):
+    """Cria a sessão compacta equivalente"""
+    sessao = SessaoCliente(f"55119{indice:08d}")
+    preencher(DadosClienteSessao(sessao), indice)
+    return sessao
+
+
+def medir_bytes_por_sessao(fabrica, quantidade=10000):
+    """Mede, com tracemalloc, quantos bytes cada sessão ocupa em média"""
+    tracemalloc.start()
+    inicio = tracemalloc.take_snapshot()
+    sessoes = [fabrica(indice) for indice in range(quantidade)]
+    fim = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    total = sum(estatistica.size_diff for estatistica in fim.compare_to(inicio, "filename"))
+    # Descontar a lista que guarda as sessões
+    total -= sys.getsizeof(sessoes)
+    return total / quantidade
+
+
+if __name__ == "__main__":
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    bytes_dicionario = medir_bytes_por_sessao(criar_dicionario, quantidade)
+    bytes_sessao = medir_bytes_por_sessao(criar_sessao, quantidade)
+
+    print(f"Sessões medidas: {quantidade}")
+    print(f"dados_cliente (dicionário): {bytes_dicionario:.0f} bytes por sessão")
+    print(f"SessaoCliente (__slots__): {bytes_sessao:.0f} bytes por sessão")
+    print(f"Redução: {100 * (1 - bytes_sessao / bytes_dicionario):.1f}%")
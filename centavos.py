@@ -0,0 +1,54 @@
+"""
+Centavos - Plena Saúde
+Aritmética de ponto fixo dos preços: valores em centavos inteiros e fatores em pontos-base, sem ponto flutuante
+
+Política de arredondamento (a mesma em todos os caminhos de cálculo):
+- Preços das tabelas: convertidos exatamente para centavos (no máximo 2 casas decimais).
+- Fatores (plano, coparticipação, hospital, descontos): convertidos exatamente para
+  pontos-base, 1,0 = 10.000 (no máximo 4 casas decimais).
+- Os produtos são calculados exatos, em inteiros, e arredondados só para chegar ao
+  centavo, ao meio centavo para o par (ABNT NBR 5891, como ROUND_HALF_EVEN).
+- Individual/familiar: arredonda o valor de cada vida (o preço de tabela do
+  beneficiário, com plano, coparticipação e hospital) e depois o total com desconto.
+- Empresarial: arredonda uma única vez, o total do grupo já com o hospital.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+# 1,0 em pontos-base
+BASE = 10000
+
+
+def para_centavos(valor):
+    """Valor em reais (número ou texto) em centavos inteiros; ValueError se tiver mais de 2 casas decimais"""
+    return _inteiro_exato(valor, 100, "valor")
+
+
+def para_pontos_base(fator):
+    """Fator (ex: 1.3) em pontos-base (13000); ValueError se tiver mais de 4 casas decimais"""
+    return _inteiro_exato(fator, BASE, "fator")
+
+
+def _inteiro_exato(numero, escala, nome):
+    # Decimal(str(x)) lê o float como escrito no arquivo (1.3, não 1.3000000000000000444)
+    try:
+        escalado = Decimal(str(numero)) * escala
+    except InvalidOperation:
+        raise ValueError(f"{nome.capitalize()} inválido: {numero!r}") from None
+    if not escalado.is_finite() or escalado != escalado.to_integral_value() or escalado < 0:
+        raise ValueError(f"{nome.capitalize()} {numero!r} não é exato em 1/{escala} (ou é negativo)")
+    return int(escalado)
+
+
+def arredondar(numerador, denominador):
+    """numerador / denominador arredondado para o inteiro mais próximo, empate para o par (inteiros >= 0)"""
+    quociente, resto = divmod(numerador, denominador)
+    dobro = 2 * resto
+    if dobro > denominador or (dobro == denominador and quociente & 1):
+        quociente += 1
+    return quociente
+
+
+def reais(centavos):
+    """Centavos inteiros em reais (float com exatamente o valor de 2 casas, como o antigo round(valor, 2))"""
+    return centavos / 100
@@ -0,0 +1,222 @@
+"""
+Despachante Assíncrono de Mensagens - Plena Saúde
+Recebe mensagens do WhatsApp por uma fila e as processa com asyncio, mantendo a ordem por cliente
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from modelos_resposta import ERRO_PROCESSAMENTO
+from sessoes import GerenciadorSessoes
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayMemoria:
+    """Gateway de WhatsApp em memória, usado em testes e simulações"""
+
+    def __init__(self):
+        self.entrada = asyncio.Queue()
+        self.enviadas = []
+
+    async def receber(self, telefone, mensagem):
+        """Simula a chegada de uma mensagem de um cliente"""
+        await self.entrada.put((telefone, mensagem))
+
+    async def enviar(self, telefone, resposta):
+        """Simula o envio da resposta ao cliente"""
+        self.enviadas.append((telefone, resposta))
+
+    async def encerrar(self):
+        """Sinaliza ao despachante que não há mais mensagens"""
+        await self.entrada.put(None)
+
+
+class DespachanteMensagens:
+    """Distribui as mensagens por telefone: ordem estrita por sessão, concorrência entre sessões.
+
+    A IA (compartilhada entre as sessões) roda em uma única thread dedicada, de modo
+    que o laço de eventos nunca bloqueia enquanto ela processa. Trabalho bloqueante
+    adicional (log, persistência) é passado em ``tarefas_bloqueantes`` como funções
+    ``tarefa(telefone, mensagem, resposta)`` e executado em um pool de threads.
+    """
+
+    def __init__(self, gerenciador=None, enviar=None, tarefas_bloqueantes=(),
+                 max_threads_bloqueantes=4, tempo_ocioso=60.0, amostras_latencia=10000):
+        self.gerenciador = gerenciador if gerenciador is not None else GerenciadorSessoes()
+        self.enviar = enviar
+        self.tarefas_bloqueantes = list(tarefas_bloqueantes)
+        self.tempo_ocioso = tempo_ocioso
+
+        # A IA não é thread-safe: uma única thread garante que só uma mensagem é processada por vez
+        self._executor_ia = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ia")
+        # O motor de remarketing tem trava própria e não usa a IA: roda em paralelo às conversas
+        self._executor_remarketing = ThreadPoolExecutor(max_workers=1, thread_name_prefix="remarketing")
+        self._executor_bloqueante = ThreadPoolExecutor(max_workers=max_threads_bloqueantes,
+                                                       thread_name_prefix="bloqueante")
+
+        # Fila e tarefa de processamento por telefone
+        self.filas_sessao = {}
+        self._tarefas_sessao = {}
+        self._pendentes_bloqueantes = set()
+
+        # Estatísticas
+        self.latencias = deque(maxlen=amostras_latencia)
+        self.processadas = 0
+        self.erros = 0
+
+    async def executar(self, fila_entrada):
+        """Consome a fila de entrada até receber None e aguarda o fim do processamento"""
+        while True:
+            item = await fila_entrada.get()
+            if item is None:
+                break
+            telefone, mensagem = item
+            self.despachar(telefone, mensagem)
+        await self.encerrar()
+
+    def despachar(self, telefone, mensagem):
+        """Coloca a mensagem na fila da sessão, criando o processador da sessão se necessário"""
+        fila = self.filas_sessao.get(telefone)
+        if fila is None:
+            fila = asyncio.Queue()
+            self.filas_sessao[telefone] = fila
+            self._tarefas_sessao[telefone] = asyncio.create_task(self._processar_sessao(telefone, fila))
+        fila.put_nowait((mensagem, time.perf_counter()))
+
+    async def _processar_sessao(self, telefone, fila):
+        """Processa, em ordem, as mensagens de um único telefone"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                mensagem, chegada = await asyncio.wait_for(fila.get(), self.tempo_ocioso)
+            except asyncio.TimeoutError:
+                # Sem mensagens novas: liberar a sessão (nenhum await entre a checagem e a remoção)
+                if fila.empty():
+                    del self.filas_sessao[telefone]
+                    del self._tarefas_sessao[telefone]
+                    return
+                continue
+
+            try:
+                resposta = await loop.run_in_executor(
+                    self._executor_ia, self.gerenciador.processar_mensagem, telefone, mensagem)
+                if self.enviar is not None:
+                    await self.enviar(telefone, resposta)
+                self.processadas += 1
+            except Exception:
+                self.erros += 1
+                resposta = None
+                logger.exception("Falha ao processar a mensagem de %s: %r", telefone, mensagem)
+                await self._responder_erro(telefone)
+            finally:
+                fila.task_done()
+            self.latencias.append(time.perf_counter() - chegada)
+
+            if resposta is not None:
+                for tarefa in self.tarefas_bloqueantes:
+                    futuro = loop.run_in_executor(self._executor_bloqueante, tarefa, telefone, mensagem, resposta)
+                    self._pendentes_bloqueantes.add(futuro)
+                    futuro.add_done_callback(self._pendentes_bloqueantes.discard)
+
+    async def _responder_erro(self, telefone):
+        """Avisa o cliente que a mensagem falhou, para que a conversa não pareça travada"""
+        if self.enviar is None:
+            return
+        try:
+            await self.enviar(telefone, ERRO_PROCESSAMENTO)
+        except Exception:
+            logger.exception("Falha ao enviar o aviso de erro para %s", telefone)
+
+    async def disparar_remarketing(self, disparador):
+        """Envia o remarketing vencido pelo DisparadorRemarketing sem parar o atendimento.
+
+        Os leads são processados pelo motor de remarketing na sua própria thread, um
+        lote por vez, em paralelo com a thread da IA; o envio e a espera pelo limite
+        ficam no laço de eventos.
+        """
+        mensagens = self.gerenciador.gerar_remarketing()
+        return await disparador.disparar(mensagens, executor=self._executor_remarketing)
+
+    async def aguardar_filas(self):
+        """Aguarda até que todas as mensagens recebidas tenham sido respondidas"""
+        for fila in list(self.filas_sessao.values()):
+            await fila.join()
+
+    async def encerrar(self):
+        """Aguarda as filas e as tarefas bloqueantes e libera as threads"""
+        await self.aguardar_filas()
+        for tarefa in self._tarefas_sessao.values():
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas_sessao.values(), return_exceptions=True)
+        self.filas_sessao.clear()
+        self._tarefas_sessao.clear()
+        if self._pendentes_bloqueantes:
+            await asyncio.gather(*self._pendentes_bloqueantes, return_exceptions=True)
+        self._executor_ia.shutdown(wait=True)
+        self._executor_remarketing.shutdown(wait=True)
+        self._executor_bloqueante.shutdown(wait=True)
+
+    def percentil_latencia(self, percentil):
+        """Retorna o percentil (0-100) da latência de resposta, em segundos"""
+        if not self.latencias:
+            return 0.0
+        ordenadas = sorted(self.latencias)
+        indice = min(len(ordenadas) - 1, int(round(percentil / 100 * (len(ordenadas) - 1))))
+        return ordenadas[indice]
+
+
+# Exemplo de uso com o gateway em memória e uma rajada de clientes
+if __name__ == "__main__":
+    roteiro = ["Olá", "Cliente", "11 90000-0000", "cliente@email.com", "2", "3", "35, 32, 5", "2", "2", "2", "1"]
+
+    def registrar(telefone, mensagem, resposta):
+        # Simula uma escrita de log lenta (bloqueante)
+        time.sleep(0.001)
+
+    async def simular(clientes=200):
+        gateway = GatewayMemoria()
+        despachante = DespachanteMensagens(enviar=gateway.enviar, tarefas_bloqueantes=[registrar])
+        execucao = asyncio.create_task(despachante.executar(gateway.entrada))
+
+        inicio = time.perf_counter()
+        for mensagem in roteiro:
+            for cliente in range(clientes):
+                await gateway.receber(f"5511{cliente:09d}", mensagem)
+        await gateway.encerrar()
+        await execucao
+        duracao = time.perf_counter() - inicio
+
+        print(f"Mensagens respondidas: {len(gateway.enviadas)} em {duracao:.2f}s")
+        print(f"Latência p50: {despachante.percentil_latencia(50) * 1000:.1f} ms")
+        print(f"Latência p99: {despachante.percentil_latencia(99) * 1000:.1f} ms")
+        print(f"Erros: {despachante.erros}")
+
+    async def simular_falha():
+        # Uma falha na IA não pode deixar o cliente sem resposta nem travar a fila da sessão
+        gateway = GatewayMemoria()
+        despachante = DespachanteMensagens(enviar=gateway.enviar)
+        processar = despachante.gerenciador.processar_mensagem
+
+        def falhar_uma_vez(telefone, mensagem):
+            if mensagem == "falha":
+                raise RuntimeError("falha simulada")
+            return processar(telefone, mensagem)
+
+        despachante.gerenciador.processar_mensagem = falhar_uma_vez
+        execucao = asyncio.create_task(despachante.executar(gateway.entrada))
+        for mensagem in ("Olá", "falha", "Cliente"):
+            await gateway.receber("5511000000000", mensagem)
+        await gateway.encerrar()
+        await execucao
+
+        assert despachante.erros == 1 and len(gateway.enviadas) == 3
+        assert gateway.enviadas[1] == ("5511000000000", ERRO_PROCESSAMENTO)
+        print("Falha na IA: cliente avisado e fila da sessão seguiu normalmente")
+
+    logging.basicConfig(level=logging.CRITICAL)
+    asyncio.run(simular())
+    asyncio.run(simular_falha())
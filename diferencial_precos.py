@@ -0,0 +1,225 @@
+"""
+Verificação Diferencial dos Preços - Plena Saúde
+Compara o cálculo em centavos inteiros com uma referência decimal exata e com o cálculo anterior em ponto flutuante, em todo o espaço de parâmetros
+
+Uso:
+    python diferencial_precos.py                    # famílias de até 6 vidas e empresas de 2 a 120 vidas
+    python diferencial_precos.py --vidas-familia 8  # espaço maior (mais lento)
+
+Termina com código 1 se algum caminho de cálculo divergir da referência decimal.
+"""
+
+import argparse
+import functools
+import itertools
+import operator
+import random
+import sys
+import time
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from centavos import BASE
+from sistema_cotacao import SistemaCotacaoPlena
+
+CENTAVO = Decimal("0.01")
+
+
+def _decimal(numero):
+    return Decimal(str(numero))
+
+
+def _arredondar_centavo(valor):
+    """(valor arredondado ao centavo pela política de centavos, se era um empate exato)"""
+    return valor.quantize(CENTAVO, ROUND_HALF_EVEN), (valor * 100) % 1 == Decimal("0.5")
+
+
+def valor_decimal(sistema, tabelas, tipo_plano_contrato, histograma, tipo_cobertura, coparticipacao,
+                  hospital_premium):
+    """Referência exata, em Decimal, da política de arredondamento de centavos.
+
+    Retorna (valor, empate), onde ``empate`` indica que algum arredondamento caiu
+    exatamente no meio centavo.
+    """
+    fator = _decimal(tabelas.fatores_plano[tipo_cobertura]) * _decimal(tabelas.fatores_coparticipacao[coparticipacao])
+    if hospital_premium in tabelas.hospitais_premium:
+        fator_hospital = _decimal(tabelas.hospitais_premium[hospital_premium])
+    else:
+        fator_hospital = None
+    quantidade_vidas = sum(histograma)
+
+    if tipo_plano_contrato == "empresarial":
+        precos = tabelas.precos_empresariais[sistema.obter_faixa_vidas(quantidade_vidas)]
+        total = sum(quantidade * _decimal(preco) * fator for quantidade, preco in zip(histograma, precos))
+        if fator_hospital is not None:
+            total *= fator_hospital
+        return _arredondar_centavo(total)
+
+    empate = False
+    total = Decimal(0)
+    for quantidade, preco in zip(histograma, tabelas.precos_individuais):
+        valor = _decimal(preco) * fator
+        if fator_hospital is not None:
+            valor *= fator_hospital
+        valor, empate_vida = _arredondar_centavo(valor)
+        empate = empate or (empate_vida and quantidade > 0)
+        total += quantidade * valor
+    for minimo_vidas, desconto in sistema.DESCONTOS_FAMILIARES:
+        if quantidade_vidas >= minimo_vidas:
+            total, empate_desconto = _arredondar_centavo(total * desconto / BASE)
+            return total, empate or empate_desconto
+    return total, empate
+
+
+@functools.lru_cache(maxsize=None)
+def _valores_ponto_flutuante(tabelas, faixa_vidas, tipo_cobertura, coparticipacao, fator_hospital):
+    """Valor por faixa do cálculo anterior (fatores multiplicados em float), guardado como fazia a tabela"""
+    precos = tabelas.precos_individuais if faixa_vidas is None else tabelas.precos_empresariais[faixa_vidas]
+    valores = []
+    for preco in precos:
+        valor = preco * tabelas.fatores_plano[tipo_cobertura]
+        valor = valor * tabelas.fatores_coparticipacao[coparticipacao]
+        if fator_hospital is not None:
+            valor = valor * fator_hospital
+        valores.append(round(round(valor, 2) * 100) if faixa_vidas is None else valor)
+    return tuple(valores)
+
+
+def valor_ponto_flutuante(sistema, tabelas, tipo_plano_contrato, histograma, tipo_cobertura, coparticipacao,
+                          hospital_premium):
+    """Cálculo anterior: fatores em float e round(valor, 2) por vida (individual) ou no total (empresarial)"""
+    fator_hospital = tabelas.hospitais_premium.get(hospital_premium) if hospital_premium else None
+    quantidade_vidas = sum(histograma)
+    if tipo_plano_contrato == "empresarial":
+        valores = _valores_ponto_flutuante(tabelas, sistema.obter_faixa_vidas(quantidade_vidas), tipo_cobertura,
+                                           coparticipacao, None)
+        total = sum(map(operator.mul, histograma, valores))
+        if fator_hospital is not None:
+            total = total * fator_hospital
+        return round(total, 2)
+
+    centavos = _valores_ponto_flutuante(tabelas, None, tipo_cobertura, coparticipacao, fator_hospital)
+    total = sum(map(operator.mul, histograma, centavos)) / 100
+    if quantidade_vidas >= 5:
+        total = total * 0.9
+    elif quantidade_vidas >= 3:
+        total = total * 0.95
+    return round(total, 2)
+
+
+def espaco_parametros(faixas, vidas_familia, vidas_empresa, amostras, semente):
+    """(tipo de contrato, histograma): todas as famílias de até ``vidas_familia`` vidas e,
+    para cada tamanho de empresa de 2 a ``vidas_empresa``, ``amostras`` grupos aleatórios"""
+    for vidas in range(1, vidas_familia + 1):
+        for combinacao in itertools.combinations_with_replacement(range(faixas), vidas):
+            histograma = [0] * faixas
+            for faixa in combinacao:
+                histograma[faixa] += 1
+            yield ("individual" if vidas == 1 else "familiar"), histograma
+
+    aleatorio = random.Random(semente)
+    for vidas in range(2, vidas_empresa + 1):
+        for _ in range(amostras):
+            histograma = [0] * faixas
+            for faixa in aleatorio.choices(range(faixas), k=vidas):
+                histograma[faixa] += 1
+            yield "empresarial", histograma
+
+
+def verificar(sistema, casos):
+    """Compara matriz, cotação unitária, lote e cotação incremental com as referências"""
+    tabelas = sistema.tabelas
+    hospitais = [None] + list(tabelas.hospitais_premium)
+    resultado = {"cotacoes": 0, "divergencias": [], "diferencas_float": 0, "empates": 0, "maior_diferenca": 0.0}
+    lote = []
+
+    for tipo, histograma in casos:
+        matriz = sistema.gerar_matriz_cotacoes_histograma(tipo, histograma)
+        idades = sistema.idades_do_histograma(histograma)
+        for cobertura in sistema.CODIGOS_COBERTURA:
+            for coparticipacao in sistema.CODIGOS_COPARTICIPACAO:
+                for hospital in hospitais:
+                    valor = matriz[(cobertura, coparticipacao, hospital)]
+                    opcoes = (cobertura, coparticipacao, hospital)
+                    exato, empate = valor_decimal(sistema, tabelas, tipo, histograma, *opcoes)
+                    caminhos = (valor, sistema.gerar_cotacao_histograma(tipo, histograma, *opcoes)["valor_mensal"],
+                                sistema.criar_cotacao(tipo, idades, *opcoes).valor_mensal)
+                    if any(_decimal(caminho) != exato for caminho in caminhos):
+                        resultado["divergencias"].append((tipo, histograma, opcoes, exato, caminhos))
+
+                    anterior = valor_ponto_flutuante(sistema, tabelas, tipo, histograma, *opcoes)
+                    if anterior != valor:
+                        resultado["diferencas_float"] += 1
+                        resultado["empates"] += empate
+                        resultado["maior_diferenca"] = max(resultado["maior_diferenca"], round(abs(anterior - valor), 2))
+                    resultado["cotacoes"] += 1
+                    lote.append((tipo, idades, opcoes, valor))
+
+    # Lote: uma única chamada com todas as cotações
+    colunas = list(zip(*lote))
+    opcoes = list(zip(*colunas[2]))
+    valores_lote = sistema.gerar_cotacoes_em_lote(colunas[0], list(colunas[1]), None, *opcoes)
+    for (tipo, idades, opcoes_cotacao, valor), valor_lote in zip(lote, valores_lote):
+        if valor_lote != valor:
+            resultado["divergencias"].append((tipo, idades, opcoes_cotacao, valor, (valor_lote,)))
+    return resultado
+
+
+def medir_em_massa(sistema, quantidade, semente):
+    """Tempo por cotação (a partir do histograma) do cálculo anterior em float e do cálculo em centavos"""
+    tabelas = sistema.tabelas
+    aleatorio = random.Random(semente)
+    hospitais = [None] + list(tabelas.hospitais_premium)
+    casos = []
+    for _ in range(quantidade):
+        tipo = aleatorio.choice(sistema.CODIGOS_CONTRATO)
+        vidas = aleatorio.randint(1, 5) if tipo != "empresarial" else aleatorio.randint(2, 500)
+        histograma = sistema.calcular_histograma([aleatorio.randint(0, 80) for _ in range(vidas)])
+        casos.append((tipo, histograma, aleatorio.choice(sistema.CODIGOS_COBERTURA),
+                      aleatorio.choice(sistema.CODIGOS_COPARTICIPACAO), aleatorio.choice(hospitais)))
+
+    def ponto_flutuante():
+        for tipo, histograma, cobertura, coparticipacao, hospital in casos:
+            valor_ponto_flutuante(sistema, tabelas, tipo, histograma, cobertura, coparticipacao, hospital)
+
+    def centavos():
+        for tipo, histograma, cobertura, coparticipacao, hospital in casos:
+            if tipo == "empresarial":
+                sistema._valor_empresarial(tabelas, histograma, cobertura, coparticipacao, hospital)
+            else:
+                sistema._valor_familiar(tabelas, histograma, cobertura, coparticipacao, hospital)
+
+    tempos = {}
+    for nome, calcular in (("ponto flutuante", ponto_flutuante), ("centavos", centavos)):
+        calcular()  # tabelas por faixa já calculadas nos dois casos
+        inicio = time.perf_counter()
+        for _ in range(5):
+            calcular()
+        tempos[nome] = (time.perf_counter() - inicio) / (5 * quantidade)
+    return tempos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verificação diferencial do cálculo de preços em centavos")
+    parser.add_argument("--vidas-familia", type=int, default=6, help="todas as famílias de até N vidas")
+    parser.add_argument("--vidas-empresa", type=int, default=120, help="empresas de 2 a N vidas")
+    parser.add_argument("--amostras", type=int, default=10, help="grupos aleatórios por tamanho de empresa")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--em-massa", type=int, default=20000, help="cotações na medição de tempo")
+    args = parser.parse_args()
+
+    sistema = SistemaCotacaoPlena()
+    casos = espaco_parametros(len(sistema.faixas_etarias), args.vidas_familia, args.vidas_empresa,
+                              args.amostras, args.semente)
+    inicio = time.perf_counter()
+    resultado = verificar(sistema, casos)
+    print(f"Cotações verificadas: {resultado['cotacoes']} ({time.perf_counter() - inicio:.1f}s)")
+    print(f"Divergências da referência decimal (matriz, unitária, incremental, lote): {len(resultado['divergencias'])}")
+    for divergencia in resultado["divergencias"][:10]:
+        print(f"- {divergencia}")
+    print(f"Diferenças em relação ao cálculo anterior em float: {resultado['diferencas_float']} "
+          f"(empates de meio centavo: {resultado['empates']}, maior diferença: R$ {resultado['maior_diferenca']:.2f})")
+
+    tempos = medir_em_massa(sistema, args.em_massa, args.semente)
+    for nome, tempo in tempos.items():
+        print(f"{nome:>16}: {tempo * 1e6:.2f}µs por cotação")
+    sys.exit(1 if resultado["divergencias"] else 0)
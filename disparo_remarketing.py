@@ -0,0 +1,221 @@
+"""
+Disparo de Remarketing - Plena Saúde
+Envia as mensagens de remarketing em fluxo contínuo: lotes, limite de envio (balde de tokens) e fila de novas tentativas
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+
+
+class BaldeTokens:
+    """Limitador de taxa: ``taxa`` envios por segundo, com rajadas de até ``capacidade``.
+
+    Começa com ``inicial`` tokens (por padrão, cheio).
+    """
+
+    def __init__(self, taxa, capacidade=None, relogio=time.monotonic, inicial=None):
+        if taxa <= 0:
+            raise ValueError("A taxa deve ser positiva")
+        self.taxa = taxa
+        self.capacidade = capacidade if capacidade is not None else taxa
+        self._relogio = relogio
+        self._tokens = self.capacidade if inicial is None else min(inicial, self.capacidade)
+        self._instante = relogio()
+
+    def _repor(self):
+        agora = self._relogio()
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._instante) * self.taxa)
+        self._instante = agora
+
+    def consumir(self, quantidade=1):
+        """Consome os tokens se houver saldo; retorna False (sem consumir) caso contrário"""
+        self._repor()
+        if self._tokens >= quantidade:
+            self._tokens -= quantidade
+            return True
+        return False
+
+    def espera(self, quantidade=1):
+        """Segundos até haver saldo para ``quantidade`` tokens"""
+        self._repor()
+        return max(0.0, (quantidade - self._tokens) / self.taxa)
+
+    async def aguardar(self, quantidade=1):
+        """Aguarda (sem bloquear o laço de eventos) e consome os tokens"""
+        if quantidade > self.capacidade:
+            raise ValueError(f"Lote de {quantidade} maior que a capacidade do balde ({self.capacidade})")
+        while not self.consumir(quantidade):
+            await asyncio.sleep(self.espera(quantidade))
+
+
+class GatewayWhatsAppFalso:
+    """Gateway de WhatsApp local para testes do disparo.
+
+    Imita a API de envio em lote: recusa o que passar do limite de mensagens por
+    segundo, falha aleatoriamente em ``taxa_falhas`` dos envios (falha temporária)
+    e pode simular a latência da chamada.
+    """
+
+    def __init__(self, limite_por_segundo=None, taxa_falhas=0.0, latencia=0.0, semente=0):
+        self.limite = BaldeTokens(limite_por_segundo) if limite_por_segundo else None
+        self.taxa_falhas = taxa_falhas
+        self.latencia = latencia
+        self._aleatorio = random.Random(semente)
+        self.enviadas = []
+        self.recusadas = 0  # acima do limite de envio
+        self.falhas = 0
+
+    async def enviar_lote(self, lote):
+        """Envia [(telefone, mensagem), ...]; retorna True (entregue) ou False (falhou) para cada uma"""
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        resultado = []
+        for telefone, mensagem in lote:
+            if self.limite is not None and not self.limite.consumir():
+                self.recusadas += 1
+                resultado.append(False)
+            elif self._aleatorio.random() < self.taxa_falhas:
+                self.falhas += 1
+                resultado.append(False)
+            else:
+                self.enviadas.append((telefone, mensagem))
+                resultado.append(True)
+        return resultado
+
+
+class DisparadorRemarketing:
+    """Consome um iterável de mensagens ({"telefone", "mensagem"}) e as envia ao gateway.
+
+    As mensagens são puxadas em lotes de ``tamanho_lote`` (só um lote fica em memória),
+    cada lote espera saldo no balde de ``mensagens_por_segundo`` e as falhas voltam
+    para uma fila de novas tentativas com espera exponencial, até ``max_tentativas``
+    envios por mensagem; depois disso o telefone vai para ``descartadas``.
+    O gateway precisa de ``enviar_lote(lote)`` ou de ``enviar(telefone, mensagem)``.
+    """
+
+    def __init__(self, gateway, mensagens_por_segundo=20, tamanho_lote=20, max_tentativas=3,
+                 espera_inicial=1.0, relogio=time.monotonic):
+        self.gateway = gateway
+        self.tamanho_lote = min(tamanho_lote, max(1, int(mensagens_por_segundo)))
+        self.max_tentativas = max_tentativas
+        self.espera_inicial = espera_inicial
+        # Cabe ao menos um lote (taxas abaixo de 1 msg/s); começa vazio para que a taxa
+        # configurada valha já no primeiro lote, sem uma rajada inicial
+        self.balde = BaldeTokens(mensagens_por_segundo, max(1, mensagens_por_segundo), relogio=relogio, inicial=0)
+        self._relogio = relogio
+
+        self.fila_retentativas = []  # (pronta_em, sequencia, tentativa, telefone, mensagem)
+        self._sequencia = itertools.count()
+        self.descartadas = deque(maxlen=10000)
+        self.estatisticas = {"enviadas": 0, "falhas": 0, "retentativas": 0, "descartadas": 0, "lotes": 0}
+
+    async def disparar(self, mensagens, executor=None):
+        """Envia todas as mensagens do iterável, incluindo as novas tentativas, e retorna as estatísticas.
+
+        Com ``executor``, o iterável é consumido nele (ex: a thread da IA do
+        DespachanteMensagens), intercalado com o atendimento das conversas.
+        """
+        loop = asyncio.get_running_loop()
+        iterador = iter(mensagens)
+        esgotado = False
+        while True:
+            lote = self._retentativas_prontas()
+            if not esgotado and len(lote) < self.tamanho_lote:
+                faltam = self.tamanho_lote - len(lote)
+                if executor is not None:
+                    novas = await loop.run_in_executor(executor, lambda: list(itertools.islice(iterador, faltam)))
+                else:
+                    novas = list(itertools.islice(iterador, faltam))
+                esgotado = len(novas) < faltam
+                lote.extend((1, item["telefone"], item["mensagem"]) for item in novas)
+
+            if not lote:
+                if esgotado and not self.fila_retentativas:
+                    break
+                await asyncio.sleep(max(0.0, self.fila_retentativas[0][0] - self._relogio()))
+                continue
+
+            await self.balde.aguardar(len(lote))
+            resultados = await self._enviar([(telefone, mensagem) for _, telefone, mensagem in lote])
+            self.estatisticas["lotes"] += 1
+            for (tentativa, telefone, mensagem), entregue in zip(lote, resultados):
+                if entregue:
+                    self.estatisticas["enviadas"] += 1
+                    continue
+                self.estatisticas["falhas"] += 1
+                if tentativa < self.max_tentativas:
+                    pronta_em = self._relogio() + self.espera_inicial * 2 ** (tentativa - 1)
+                    heapq.heappush(self.fila_retentativas,
+                                   (pronta_em, next(self._sequencia), tentativa + 1, telefone, mensagem))
+                    self.estatisticas["retentativas"] += 1
+                else:
+                    self.estatisticas["descartadas"] += 1
+                    self.descartadas.append(telefone)
+        return dict(self.estatisticas)
+
+    def _retentativas_prontas(self):
+        """Retira da fila até um lote de novas tentativas cuja espera já passou"""
+        lote = []
+        agora = self._relogio()
+        fila = self.fila_retentativas
+        while fila and fila[0][0] <= agora and len(lote) < self.tamanho_lote:
+            _, _, tentativa, telefone, mensagem = heapq.heappop(fila)
+            lote.append((tentativa, telefone, mensagem))
+        return lote
+
+    async def _enviar(self, lote):
+        """Envia o lote; uma exceção do gateway conta como falha das mensagens afetadas"""
+        if hasattr(self.gateway, "enviar_lote"):
+            try:
+                return await self.gateway.enviar_lote(lote)
+            except Exception:
+                return [False] * len(lote)
+        resultados = await asyncio.gather(*(self.gateway.enviar(telefone, mensagem) for telefone, mensagem in lote),
+                                          return_exceptions=True)
+        return [not isinstance(resultado, Exception) for resultado in resultados]
+
+
+# Campanha simulada contra o gateway falso: leads vencidos, limite de envio e falhas temporárias
+if __name__ == "__main__":
+    import argparse
+    import tracemalloc
+
+    from ia_vendedora_remarketing import IAVendedoraPlenaIntegrada
+
+    parser = argparse.ArgumentParser(description="Simulação de disparo de remarketing")
+    parser.add_argument("--leads", type=int, default=5000, help="leads com envio vencido")
+    parser.add_argument("--taxa", type=float, default=2000, help="mensagens por segundo")
+    parser.add_argument("--falhas", type=float, default=0.05, help="fração de envios que falham")
+    args = parser.parse_args()
+
+    ia = IAVendedoraPlenaIntegrada()
+    agora = time.time()
+    for indice in range(args.leads):
+        telefone = f"5511{indice:09d}"
+        dados = dict(ia.dados_cliente, telefone=telefone, nome=f"Cliente {indice}", tentativas_remarketing=1)
+        ultima = agora - ia.intervalo_entre_tentativas - 10
+        ia.motor_remarketing.inscrever(telefone, dados, "coletar_idades", ultima)
+
+    async def simular():
+        gateway = GatewayWhatsAppFalso(limite_por_segundo=args.taxa, taxa_falhas=args.falhas)
+        disparador = DisparadorRemarketing(gateway, mensagens_por_segundo=args.taxa, tamanho_lote=100,
+                                           espera_inicial=0.05)
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        estatisticas = await disparador.disparar(ia.gerar_remarketing())
+        duracao = time.perf_counter() - inicio
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(f"Leads vencidos: {args.leads}")
+        print(f"Entregues: {len(gateway.enviadas)} em {duracao:.2f}s "
+              f"({len(gateway.enviadas) / duracao:.0f} msg/s, limite {args.taxa:.0f})")
+        print(f"Falhas: {estatisticas['falhas']}, novas tentativas: {estatisticas['retentativas']}, "
+              f"descartadas: {estatisticas['descartadas']}, recusadas pelo limite: {gateway.recusadas}")
+        print(f"Pico de memória do disparo: {pico / 1024:.0f} KB (inclui as mensagens guardadas pelo gateway falso)")
+
+    asyncio.run(simular())
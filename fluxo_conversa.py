@@ -0,0 +1,292 @@
+"""
+Fluxo de Conversação - Plena Saúde
+Definição declarativa das etapas (perguntas, validações e transições), compilada em uma tabela indexada pelo id do estado
+"""
+
+from collections import namedtuple
+
+from leitura_numeros import LIMITE_NUMEROS, ErroLeitura, ler_inteiro, ler_numeros, ler_opcao
+from perguntas_frequentes import normalizar
+
+from modelos_resposta import (REGIOES, COBERTURAS, MENU_TIPO_PLANO, PERGUNTA_TIPO_PLANO, TIPO_PLANO_INVALIDO,
+                              PERGUNTA_REGIAO, REGIAO_INVALIDA, PERGUNTA_PREFERENCIA, PERGUNTA_COBERTURA,
+                              COBERTURA_INVALIDA, PERGUNTA_COPARTICIPACAO, COPARTICIPACAO_INVALIDA,
+                              RESPOSTA_CARENCIA, RESPOSTA_DOCUMENTACAO, RESPOSTA_INICIO_USO)
+
+
+class EntradaInvalida(ValueError):
+    """Levantada por um validador quando a mensagem não serve; ``resposta`` é o texto devolvido"""
+
+    def __init__(self, resposta):
+        super().__init__(resposta)
+        self.resposta = resposta
+
+
+# Uma etapa da conversa.
+#   validar(mensagem, ia) -> valor; ValueError responde ``invalida`` (EntradaInvalida, o seu texto).
+#     None: a mensagem é aceita como está.
+#   campo: chave de dados_cliente onde o valor é gravado (None: não grava).
+#   transicoes: uma Transicao, ou {valor: Transicao} quando o próximo passo depende do valor.
+#   retorno: pergunta feita quando o cliente volta após o remarketing (None: trata "retorno" como mensagem).
+#   pergunta_frequente: intenção do ClassificadorPerguntas respondida por esta etapa.
+Etapa = namedtuple("Etapa", ["nome", "validar", "campo", "transicoes", "invalida", "retorno", "pergunta_frequente"],
+                   defaults=(None, None, None, None, None, None))
+
+# proximo: nome da etapa seguinte (None: permanece); resposta: texto ou função (ia, valor) -> texto;
+# gravar: False quando este valor não deve ir para ``campo``
+Transicao = namedtuple("Transicao", ["proximo", "resposta", "gravar"], defaults=(None, True))
+
+
+# Validadores
+
+def texto(mensagem, ia):
+    return mensagem
+
+
+def opcao(opcoes):
+    """Validador de menu: o número escolhido ("2", "2)", "opção 2") vira o valor correspondente"""
+    def validar(mensagem, ia):
+        return ler_opcao(mensagem, opcoes)
+    return validar
+
+
+def contem(*palavras):
+    """Validador sim/não: True se a mensagem (sem acentos e em minúsculas) contém alguma das palavras"""
+    palavras = [normalizar(palavra) for palavra in palavras]
+
+    def validar(mensagem, ia):
+        normalizada = normalizar(mensagem)
+        return any(palavra in normalizada for palavra in palavras)
+    return validar
+
+
+def quantidade(mensagem, ia):
+    """Quantidade de vidas ("3", "3 pessoas"), de 1 até o máximo de idades lidas em uma mensagem"""
+    return ler_inteiro(mensagem, 1, LIMITE_NUMEROS)
+
+
+def idades(mensagem, ia):
+    """Idades na quantidade de vidas informada, separadas por vírgula, espaço, ";" ou linha (veja ler_numeros)"""
+    try:
+        lista = ler_numeros(mensagem)
+    except ErroLeitura as erro:
+        raise EntradaInvalida(f"Não consegui ler estas idades: {erro}. Por favor, informe as idades separadas por vírgula (ex: 30, 25, 2).") from None
+    if len(lista) != ia.dados_cliente["quantidade_vidas"]:
+        raise EntradaInvalida(f"O número de idades informadas não corresponde à quantidade de vidas ({ia.dados_cliente['quantidade_vidas']}). Por favor, tente novamente.")
+    return lista
+
+
+def vidas_por_faixa(mensagem, ia):
+    """Como ``idades``, mas guarda só quantas vidas há em cada faixa etária (o que a cotação usa)"""
+    return tuple(ia.sistema_cotacao.calcular_histograma(idades(mensagem, ia)))
+
+
+SEM_PREFERENCIA = "Sem preferência específica"
+
+
+def preferencia_hospital(mensagem, ia):
+    """None se o cliente quer indicar um hospital; caso contrário, SEM_PREFERENCIA"""
+    if mensagem.strip() == "1" or "sim" in mensagem.lower():
+        return None
+    return SEM_PREFERENCIA
+
+
+def acao(metodo):
+    """Resposta calculada por um método da IA (ex: a cotação, que muda em cada variante)"""
+    def responder(ia, valor):
+        return getattr(ia, metodo)()
+    return responder
+
+
+# Textos do fluxo (fluxo_conversacao.md)
+
+SAUDACAO = """Olá! Sou a assistente virtual da Plena Saúde. 👋
+Estou aqui para ajudar você a encontrar o plano de saúde ideal para você, sua família ou empresa nas regiões de Francisco Morato, Caieiras e Perus.
+
+Para começarmos, poderia me informar seu nome completo?"""
+
+PERGUNTA_HOSPITAL = "Você tem preferência por algum hospital específico na região?\n" + PERGUNTA_PREFERENCIA
+
+_OPCAO_POR_REGIAO = {regiao: opcao for opcao, regiao in REGIOES.items()}
+
+
+def _retorno_cotacao(ia):
+    cotacao = ia.dados_cliente["cotacao"]
+    return f"""Você recebeu uma cotação para o plano {cotacao["nome_plano"]} ({cotacao["tipo_plano"]}) da Plena Saúde.
+Valor mensal: R$ {cotacao["valor_mensal"]:.2f}
+
+Gostaria de receber mais detalhes sobre este plano ou prosseguir com a contratação?"""
+
+
+# Fluxo completo, com cotação detalhada. A ordem define os ids dos estados (Estado em
+# sessoes.py), gravados nas sessões e no arquivo de leads: novas etapas entram no fim.
+ETAPAS = (
+    Etapa("inicio",
+          transicoes=Transicao("coletar_nome", SAUDACAO),
+          retorno="Vamos continuar com sua cotação. Em que posso ajudar?"),
+    Etapa("coletar_nome", texto, "nome",
+          Transicao("coletar_telefone", lambda ia, nome: f"Obrigado, {nome}. Agora preciso do seu telefone para contato:"),
+          retorno="Poderia confirmar seu nome completo?"),
+    Etapa("coletar_telefone", texto, "telefone",
+          Transicao("coletar_email", "Perfeito! E qual é o seu e-mail?"),
+          retorno="Poderia confirmar seu telefone para contato?"),
+    Etapa("coletar_email", texto, "email",
+          Transicao("identificar_tipo_plano", lambda ia, email: PERGUNTA_TIPO_PLANO.preencher(nome=ia.dados_cliente["nome"])),
+          retorno="Poderia confirmar seu e-mail?"),
+    Etapa("identificar_tipo_plano", opcao({"1": "individual", "2": "familiar", "3": "empresarial"}), "tipo_plano", {
+              "individual": Transicao("coletar_quantidade_vidas", "Entendi que você busca um plano individual. Vamos seguir com sua cotação. Quantas pessoas serão incluídas no plano?"),
+              "familiar": Transicao("coletar_quantidade_vidas", "Entendi que você busca um plano familiar. Quantas pessoas serão incluídas no plano?"),
+              "empresarial": Transicao("coletar_empresa", "Entendi que você busca um plano empresarial/PME. Qual é o nome da sua empresa?"),
+          },
+          invalida=TIPO_PLANO_INVALIDO,
+          retorno=f"""Você estava buscando um plano de saúde para:
+{MENU_TIPO_PLANO}
+
+Responda com o número da opção desejada."""),
+    Etapa("coletar_quantidade_vidas", quantidade, "quantidade_vidas",
+          Transicao("coletar_idades", lambda ia, quantidade: f"Obrigado. Agora preciso saber a idade de cada pessoa. Por favor, informe as {quantidade} idades separadas por vírgula (ex: 30, 25, 2):"),
+          invalida="Por favor, informe apenas o número de pessoas que serão incluídas no plano.",
+          retorno="Você estava informando quantas pessoas serão incluídas no plano. Poderia confirmar esse número?"),
+    Etapa("coletar_idades", vidas_por_faixa, "vidas_por_faixa",
+          Transicao("coletar_regiao", PERGUNTA_REGIAO),
+          retorno=lambda ia: f"Você estava informando as idades das {ia.dados_cliente['quantidade_vidas']} pessoas. Poderia confirmar essas idades separadas por vírgula?"),
+    Etapa("coletar_empresa", texto, "empresa",
+          Transicao("verificar_cnpj", "Sua empresa possui CNPJ ativo há mais de 6 meses?"),
+          retorno="Você estava informando o nome da sua empresa. Poderia confirmar?"),
+    Etapa("verificar_cnpj", contem("sim"), "cnpj_ativo",
+          Transicao("coletar_quantidade_vidas", "Quantos funcionários/vidas serão incluídos no plano?"),
+          retorno="Sua empresa possui CNPJ ativo há mais de 6 meses?"),
+    Etapa("coletar_regiao", opcao(REGIOES), "regiao",
+          # Resposta da região (com a lista de hospitais ou o aviso de outra região) já montada
+          Transicao("preferencia_hospital", lambda ia, regiao: ia.respostas.respostas_regiao[_OPCAO_POR_REGIAO[regiao]]),
+          invalida=REGIAO_INVALIDA,
+          retorno=PERGUNTA_REGIAO),
+    Etapa("preferencia_hospital", preferencia_hospital, "preferencia_hospital", {
+              # Cliente tem preferência, aguardar nome do hospital
+              None: Transicao(None, "Por favor, informe qual hospital é de sua preferência:", gravar=False),
+              SEM_PREFERENCIA: Transicao("coletar_tipo_cobertura", PERGUNTA_COBERTURA),
+          },
+          retorno=PERGUNTA_HOSPITAL),
+    Etapa("coletar_tipo_cobertura", opcao(COBERTURAS), "tipo_cobertura",
+          Transicao("coletar_coparticipacao", PERGUNTA_COPARTICIPACAO),
+          invalida=COBERTURA_INVALIDA,
+          retorno=PERGUNTA_COBERTURA),
+    Etapa("coletar_coparticipacao", opcao({"1": "com", "2": "sem"}), "coparticipacao",
+          Transicao("encaminhar_corretor", acao("calcular_cotacao")),
+          invalida=COPARTICIPACAO_INVALIDA,
+          retorno=PERGUNTA_COPARTICIPACAO),
+    Etapa("apresentar_cotacao",
+          transicoes=Transicao("encaminhar_corretor", acao("apresentar_cotacao")),
+          retorno=_retorno_cotacao),
+    Etapa("responder_carencia", transicoes=Transicao(None, RESPOSTA_CARENCIA), pergunta_frequente="carencia"),
+    Etapa("responder_documentacao", transicoes=Transicao(None, RESPOSTA_DOCUMENTACAO),
+          pergunta_frequente="documentacao"),
+    Etapa("responder_inicio_uso", transicoes=Transicao(None, RESPOSTA_INICIO_USO), pergunta_frequente="inicio_uso"),
+    Etapa("encaminhar_corretor", contem("sim", "prosseguir", "contratação"), transicoes={
+              True: Transicao("encerramento", acao("encaminhar_lead")),
+              False: Transicao(None, "Entendo. Em que mais posso ajudar você sobre os planos da Plena Saúde?"),
+          },
+          retorno=lambda ia: f"""Você estava prestes a ser encaminhado para um corretor para finalizar a contratação.
+Gostaria de prosseguir com a contratação do plano {ia.dados_cliente['cotacao']['nome_plano']}?"""),
+    # Reinicia o fluxo para uma nova conversa
+    Etapa("encerramento", transicoes=Transicao("inicio", acao("encerrar_conversa"))),
+    Etapa("remarketing", transicoes=Transicao(None, acao("enviar_remarketing"))),
+)
+
+
+def substituir(etapas, *novas):
+    """Cópia das etapas com algumas trocadas pelo nome (os ids dos estados não mudam)"""
+    por_nome = {etapa.nome: etapa for etapa in novas}
+    desconhecidas = set(por_nome) - {etapa.nome for etapa in etapas}
+    if desconhecidas:
+        raise ValueError(f"Etapas desconhecidas: {', '.join(sorted(desconhecidas))}")
+    return tuple(por_nome.get(etapa.nome, etapa) for etapa in etapas)
+
+
+_ETAPAS_POR_NOME = {etapa.nome: etapa for etapa in ETAPAS}
+
+# Protótipo: sem região, cobertura e coparticipação; a cotação vem logo após a preferência de hospital
+# e usa as idades exatas (não as faixas etárias)
+ETAPAS_PROTOTIPO = substituir(
+    ETAPAS,
+    _ETAPAS_POR_NOME["coletar_idades"]._replace(validar=idades, campo="idades",
+                                                 transicoes=Transicao("preferencia_hospital", PERGUNTA_HOSPITAL)),
+    _ETAPAS_POR_NOME["preferencia_hospital"]._replace(transicoes={
+        None: Transicao(None, "Por favor, informe qual hospital é de sua preferência:", gravar=False),
+        SEM_PREFERENCIA: Transicao("encaminhar_corretor", acao("calcular_cotacao")),
+    }),
+)
+
+
+# Etapa compilada: próximo estado já convertido em id. ``unica`` é a transição quando não
+# há desvio por valor; caso contrário ``transicoes`` mapeia valor -> (próximo id, resposta, gravar).
+_EtapaCompilada = namedtuple("_EtapaCompilada", ["validar", "campo", "unica", "transicoes", "invalida", "retorno"])
+
+
+class FluxoCompilado:
+    """Tabela de transições densa: o estado é um inteiro e o despacho é um acesso por índice.
+
+    Compilado uma vez (na importação) e compartilhado por todas as IAs e conversas; a
+    IA guarda apenas ``id_estado`` e ``dados_cliente``. As respostas que variam entre
+    as versões da IA (cotação, encaminhamento, encerramento) são métodos da IA
+    chamados pelo nome (veja ``acao``).
+    """
+
+    def __init__(self, etapas):
+        self.nomes = tuple(etapa.nome for etapa in etapas)
+        self.ids = {nome: id_estado for id_estado, nome in enumerate(self.nomes)}
+        if len(self.ids) != len(self.nomes):
+            raise ValueError("Nomes de etapa repetidos")
+
+        tabela = []
+        self.respostas_frequentes = {}
+        for id_estado, etapa in enumerate(etapas):
+            if isinstance(etapa.transicoes, Transicao):
+                unica, transicoes = self._compilar(id_estado, etapa.transicoes), None
+            else:
+                unica = None
+                transicoes = {valor: self._compilar(id_estado, transicao)
+                              for valor, transicao in etapa.transicoes.items()}
+            tabela.append(_EtapaCompilada(etapa.validar, etapa.campo, unica, transicoes, etapa.invalida,
+                                          etapa.retorno))
+            if etapa.pergunta_frequente is not None:
+                self.respostas_frequentes[etapa.pergunta_frequente] = etapa.transicoes.resposta
+        self.tabela = tuple(tabela)
+
+    def _compilar(self, id_estado, transicao):
+        if transicao.proximo is None:
+            proximo = id_estado
+        elif transicao.proximo in self.ids:
+            proximo = self.ids[transicao.proximo]
+        else:
+            raise ValueError(f"Transição para etapa desconhecida: {transicao.proximo}")
+        return (proximo, transicao.resposta, transicao.gravar)
+
+    def processar(self, ia, mensagem):
+        """Trata a mensagem na etapa atual da IA, grava o valor, avança o estado e retorna a resposta"""
+        etapa = self.tabela[ia.id_estado]
+        valor = mensagem
+        if etapa.validar is not None:
+            try:
+                valor = etapa.validar(mensagem, ia)
+            except EntradaInvalida as erro:
+                return erro.resposta
+            except ValueError:
+                return etapa.invalida
+
+        proximo, resposta, gravar = etapa.unica if etapa.unica is not None else etapa.transicoes[valor]
+        if gravar and etapa.campo is not None:
+            ia.dados_cliente[etapa.campo] = valor
+        ia.id_estado = proximo
+        return resposta if resposta.__class__ is str else resposta(ia, valor)
+
+    def retomar(self, ia):
+        """Pergunta da etapa atual para o cliente que volta após o remarketing"""
+        retorno = self.tabela[ia.id_estado].retorno
+        if retorno is None:
+            return self.processar(ia, "retorno")
+        return retorno if retorno.__class__ is str else retorno(ia)
+
+
+FLUXO = FluxoCompilado(ETAPAS)
+FLUXO_PROTOTIPO = FluxoCompilado(ETAPAS_PROTOTIPO)
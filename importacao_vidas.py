@@ -0,0 +1,191 @@
+"""
+Importação de Vidas - Plena Saúde
+Lê a planilha de beneficiários de uma empresa (CSV, ou XLSX exportado para CSV) direto para o histograma de faixas etárias
+"""
+
+import csv
+import datetime
+import io
+import itertools
+from collections import namedtuple
+
+from leitura_numeros import IDADE_MAXIMA, ler_inteiro
+from perguntas_frequentes import normalizar
+
+# Nomes aceitos para a coluna (sem acentos, minúsculas, "_" como espaço)
+COLUNAS_NASCIMENTO = frozenset({"data nascimento", "data de nascimento", "nascimento", "dt nascimento",
+                                "data nasc", "dt nasc", "nasc", "dn"})
+COLUNAS_IDADE = frozenset({"idade", "idades", "idade anos", "anos"})
+
+# Quantas linhas com erro são guardadas no resultado (as demais são apenas contadas)
+ERROS_GUARDADOS = 50
+
+# histograma: vidas por faixa etária (posição = id da faixa nas tabelas usadas na leitura)
+# erros: até ERROS_GUARDADOS tuplas (linha, valor, motivo); linhas_com_erro: total de linhas ignoradas
+ImportacaoVidas = namedtuple("ImportacaoVidas", ["histograma", "vidas", "erros", "linhas_com_erro"])
+
+
+def idade_na_data(texto, referencia):
+    """Idade na data de referência para "dd/mm/aaaa", "dd/mm/aa" ou "aaaa-mm-dd" (com hora opcional,
+    depois de espaço ou "T", como em "1990-05-01T10:00:00")"""
+    texto = texto.split(" ", 1)[0].split("T", 1)[0]
+    if "/" in texto:
+        dia, mes, ano = texto.split("/")
+    else:
+        ano, mes, dia = texto.split("-")
+    ano, mes, dia = int(ano), int(mes), int(dia)
+    if ano < 100:
+        # Ano com dois dígitos: o século mais recente que não fica no futuro
+        ano += 2000 if ano <= referencia.year % 100 else 1900
+    datetime.date(ano, mes, dia)  # valida a data
+    return referencia.year - ano - ((referencia.month, referencia.day) < (mes, dia))
+
+
+def _idade_informada(texto, referencia):
+    """Idade de uma célula da coluna de idade ("35", "35 anos")"""
+    try:
+        return int(texto)
+    except ValueError:
+        return ler_inteiro(texto, 0, IDADE_MAXIMA)
+
+
+def _localizar_coluna(primeira_linha, referencia):
+    """(índice da coluna, leitor da célula, a primeira linha é cabeçalho?)"""
+    nomes = [normalizar(celula).strip().replace("_", " ") for celula in primeira_linha]
+    for colunas, leitor in ((COLUNAS_NASCIMENTO, idade_na_data), (COLUNAS_IDADE, _idade_informada)):
+        for indice, nome in enumerate(nomes):
+            if nome in colunas:
+                return indice, leitor, True
+
+    # Sem cabeçalho: a primeira coluna com data (ou, não havendo, com idade) válida
+    for leitor in (idade_na_data, _idade_informada):
+        for indice, celula in enumerate(primeira_linha):
+            try:
+                leitor(celula.strip(), referencia)
+            except ValueError:
+                continue
+            return indice, leitor, False
+    raise ValueError("Coluna de idade ou data de nascimento não encontrada na planilha")
+
+
+def importar_vidas(arquivo, tabelas, data_referencia=None, delimitador=None, encoding="utf-8-sig"):
+    """Lê a planilha (caminho ou arquivo texto aberto) e conta as vidas por faixa etária das ``tabelas``.
+
+    A coluna usada é a de data de nascimento ou a de idade, achada pelo cabeçalho
+    (ou, sem cabeçalho, pela primeira coluna com valor válido); as demais colunas
+    não são interpretadas. As linhas são lidas uma a uma e só o histograma é
+    guardado. O delimitador ("," ";" ou tabulação) é detectado se não informado, em
+    uma amostra lida do início, sem voltar no arquivo (aceita stdin ou o corpo de
+    uma requisição). Linhas vazias são ignoradas; as inválidas são contadas em
+    ``linhas_com_erro``.
+    """
+    if isinstance(arquivo, str):
+        # Só a coluna de idade/data precisa ser decodificada corretamente: nomes salvos
+        # em outra codificação (ex: CSV do Excel) não interrompem a leitura
+        with open(arquivo, encoding=encoding, errors="replace", newline="") as aberto:
+            return importar_vidas(aberto, tabelas, data_referencia, delimitador)
+
+    referencia = data_referencia or datetime.date.today()
+    if delimitador is None:
+        # Amostra até o fim de uma linha, relida da memória antes do restante do arquivo
+        amostra = arquivo.read(4096) + arquivo.readline()
+        try:
+            delimitador = csv.Sniffer().sniff(amostra, delimiters=",;\t").delimiter
+        except csv.Error:
+            delimitador = ","  # uma única coluna
+        arquivo = itertools.chain(io.StringIO(amostra, newline=""), arquivo)
+
+    histograma = [0] * len(tabelas.faixas_etarias)
+    erros = []
+    linhas_com_erro = 0
+
+    leitor_csv = csv.reader(arquivo, delimiter=delimitador)
+    primeira_linha = next((linha for linha in leitor_csv if "".join(linha).strip()), None)
+    if primeira_linha is None:
+        return ImportacaoVidas(histograma, 0, erros, 0)
+    coluna, ler_celula, cabecalho = _localizar_coluna(primeira_linha, referencia)
+    linhas = leitor_csv if cabecalho else itertools.chain([primeira_linha], leitor_csv)
+
+    faixa_por_idade = tabelas.faixa_por_idade
+    ultima_idade = len(faixa_por_idade) - 1
+    for linha in linhas:
+        celula = linha[coluna].strip() if coluna < len(linha) else ""
+        if celula:
+            try:
+                idade = ler_celula(celula, referencia)
+            except ValueError:
+                motivo = "valor inválido"
+            else:
+                if 0 <= idade <= IDADE_MAXIMA:
+                    histograma[faixa_por_idade[min(idade, ultima_idade)]] += 1
+                    continue
+                motivo = "idade fora do intervalo"
+        elif not "".join(linha).strip():
+            continue
+        else:
+            motivo = "sem idade ou data de nascimento"
+
+        linhas_com_erro += 1
+        if len(erros) < ERROS_GUARDADOS:
+            erros.append((leitor_csv.line_num, celula, motivo))
+
+    return ImportacaoVidas(histograma, sum(histograma), erros, linhas_com_erro)
+
+
+# Importa uma planilha e cota o plano empresarial; sem arquivo, gera uma planilha de teste
+if __name__ == "__main__":
+    import argparse
+    import os
+    import random
+    import tempfile
+    import time
+
+    from sistema_cotacao import SistemaCotacaoPlena
+
+    parser = argparse.ArgumentParser(description="Importação da planilha de vidas de uma empresa")
+    parser.add_argument("planilha", nargs="?", help="arquivo CSV (sem ele, uma planilha de teste é gerada)")
+    parser.add_argument("--linhas", type=int, default=10000, help="linhas da planilha de teste")
+    parser.add_argument("--cobertura", default="intermediario", choices=SistemaCotacaoPlena.CODIGOS_COBERTURA)
+    parser.add_argument("--coparticipacao", default="com", choices=SistemaCotacaoPlena.CODIGOS_COPARTICIPACAO)
+    args = parser.parse_args()
+
+    sistema = SistemaCotacaoPlena()
+    caminho = args.planilha
+    if caminho is None:
+        # Planilha no formato do Excel em português: ";" e datas dd/mm/aaaa, com algumas linhas ruins
+        aleatorio = random.Random(0)
+        descritor, caminho = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(descritor, "w", encoding="utf-8-sig", newline="") as arquivo:
+            escritor = csv.writer(arquivo, delimiter=";")
+            escritor.writerow(["Nome", "CPF", "Data de Nascimento", "Parentesco"])
+            for linha in range(args.linhas):
+                nascimento = datetime.date(1950, 1, 1) + datetime.timedelta(days=aleatorio.randrange(26000))
+                data = nascimento.strftime("%d/%m/%Y") if linha % 997 else "sem data"
+                escritor.writerow([f"Beneficiário {linha}", f"{aleatorio.randrange(10 ** 11):011d}", data,
+                                   "Titular" if linha % 3 else "Dependente"])
+
+    inicio = time.perf_counter()
+    importacao = sistema.importar_vidas(caminho)
+    leitura = time.perf_counter() - inicio
+    cotacao = sistema.gerar_cotacao_histograma("empresarial", importacao.histograma, args.cobertura,
+                                               args.coparticipacao)
+    total = time.perf_counter() - inicio
+    if args.planilha is None:
+        os.remove(caminho)
+
+    print(f"Vidas importadas: {importacao.vidas} (linhas ignoradas: {importacao.linhas_com_erro})")
+    for linha, valor, motivo in importacao.erros[:5]:
+        print(f"- linha {linha}: {valor!r} ({motivo})")
+    for faixa, quantidade in zip(sistema.faixas_etarias, importacao.histograma):
+        print(f"{faixa:>6}: {quantidade}")
+    print(f"Plano {cotacao['nome_plano']} ({cotacao['coparticipacao']}): R$ {cotacao['valor_mensal']:.2f}")
+    print(f"Leitura: {leitura * 1000:.1f} ms; leitura e cotação: {total * 1000:.1f} ms")
+
+    # Datas ISO com hora, lidas de um pipe (sem seek, como stdin)
+    leitura_pipe, escrita_pipe = os.pipe()
+    with os.fdopen(escrita_pipe, "w", encoding="utf-8") as saida:
+        saida.write("Nome;Data de Nascimento\nAna;1990-05-01T10:00:00\nBia;1990-05-01 10:00\nCaio;01/05/1990\n")
+    with os.fdopen(leitura_pipe, encoding="utf-8", newline="") as entrada:
+        iso = importar_vidas(entrada, sistema.tabelas, datetime.date(2026, 1, 1))
+    assert iso.vidas == 3 and iso.linhas_com_erro == 0, iso.erros
+    print(f"Datas ISO com hora lidas de um pipe: {iso.vidas} vidas, {iso.linhas_com_erro} linhas ignoradas")
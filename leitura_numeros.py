@@ -0,0 +1,167 @@
+"""
+Leitura de Números - Plena Saúde
+Lê listas de idades, quantidades e opções de menu em uma única passada, aceitando os formatos que os clientes colam no WhatsApp
+"""
+
+import re
+
+from perguntas_frequentes import normalizar
+
+# Limites da mensagem lida (acima deles a leitura é recusada antes de percorrer o texto)
+LIMITE_CARACTERES = 6000
+LIMITE_NUMEROS = 500
+IDADE_MAXIMA = 120
+
+# Leitura geral, em uma única passada (findall). Um item por casamento: número com unidade
+# opcional ("35", "35 anos", "8 meses", "35a"), aceito só quando termina em separador;
+# qualquer outro trecho sem separadores vira ``outro``.
+# Separadores: espaços/quebras de linha, vírgula, ponto e vírgula, barra e barra vertical.
+_ITEM = re.compile(r"(\d+)(?:\s*(anos?|a|meses|m[eê]s))?[.)]?(?=[\s,;/|]|$)|([^\s,;/|]+)", re.IGNORECASE)
+
+# Caminho rápido (o caso comum, só números e separadores): separadores viram espaço e split()
+_SEPARADORES_PARA_ESPACO = str.maketrans(",;/|", "    ")
+
+# Palavras que acompanham os números e são ignoradas (comparadas sem acentos e sem ":" no fim)
+PALAVRAS_IGNORADAS = frozenset({
+    "e", "ano", "anos", "idade", "idades", "opcao", "numero", "n", "no", "pessoa", "pessoas",
+    "vida", "vidas", "funcionario", "funcionarios", "-",
+})
+
+
+class ErroLeitura(ValueError):
+    """Itens da mensagem que não puderam ser lidos: ``erros`` é uma lista de (posição, trecho, motivo).
+
+    O texto do erro (respondido ao cliente) cita até ERROS_NO_TEXTO itens.
+    """
+
+    ERROS_NO_TEXTO = 5
+
+    def __init__(self, erros):
+        self.erros = erros
+        texto = "; ".join(f'"{trecho}" ({motivo})' if trecho else motivo
+                          for _, trecho, motivo in erros[:self.ERROS_NO_TEXTO])
+        if len(erros) > self.ERROS_NO_TEXTO:
+            texto += f" e mais {len(erros) - self.ERROS_NO_TEXTO}"
+        super().__init__(texto)
+
+
+def ler_numeros(texto, minimo=0, maximo=IDADE_MAXIMA, limite=LIMITE_NUMEROS):
+    """Lista dos números da mensagem, na ordem.
+
+    Aceita "35 32 5", "35;32", "35 anos, 32 anos", um por linha etc.; "8 meses" vale 0.
+    Levanta ErroLeitura com todos os itens inválidos (posição a partir de 1), fora de
+    [minimo, maximo], ou se a mensagem passar de LIMITE_CARACTERES ou de ``limite`` números.
+    """
+    if len(texto) > LIMITE_CARACTERES:
+        raise ErroLeitura([(0, "", f"mensagem com mais de {LIMITE_CARACTERES} caracteres")])
+
+    partes = texto.translate(_SEPARADORES_PARA_ESPACO).split()
+    digitos = "".join(partes)
+    erros = None
+    if digitos.isascii() and digitos.isdigit() and len(digitos) <= 3 * len(partes):
+        numeros = list(map(int, partes))
+        if minimo <= min(numeros) and max(numeros) <= maximo:
+            erros = []
+    if erros is None:
+        numeros, erros = _ler_itens(texto, minimo, maximo)
+
+    # Limite verificado uma única vez, igual para os dois caminhos de leitura
+    if len(numeros) > limite:
+        raise ErroLeitura([(0, "", f"números demais na mesma mensagem (máximo {limite})")])
+    if erros:
+        raise ErroLeitura(erros)
+    return numeros
+
+
+def _ler_itens(texto, minimo, maximo):
+    """Leitura geral (números com unidade e palavras ignoradas): (números válidos, erros)"""
+    numeros = []
+    erros = []
+    digitos_maximo = len(str(maximo))
+    for numero, unidade, outro in _ITEM.findall(texto):
+        if outro:
+            if normalizar(outro).rstrip(":") not in PALAVRAS_IGNORADAS:
+                erros.append((len(numeros) + len(erros) + 1, outro, "não é um número"))
+            continue
+        if unidade and unidade[0] in "mM":
+            valor = 0  # bebês: idade em meses conta como 0 anos
+        elif len(numero) > digitos_maximo:
+            valor = maximo + 1
+        else:
+            valor = int(numero)
+        if minimo <= valor <= maximo:
+            numeros.append(valor)
+        else:
+            erros.append((len(numeros) + len(erros) + 1, numero, f"fora do intervalo de {minimo} a {maximo}"))
+    return numeros, erros
+
+
+def ler_inteiro(texto, minimo=0, maximo=LIMITE_NUMEROS):
+    """O único número da mensagem ("3", "3 pessoas", "opção 2"); ErroLeitura se houver zero ou vários"""
+    numeros = ler_numeros(texto, minimo, maximo, limite=1)
+    if not numeros:
+        raise ErroLeitura([(0, texto.strip(), "nenhum número encontrado")])
+    return numeros[0]
+
+
+def ler_opcao(texto, opcoes):
+    """Valor da opção de menu escolhida (``opcoes`` indexado por "1", "2", ...); ValueError se não existir"""
+    escolha = str(ler_inteiro(texto, 0, len(opcoes)))
+    try:
+        return opcoes[escolha]
+    except KeyError:
+        raise ErroLeitura([(1, escolha, "opção inexistente")]) from None
+
+
+def _ler_idades_original(texto):
+    """Leitura anterior (só vírgulas), mantida para comparação no benchmark"""
+    return [int(idade.strip()) for idade in texto.split(",")]
+
+
+# Benchmark: listas de idades coladas por empresas (50 a 300 vidas) em vários formatos
+if __name__ == "__main__":
+    import argparse
+    import random
+    import timeit
+
+    parser = argparse.ArgumentParser(description="Benchmark da leitura de listas de idades")
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(args.semente)
+    formatos = {
+        "vírgulas": ", ".join,
+        "espaços": " ".join,
+        "ponto e vírgula": ";".join,
+        "uma por linha": "\n".join,
+        "com 'anos'": lambda idades: ", ".join(f"{idade} anos" for idade in idades),
+    }
+
+    print(f"{'vidas':>5}  {'formato':<16} {'atual':>10} {'anterior':>10}")
+    for vidas in (50, 100, 300):
+        idades = [aleatorio.randint(0, 90) for _ in range(vidas)]
+        for nome, formatar in formatos.items():
+            texto = formatar([str(idade) for idade in idades])
+            assert ler_numeros(texto) == idades, nome
+            atual = timeit.timeit(lambda: ler_numeros(texto), number=args.repeticoes) / args.repeticoes
+            try:
+                _ler_idades_original(texto)
+                anterior = f"{timeit.timeit(lambda: _ler_idades_original(texto), number=args.repeticoes) / args.repeticoes * 1e6:8.1f}µs"
+            except ValueError:
+                anterior = "recusado"
+            print(f"{vidas:>5}  {nome:<16} {atual * 1e6:8.1f}µs {anterior:>10}")
+
+    # Mensagem com erros: todos os itens inválidos são informados de uma vez
+    try:
+        ler_numeros("35, 32, 3x, 150, 8 meses")
+    except ErroLeitura as erro:
+        print(f"\nErros: {erro}")
+
+    # Mensagem no limite de tamanho
+    texto = ", ".join("99" for _ in range(LIMITE_CARACTERES // 4))
+    inicio = timeit.default_timer()
+    try:
+        ler_numeros(texto)
+    except ErroLeitura as erro:
+        print(f"Mensagem de {len(texto)} caracteres: {erro} ({(timeit.default_timer() - inicio) * 1e6:.0f}µs)")
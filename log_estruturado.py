@@ -0,0 +1,140 @@
+"""
+Log Estruturado com Escrita em Segundo Plano - Plena Saúde
+Registra interações em JSON Lines sem bloquear o processamento das mensagens
+"""
+
+import atexit
+import datetime
+import json
+import queue
+import threading
+import time
+
+# Políticas quando a fila em memória está cheia
+DESCARTAR = "descartar"   # descarta o novo registro e contabiliza em ``descartados``
+BLOQUEAR = "bloquear"     # aguarda espaço na fila (contrapressão no chamador)
+
+
+class _Descarga:
+    """Marcador colocado na fila para forçar a escrita de tudo o que veio antes"""
+
+    def __init__(self):
+        self.concluida = threading.Event()
+
+
+_FIM = object()
+
+
+class LogEstruturado:
+    """Logger com fila limitada e thread escritora: registrar() custa apenas um enqueue.
+
+    Os registros são gravados em lotes, quando o lote atinge ``tamanho_lote`` ou a
+    cada ``intervalo_flush`` segundos, mantendo o arquivo aberto entre os lotes.
+    """
+
+    def __init__(self, caminho, intervalo_flush=1.0, tamanho_lote=500,
+                 capacidade_fila=10000, politica=DESCARTAR):
+        if politica not in (DESCARTAR, BLOQUEAR):
+            raise ValueError(f"Política inválida: {politica}")
+        self.caminho = caminho
+        self.intervalo_flush = intervalo_flush
+        self.tamanho_lote = tamanho_lote
+        self.politica = politica
+
+        self._fila = queue.Queue(maxsize=capacidade_fila)
+        self._arquivo = None
+        self._fechado = False
+
+        # Estatísticas
+        self.escritos = 0
+        self.descartados = 0
+        self.erros = 0
+
+        self._thread = threading.Thread(target=self._escrever, name="log-estruturado", daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    def registrar(self, tipo, **campos):
+        """Enfileira um registro; não faz E/S no chamador"""
+        if self._fechado:
+            return False
+        registro = (time.time(), tipo, campos)
+        if self.politica == BLOQUEAR:
+            self._fila.put(registro)
+            return True
+        try:
+            self._fila.put_nowait(registro)
+            return True
+        except queue.Full:
+            self.descartados += 1
+            return False
+
+    def descarregar(self, timeout=None):
+        """Aguarda até que todos os registros já enfileirados estejam no arquivo"""
+        if self._fechado:
+            return
+        marcador = _Descarga()
+        self._fila.put(marcador)
+        marcador.concluida.wait(timeout)
+
+    def fechar(self):
+        """Grava o que falta, encerra a thread escritora e fecha o arquivo"""
+        if self._fechado:
+            return
+        self._fechado = True
+        # Fechado explicitamente: o atexit deixa de manter este logger vivo até o fim do processo
+        atexit.unregister(self.fechar)
+        self._fila.put(_FIM)
+        self._thread.join()
+
+    def _escrever(self):
+        """Laço da thread escritora"""
+        lote = []
+        ultimo_flush = time.monotonic()
+        while True:
+            espera = max(0.0, self.intervalo_flush - (time.monotonic() - ultimo_flush))
+            try:
+                item = self._fila.get(timeout=espera)
+            except queue.Empty:
+                item = None
+
+            if item is _FIM:
+                self._gravar(lote)
+                self._fechar_arquivo()
+                return
+            if isinstance(item, _Descarga):
+                self._gravar(lote)
+                lote = []
+                ultimo_flush = time.monotonic()
+                item.concluida.set()
+                continue
+            if item is not None:
+                lote.append(item)
+
+            if len(lote) >= self.tamanho_lote or time.monotonic() - ultimo_flush >= self.intervalo_flush:
+                self._gravar(lote)
+                lote = []
+                ultimo_flush = time.monotonic()
+
+    def _gravar(self, lote):
+        """Serializa o lote em JSON Lines e grava com uma única escrita"""
+        if not lote:
+            return
+        linhas = []
+        for instante, tipo, campos in lote:
+            registro = {"instante": datetime.datetime.fromtimestamp(instante).isoformat(), "tipo": tipo}
+            registro.update(campos)
+            linhas.append(json.dumps(registro, ensure_ascii=False, default=str))
+        try:
+            if self._arquivo is None:
+                self._arquivo = open(self.caminho, "a", encoding="utf-8")
+            self._arquivo.write("\n".join(linhas) + "\n")
+            self._arquivo.flush()
+            self.escritos += len(lote)
+        except OSError:
+            self.erros += len(lote)
+
+    def _fechar_arquivo(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
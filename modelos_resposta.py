@@ -0,0 +1,322 @@
+"""
+Modelos de Resposta Pré-Renderizados - Plena Saúde
+Textos fixos e blocos por região montados uma única vez; apenas os trechos dinâmicos são preenchidos por mensagem
+"""
+
+import string
+import tracemalloc
+
+from sistema_cotacao import SistemaCotacaoPlena
+
+
+class Modelo:
+    """Texto com campos {nome}, analisado uma única vez.
+
+    ``preencher`` apenas intercala os trechos fixos com os valores (já formatados como texto).
+    """
+
+    __slots__ = ("texto", "campos", "_trechos")
+
+    def __init__(self, texto):
+        self.texto = texto
+        self._trechos = []
+        campos = []
+        for literal, campo, especificacao, conversao in string.Formatter().parse(texto):
+            if especificacao or conversao:
+                raise ValueError(f"Formatação não suportada no campo {campo!r}: formate o valor antes")
+            self._trechos.append(literal)
+            if campo is not None:
+                campos.append(campo)
+        self.campos = tuple(campos)
+
+    def fixar(self, **valores):
+        """Novo modelo com alguns campos já preenchidos (os demais continuam como campos)"""
+        trechos = self._trechos
+        novo = Modelo.__new__(Modelo)
+        novo.texto = None
+        novo._trechos = [trechos[0]]
+        campos = []
+        for indice, campo in enumerate(self.campos, 1):
+            if campo in valores:
+                novo._trechos[-1] += valores[campo] + trechos[indice]
+            else:
+                campos.append(campo)
+                novo._trechos.append(trechos[indice])
+        novo.campos = tuple(campos)
+        return novo
+
+    def preencher(self, **valores):
+        trechos = self._trechos
+        partes = [trechos[0]]
+        for indice, campo in enumerate(self.campos, 1):
+            partes.append(valores[campo])
+            partes.append(trechos[indice])
+        return "".join(partes)
+
+
+# Regiões atendidas, na ordem das opções do menu
+REGIOES = {
+    "1": "Francisco Morato",
+    "2": "Caieiras",
+    "3": "Perus",
+    "4": "Outra região"
+}
+
+COBERTURAS = {
+    "1": "basico",
+    "2": "intermediario",
+    "3": "completo"
+}
+
+MENU_TIPO_PLANO = """1. Você (individual)
+2. Sua família
+3. Sua empresa (plano empresarial/PME)"""
+
+PERGUNTA_TIPO_PLANO = Modelo("""{nome}, você está buscando um plano de saúde para:
+""" + MENU_TIPO_PLANO + """
+
+Responda com o número da opção desejada.""")
+
+TIPO_PLANO_INVALIDO = """Desculpe, não entendi sua escolha. Por favor, responda com o número da opção desejada:
+""" + MENU_TIPO_PLANO
+
+PERGUNTA_REGIAO = """Em qual região você reside ou pretende utilizar mais o plano?
+1. Francisco Morato
+2. Caieiras
+3. Perus
+4. Outra região
+
+Responda com o número da opção desejada."""
+
+REGIAO_INVALIDA = """Por favor, escolha uma das opções disponíveis:
+1. Francisco Morato
+2. Caieiras
+3. Perus
+4. Outra região"""
+
+PERGUNTA_PREFERENCIA = """1. Sim
+2. Não tenho preferência específica
+
+Se sim, qual hospital?"""
+
+REGIAO_FORA_DE_COBERTURA = """A Plena Saúde tem foco de atendimento nas regiões de Francisco Morato, Caieiras e Perus. 
+Em outras regiões, o atendimento pode ser limitado.
+
+Você tem preferência por algum hospital específico na região?
+""" + PERGUNTA_PREFERENCIA
+
+HOSPITAIS_DA_REGIAO = Modelo("""Na região de {regiao}, temos os seguintes hospitais disponíveis:
+
+{hospitais}
+
+Você tem preferência por algum desses hospitais?
+""" + PERGUNTA_PREFERENCIA)
+
+PERGUNTA_COBERTURA = """Qual tipo de cobertura você está buscando?
+1. Básica (Plena Essencial) - Cobertura essencial com menor custo
+2. Intermediária (Plena Plus) - Boa cobertura com custo-benefício equilibrado
+3. Completa (Plena Premium) - Cobertura ampla com mais benefícios
+
+Responda com o número da opção desejada."""
+
+COBERTURA_INVALIDA = """Por favor, escolha uma das opções disponíveis:
+1. Básica (Plena Essencial)
+2. Intermediária (Plena Plus)
+3. Completa (Plena Premium)"""
+
+PERGUNTA_COPARTICIPACAO = """Você prefere um plano com ou sem coparticipação?
+
+Com coparticipação: Mensalidade mais baixa, mas você paga uma pequena parte ao utilizar alguns serviços
+Sem coparticipação: Mensalidade um pouco mais alta, mas sem pagamentos adicionais ao utilizar os serviços
+
+1. Com coparticipação
+2. Sem coparticipação
+
+Responda com o número da opção desejada."""
+
+COPARTICIPACAO_INVALIDA = """Por favor, escolha uma das opções disponíveis:
+1. Com coparticipação
+2. Sem coparticipação"""
+
+COTACAO = Modelo("""Com base nas informações que você me forneceu, preparei uma cotação para o plano {nome_plano} ({tipo_plano}) da Plena Saúde:
+
+Valor mensal: R$ {valor_mensal}{desconto}
+{coparticipacao}
+Quantidade de vidas: {quantidade_vidas}
+Rede hospitalar: {hospital_premium}
+
+Cobertura:
+{cobertura}{comparativo}
+
+Gostaria de receber mais detalhes sobre este plano ou prosseguir com a contratação?""")
+
+RESPOSTA_CARENCIA = """Sobre a carência dos planos da Plena Saúde:
+
+- Urgência e emergência: 24 horas
+- Consultas e exames simples: 30 dias
+- Exames complexos: 90 dias
+- Internações e cirurgias: 180 dias
+- Parto: 300 dias
+
+Lembrando que estas são condições gerais e podem variar conforme o plano escolhido.
+
+Em que mais posso ajudar?"""
+
+RESPOSTA_DOCUMENTACAO = """Para contratação do plano, você precisará dos seguintes documentos:
+
+Para pessoa física:
+- RG e CPF de todos os beneficiários
+- Comprovante de residência atualizado
+- Cartão do SUS
+
+Para empresas (PME):
+- Contrato social
+- Cartão CNPJ
+- Documentos dos sócios (RG e CPF)
+- Documentos dos beneficiários (RG e CPF)
+- Comprovante de vínculo empregatício
+
+Em que mais posso ajudar?"""
+
+RESPOSTA_INICIO_USO = """Após a contratação e pagamento do primeiro boleto, o plano estará ativo a partir da data de vigência informada no contrato, geralmente no primeiro dia do mês seguinte à contratação.
+
+Você receberá as carteirinhas digitais por e-mail e poderá utilizar os serviços respeitando os períodos de carência.
+
+Em que mais posso ajudar?"""
+
+ENCAMINHAMENTO = Modelo("""Ótimo, {nome}! Para finalizar sua contratação, vou encaminhar suas informações para {corretor}, que entrará em contato com você em breve para concluir o processo.
+
+O pagamento do primeiro boleto será feito diretamente ao corretor.
+
+Tem mais alguma dúvida que eu possa esclarecer?""")
+
+ENCERRAMENTO = """Foi um prazer ajudar você! Se surgir qualquer outra dúvida sobre os planos da Plena Saúde, estou à disposição.
+
+Tenha um ótimo dia! 😊"""
+
+ERRO_PROCESSAMENTO = """Desculpe, tive um problema ao processar sua mensagem. Pode enviá-la novamente, por favor?"""
+
+
+def _lista(itens):
+    return "\n".join([f"- {item}" for item in itens])
+
+
+class RegistroRespostas:
+    """Respostas que dependem do sistema de cotação, pré-renderizadas na inicialização.
+
+    A resposta completa de cada região do menu é montada uma vez; o texto fixo de
+    cada plano é montado na primeira cotação desse plano e reaproveitado.
+    Chame ``atualizar`` se a rede hospitalar do sistema de cotação mudar.
+    """
+
+    def __init__(self, sistema_cotacao):
+        self.sistema_cotacao = sistema_cotacao
+        self.atualizar()
+
+    def atualizar(self):
+        self.respostas_regiao = {}
+        for opcao, regiao in REGIOES.items():
+            if opcao == "4":
+                self.respostas_regiao[opcao] = REGIAO_FORA_DE_COBERTURA
+            else:
+                hospitais = _lista(self.sistema_cotacao.listar_hospitais_regiao(regiao))
+                self.respostas_regiao[opcao] = HOSPITAIS_DA_REGIAO.preencher(regiao=regiao, hospitais=hospitais)
+        self._modelos_cotacao = {}
+
+    def cotacao(self, cotacao, desconto="", comparativo=""):
+        """Texto de apresentação da cotação.
+
+        O texto de cada combinação de plano, coparticipação e rede (inclusive a lista
+        de cobertura) é montado uma vez; por mensagem só entram valor, desconto e vidas.
+        """
+        chave = (cotacao["nome_plano"], cotacao["tipo_plano"], cotacao["coparticipacao"],
+                 cotacao["hospital_premium"], tuple(cotacao["cobertura"]))
+        modelo = self._modelos_cotacao.get(chave)
+        if modelo is None:
+            modelo = self._modelos_cotacao[chave] = COTACAO.fixar(
+                nome_plano=chave[0], tipo_plano=chave[1], coparticipacao=chave[2],
+                hospital_premium=chave[3], cobertura=_lista(chave[4]))
+        return modelo.preencher(valor_mensal=f"{cotacao['valor_mensal']:.2f}", desconto=desconto,
+                                quantidade_vidas=str(cotacao["quantidade_vidas"]),
+                                comparativo=comparativo)
+
+    def comparativo(self, matriz, tipo_cobertura, coparticipacao, hospital_premium=None):
+        """Resumo compacto (para WhatsApp) da matriz de gerar_matriz_cotacoes.
+
+        Mostra cada plano sem / com coparticipação na rede escolhida e, para o plano
+        e a coparticipação escolhidos, o valor em cada rede hospitalar.
+        """
+        nomes = self.sistema_cotacao.NOMES_PLANOS
+        linhas = ["", "", "Compare as opções (valor mensal sem / com coparticipação):"]
+        for cobertura, nome in nomes.items():
+            sem = matriz.get((cobertura, "sem", hospital_premium))
+            com = matriz.get((cobertura, "com", hospital_premium))
+            if sem is not None and com is not None:
+                linhas.append(f"- {nome}: R$ {sem:.2f} / R$ {com:.2f}")
+
+        texto_coparticipacao = "com" if coparticipacao == "com" else "sem"
+        linhas.append("")
+        linhas.append(f"Rede hospitalar ({nomes.get(tipo_cobertura, 'Plena Plus')}, "
+                      f"{texto_coparticipacao} coparticipação):")
+        for (cobertura, opcao_coparticipacao, hospital), valor in matriz.items():
+            if cobertura == tipo_cobertura and opcao_coparticipacao == coparticipacao:
+                linhas.append(f"- {hospital or 'Rede padrão Plena Saúde'}: R$ {valor:.2f}")
+        return "\n".join(linhas)
+
+
+# Comparação de alocação por resposta: montagem a cada chamada x registro pré-renderizado
+if __name__ == "__main__":
+    sistema = SistemaCotacaoPlena()
+    registro = RegistroRespostas(sistema)
+    cotacao = sistema.gerar_cotacao("familiar", [35, 32, 5, 3], "intermediario", "sem")
+
+    def regiao_por_chamada():
+        hospitais = sistema.listar_hospitais_regiao("Caieiras")
+        hospitais_texto = "\n".join([f"- {hospital}" for hospital in hospitais])
+        return f"""Na região de {"Caieiras"}, temos os seguintes hospitais disponíveis:
+
+{hospitais_texto}
+
+Você tem preferência por algum desses hospitais?
+1. Sim
+2. Não tenho preferência específica
+
+Se sim, qual hospital?"""
+
+    def cotacao_por_chamada():
+        cobertura_texto = "\n".join([f"- {item}" for item in cotacao["cobertura"]])
+        return f"""Com base nas informações que você me forneceu, preparei uma cotação para o plano {cotacao["nome_plano"]} ({cotacao["tipo_plano"]}) da Plena Saúde:
+
+Valor mensal: R$ {cotacao["valor_mensal"]:.2f}
+{cotacao["coparticipacao"]}
+Quantidade de vidas: {cotacao["quantidade_vidas"]}
+Rede hospitalar: {cotacao["hospital_premium"]}
+
+Cobertura:
+{cobertura_texto}
+
+Gostaria de receber mais detalhes sobre este plano ou prosseguir com a contratação?"""
+
+    def medir(chamada, repeticoes=1000):
+        """Pico médio de memória alocada (bytes) durante uma chamada"""
+        tracemalloc.start()
+        total = 0
+        for _ in range(repeticoes):
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            chamada()
+            _, pico = tracemalloc.get_traced_memory()
+            total += pico - base
+        tracemalloc.stop()
+        return total / repeticoes
+
+    assert regiao_por_chamada() == registro.respostas_regiao["2"]
+    assert cotacao_por_chamada() == registro.cotacao(cotacao)
+    print(registro.cotacao(cotacao, comparativo=registro.comparativo(
+        sistema.gerar_matriz_cotacoes("familiar", [35, 32, 5, 3]), "intermediario", "sem")))
+    print()
+
+    print(f"Região (por chamada):     {medir(regiao_por_chamada):8.0f} bytes")
+    print(f"Região (pré-renderizada): {medir(lambda: registro.respostas_regiao['2']):8.0f} bytes")
+    print(f"Cotação (por chamada):    {medir(cotacao_por_chamada):8.0f} bytes")
+    print(f"Cotação (modelo):         {medir(lambda: registro.cotacao(cotacao)):8.0f} bytes")
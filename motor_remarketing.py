@@ -0,0 +1,466 @@
+"""
+Motor de Remarketing - Plena Saúde
+Ciclo de remarketing separado da conversa: trabalha sobre retratos imutáveis dos leads e pode rodar em outra thread
+
+Uso (teste de estresse: conversas e remarketing em paralelo, sem vazamento entre clientes):
+    python motor_remarketing.py --clientes 300 --ciclos 200
+"""
+
+import threading
+import time
+from collections import namedtuple
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from agendador_remarketing import AgendadorRemarketing
+from arquivo_leads import ArquivoLeads
+
+# Retrato de um lead em remarketing. Nunca é alterado: cada tentativa publica um novo
+# retrato no lugar do anterior. ``dados_cliente`` é uma cópia congelada da conversa
+# (None para leads do arquivo mapeado, cujos dados só são lidos no retorno do cliente).
+LeadRemarketing = namedtuple("LeadRemarketing", [
+    "telefone", "estado", "nome", "tentativas", "ultima_tentativa", "dados_cliente",
+])
+
+
+def congelar(valor):
+    """Cópia somente leitura: dicionários viram MappingProxyType e listas viram tuplas"""
+    if isinstance(valor, Mapping):
+        return MappingProxyType({chave: congelar(item) for chave, item in valor.items()})
+    if isinstance(valor, (list, tuple)):
+        return tuple(congelar(item) for item in valor)
+    return valor
+
+
+def descongelar(valor):
+    """Cópia comum (e alterável) de um valor congelado"""
+    if isinstance(valor, Mapping):
+        return {chave: descongelar(item) for chave, item in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [descongelar(item) for item in valor]
+    return valor
+
+
+def texto_remarketing(estado, nome, tentativa):
+    """Mensagem de remarketing para o estado em que a conversa parou e a tentativa atual"""
+    nome = nome if nome else "Olá"
+
+    # Mensagens de remarketing baseadas no estado da conversa
+    if estado in ["coletar_nome", "coletar_telefone", "coletar_email"]:
+        # Cliente abandonou no início do processo
+        if tentativa == 1:
+            return f"{nome}, notamos que você começou a cotar um plano de saúde da Plena Saúde. Podemos ajudar com alguma informação adicional? Estamos à disposição para continuar o atendimento."
+        elif tentativa == 2:
+            return f"{nome}, ainda está interessado em conhecer os planos de saúde da Plena Saúde? Temos opções que cabem no seu bolso com excelente cobertura nas regiões de Francisco Morato, Caieiras e Perus."
+        else:
+            return f"{nome}, última chance! Aproveite condições especiais nos planos da Plena Saúde. Responda esta mensagem para retomar sua cotação com um desconto exclusivo."
+
+    elif estado in ["identificar_tipo_plano", "coletar_quantidade_vidas", "coletar_idades"]:
+        # Cliente forneceu informações básicas mas não completou dados do plano
+        if tentativa == 1:
+            return f"{nome}, você estava cotando um plano de saúde da Plena Saúde. Faltam apenas alguns dados para concluirmos sua cotação personalizada. Podemos continuar?"
+        elif tentativa == 2:
+            return f"{nome}, estamos quase finalizando sua cotação do plano Plena Saúde! Responda esta mensagem para continuarmos e você descobrir quanto economizaria com nossos planos."
+        else:
+            return f"{nome}, última oportunidade! Temos uma oferta especial para você. Conclua sua cotação e ganhe 5% de desconto na primeira mensalidade do seu plano Plena Saúde."
+
+    elif estado in ["coletar_regiao", "preferencia_hospital", "coletar_tipo_cobertura", "coletar_coparticipacao"]:
+        # Cliente forneceu dados principais mas não chegou à cotação
+        if tentativa == 1:
+            return f"{nome}, você estava muito próximo de receber sua cotação personalizada da Plena Saúde! Falta pouco para concluir. Podemos continuar de onde paramos?"
+        elif tentativa == 2:
+            return f"{nome}, sua cotação da Plena Saúde está quase pronta! Responda esta mensagem para receber os valores e conhecer todos os benefícios do plano."
+        else:
+            return f"{nome}, oferta exclusiva! Conclua sua cotação agora e ganhe 10% de desconto na primeira mensalidade do seu plano Plena Saúde. Esta oferta é válida apenas por 24 horas!"
+
+    elif estado in ["apresentar_cotacao", "encaminhar_corretor"]:
+        # Cliente recebeu cotação mas não finalizou
+        if tentativa == 1:
+            return f"{nome}, notamos que você recebeu uma cotação do plano Plena Saúde. Ficou alguma dúvida que possamos esclarecer? Estamos à disposição!"
+        elif tentativa == 2:
+            return f"{nome}, que tal agendar uma conversa com um de nossos consultores para esclarecer todas as suas dúvidas sobre o plano Plena Saúde? Responda esta mensagem para agendarmos."
+        else:
+            return f"{nome}, última chance! Aproveite condições exclusivas na contratação do seu plano Plena Saúde: isenção de carência para consultas e exames simples. Oferta válida por 24 horas!"
+
+    # Mensagem genérica caso nenhuma condição seja atendida
+    return f"{nome}, sentimos sua falta! Estamos à disposição para continuar o atendimento sobre os planos da Plena Saúde. Podemos ajudar em algo?"
+
+
+class MotorRemarketing:
+    """Leads em remarketing, agenda de envios e geração das mensagens, sem estado de conversa.
+
+    Cada lead é um ``LeadRemarketing`` imutável: o ciclo lê o retrato, publica um novo
+    (tentativa somada) e monta o texto só a partir dele, então nunca toca no
+    ``dados_cliente`` de uma conversa em andamento. Uma trava protege apenas a troca
+    dos retratos e a agenda; o texto é montado e entregue fora dela. Assim o ciclo
+    pode rodar em uma thread própria (``iniciar``) enquanto as conversas são
+    atendidas. O motor não guarda referências à IA e pode ficar em outro processo
+    (ex: um por shard), recebendo ``inscrever``/``retomar`` pela fila do processo.
+    """
+
+    def __init__(self, max_tentativas=3, intervalo_entre_tentativas=24 * 60 * 60, prefixo="",
+                 armazenamento=None, log=None):
+        self.max_tentativas = max_tentativas
+        self.intervalo_entre_tentativas = intervalo_entre_tentativas
+        self.prefixo = prefixo  # ex: "[TESTE] " no modo de teste
+
+        # Armazenamento persistente opcional (ex: GravacaoAdiada) e log opcional (LogEstruturado)
+        self.armazenamento = armazenamento
+        self.log = log
+
+        self._leads = {}  # telefone -> LeadRemarketing
+        self._agendador = AgendadorRemarketing()
+        self._trava = threading.RLock()
+
+        # Arquivo mapeado opcional com os leads (veja arquivar); com ele, a agenda em
+        # memória guarda só os envios previstos até _horizonte_agenda
+        self.arquivo_leads = None
+        self.janela_agenda = 60 * 60  # 1 hora em segundos
+        self._horizonte_agenda = None
+
+        self._parar = threading.Event()
+        self._thread = None
+
+    # Leads
+
+    def inscrever(self, telefone, dados_cliente, estado, ultima_tentativa):
+        """Coloca (ou atualiza) o lead em remarketing a partir de uma cópia dos dados da conversa"""
+        with self._trava:
+            if self.arquivo_leads is not None:
+                self.arquivo_leads[telefone] = {"dados_cliente": dict(dados_cliente), "estado": estado,
+                                                "ultima_tentativa": ultima_tentativa}
+            else:
+                self._leads[telefone] = LeadRemarketing(telefone, estado, dados_cliente["nome"],
+                                                        dados_cliente["tentativas_remarketing"],
+                                                        ultima_tentativa, congelar(dados_cliente))
+            self._agendar_proxima_tentativa(telefone, ultima_tentativa)
+            self._persistir(telefone)
+
+    def retomar(self, telefone):
+        """Cliente voltou a conversar: tira o lead do remarketing e retorna (dados_cliente, estado).
+
+        ``dados_cliente`` é uma cópia nova, que a conversa pode alterar à vontade; as
+        tentativas já feitas seguem nela, então uma nova inscrição continua a contagem.
+        Retorna None se o telefone não está em remarketing.
+        """
+        with self._trava:
+            if self.arquivo_leads is not None:
+                if telefone not in self.arquivo_leads:
+                    return None
+                dados = self.arquivo_leads[telefone]
+                dados_cliente, estado = dados["dados_cliente"], dados["estado"]
+            else:
+                lead = self._leads.get(telefone)
+                if lead is None:
+                    return None
+                dados_cliente, estado = self._dados_atuais(lead), lead.estado
+            self.remover(telefone)
+        return dados_cliente, estado
+
+    def remover(self, telefone):
+        """Tira o lead do remarketing"""
+        with self._trava:
+            if self.arquivo_leads is not None:
+                self.arquivo_leads.pop(telefone, None)
+            else:
+                self._leads.pop(telefone, None)
+            self._agendador.cancelar(telefone)
+            self._persistir(telefone)
+
+    def obter(self, telefone):
+        """Retrato atual do lead (ou None)"""
+        with self._trava:
+            return self._retrato(telefone)
+
+    def __contains__(self, telefone):
+        with self._trava:
+            return telefone in (self.arquivo_leads if self.arquivo_leads is not None else self._leads)
+
+    def __len__(self):
+        return len(self.arquivo_leads if self.arquivo_leads is not None else self._leads)
+
+    def _retrato(self, telefone):
+        if self.arquivo_leads is None:
+            return self._leads.get(telefone)
+        # Leitura direta do registro mapeado, sem carregar o dados_cliente do lead
+        resumo = self.arquivo_leads.ler_resumo(telefone)
+        if resumo is None:
+            return None
+        return LeadRemarketing(telefone, resumo.estado, resumo.nome, resumo.tentativas,
+                               resumo.ultima_tentativa, None)
+
+    @staticmethod
+    def _dados_atuais(lead):
+        """dados_cliente do lead (cópia alterável) com as tentativas já feitas"""
+        dados_cliente = descongelar(lead.dados_cliente)
+        dados_cliente["tentativas_remarketing"] = lead.tentativas
+        return dados_cliente
+
+    # Ciclo de remarketing
+
+    def verificar(self, agora=None, ignorar=None):
+        """Executa o ciclo e retorna todas as mensagens ({"telefone", "mensagem"}) a enviar"""
+        return list(self.gerar(agora, ignorar))
+
+    def gerar(self, agora=None, ignorar=None):
+        """Gera as mensagens vencidas uma a uma, processando cada lead à medida que é consumido.
+
+        ``ignorar`` é um telefone que não deve ser tratado neste ciclo (ex: a conversa
+        atual da IA, já verificada); seu envio é conferido de novo no próximo ciclo.
+        """
+        agora = time.time() if agora is None else agora
+        with self._trava:
+            # Leads arquivados: trazer para a agenda os envios que entram na próxima janela
+            if self.arquivo_leads is not None and agora >= self._horizonte_agenda:
+                self._carregar_agenda(agora)
+            vencidos = self._agendador.iterar_vencidos(agora)
+
+        while True:
+            with self._trava:
+                lead = self._proxima_tentativa(vencidos, agora, ignorar)
+            if lead is None:
+                return
+
+            # Montado só a partir do retrato, fora da trava
+            mensagem = texto_remarketing(lead.estado, lead.nome, lead.tentativas)
+            self._registrar_log("REMARKETING_ENVIADO", f"Tentativa {lead.tentativas} para {lead.telefone}",
+                                mensagem, lead)
+            yield {"telefone": lead.telefone, "mensagem": self.prefixo + mensagem}
+
+    def _proxima_tentativa(self, vencidos, agora, ignorar):
+        """Avança a agenda até o próximo lead a receber mensagem e publica o seu novo retrato"""
+        for telefone in vencidos:
+            lead = self._retrato(telefone)
+            if lead is None:
+                continue
+
+            # Pular o telefone ignorado (verificar de novo no próximo ciclo)
+            if telefone == ignorar:
+                self._agendar_envio(telefone, agora)
+                continue
+
+            # Verificar se é hora de enviar nova tentativa
+            if (lead.tentativas < self.max_tentativas and
+                    (agora - lead.ultima_tentativa) > self.intervalo_entre_tentativas):
+                if self.arquivo_leads is not None:
+                    tentativas = self.arquivo_leads.registrar_tentativa(telefone, agora)
+                    lead = lead._replace(tentativas=tentativas, ultima_tentativa=agora)
+                else:
+                    lead = self._leads[telefone] = lead._replace(tentativas=lead.tentativas + 1,
+                                                                 ultima_tentativa=agora)
+                self._agendar_proxima_tentativa(telefone, agora)
+                self._persistir(telefone)
+                return lead
+
+            # Remover clientes que atingiram o limite de tentativas
+            elif lead.tentativas >= self.max_tentativas:
+                self._registrar_log("REMARKETING_ENCERRADO", f"Limite de tentativas atingido para {telefone}",
+                                    "Cliente removido da lista de remarketing", lead)
+                if self.arquivo_leads is not None:
+                    del self.arquivo_leads[telefone]
+                else:
+                    del self._leads[telefone]
+                self._persistir(telefone)
+
+            # Ainda não é hora (ex: agendamento antigo): voltar para a agenda
+            else:
+                self._agendar_proxima_tentativa(telefone, lead.ultima_tentativa)
+        return None
+
+    def _registrar_log(self, tipo, mensagem, resposta, lead):
+        # Só dados do próprio lead: nada da conversa que a IA estiver atendendo
+        if self.log is not None:
+            self.log.registrar(tipo, mensagem=mensagem, resposta=resposta, telefone=lead.telefone,
+                               estado_lead=lead.estado)
+
+    # Agenda
+
+    def agendar_proxima_tentativa(self, telefone, ultima_tentativa):
+        """Agenda a próxima verificação de remarketing do telefone"""
+        with self._trava:
+            self._agendar_proxima_tentativa(telefone, ultima_tentativa)
+
+    def _agendar_proxima_tentativa(self, telefone, ultima_tentativa):
+        if self._retrato(telefone).tentativas >= self.max_tentativas:
+            # Limite atingido: remover na próxima verificação
+            self._agendar_envio(telefone, ultima_tentativa)
+        else:
+            self._agendar_envio(telefone, ultima_tentativa + self.intervalo_entre_tentativas)
+
+    def _agendar_envio(self, telefone, instante):
+        """Agenda o envio; com o arquivo de leads, só entra na agenda em memória se estiver na janela"""
+        if self.arquivo_leads is not None:
+            self.arquivo_leads.agendar(telefone, instante)
+            if instante >= self._horizonte_agenda:
+                # Fica só no arquivo até a varredura da janela em que vence
+                self._agendador.cancelar(telefone)
+                return
+        self._agendador.agendar(telefone, instante)
+
+    def _carregar_agenda(self, agora):
+        """Varre o arquivo de leads e agenda em memória os envios previstos até a próxima janela"""
+        self._horizonte_agenda = agora + self.janela_agenda
+        for telefone, instante in self.arquivo_leads.vencendo(self._horizonte_agenda):
+            self._agendador.agendar(telefone, instante)
+
+    def proximos_envios(self, limite=10):
+        """Lista os próximos envios de remarketing agendados como (telefone, instante)"""
+        with self._trava:
+            return self._agendador.proximos_envios(limite)
+
+    # Persistência
+
+    def arquivar(self, caminho):
+        """Passa a guardar os leads em um arquivo mapeado em memória.
+
+        Os leads já em memória são gravados no arquivo; se o arquivo já existir (ex: após
+        um reinício), os leads dele são retomados. Retorna a quantidade de leads arquivados.
+        """
+        with self._trava:
+            arquivo = ArquivoLeads(caminho)
+            for telefone, lead in self._leads.items():
+                arquivo[telefone] = self._registro(lead)
+                instante = self._agendador.instante_agendado(telefone)
+                arquivo.agendar(telefone, instante if instante is not None else lead.ultima_tentativa)
+
+            self.arquivo_leads = arquivo
+            self._leads = {}
+            self._agendador = AgendadorRemarketing()
+            self._carregar_agenda(time.time())
+            return len(arquivo)
+
+    def _registro(self, lead):
+        """Lead no formato gravado no armazenamento e no arquivo de leads"""
+        return {"dados_cliente": self._dados_atuais(lead), "estado": lead.estado,
+                "ultima_tentativa": lead.ultima_tentativa}
+
+    def _persistir(self, telefone):
+        """Agenda a gravação do lead (ou a remoção, se saiu da lista)"""
+        # O arquivo de leads já é persistente
+        if self.armazenamento is not None and self.arquivo_leads is None:
+            lead = self._leads.get(telefone)
+            self.armazenamento.marcar("remarketing", telefone,
+                                      (lambda: self._registro(lead)) if lead is not None else None)
+
+    def restaurar(self):
+        """Recarrega do armazenamento os leads em remarketing e reconstrói a agenda"""
+        with self._trava:
+            if self.arquivo_leads is not None:
+                self._carregar_agenda(time.time())
+                return len(self.arquivo_leads)
+            if self.armazenamento is None:
+                return 0
+            for telefone, dados in self.armazenamento.ler_recentes("remarketing"):
+                dados_cliente = dados["dados_cliente"]
+                self._leads[telefone] = LeadRemarketing(telefone, dados["estado"], dados_cliente["nome"],
+                                                        dados_cliente["tentativas_remarketing"],
+                                                        dados["ultima_tentativa"], congelar(dados_cliente))
+                self._agendar_proxima_tentativa(telefone, dados["ultima_tentativa"])
+            return len(self._leads)
+
+    # Execução em segundo plano
+
+    def iniciar(self, entregar, intervalo=60.0):
+        """Executa o ciclo a cada ``intervalo`` segundos em uma thread de fundo.
+
+        Cada mensagem gerada é passada a ``entregar(telefone, mensagem)``.
+        """
+        if self._thread is not None:
+            return
+        self._parar.clear()
+
+        def executar():
+            while not self._parar.wait(intervalo):
+                for item in self.gerar():
+                    entregar(item["telefone"], item["mensagem"])
+
+        self._thread = threading.Thread(target=executar, name="motor-remarketing", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        if self._thread is not None:
+            self._parar.set()
+            self._thread.join()
+            self._thread = None
+
+
+# Teste de estresse: uma thread atende conversas enquanto outra executa o remarketing
+if __name__ == "__main__":
+    import argparse
+    import random
+    import re
+
+    from ia_vendedora_remarketing import IAVendedoraPlenaIntegrada
+    from sessoes import GerenciadorSessoes, decodificar
+
+    parser = argparse.ArgumentParser(description="Conversas e remarketing em paralelo, sem vazamento entre clientes")
+    parser.add_argument("--clientes", type=int, default=300, help="clientes em conversa/remarketing")
+    parser.add_argument("--ciclos", type=int, default=200, help="ciclos de remarketing executados em paralelo")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    gerenciador = GerenciadorSessoes(ia=IAVendedoraPlenaIntegrada())
+    motor = gerenciador.ia.motor_remarketing
+    motor.intervalo_entre_tentativas = 0  # todo lead volta a vencer a cada ciclo
+    motor.max_tentativas = 10 ** 9
+    telefones = [f"5511{indice:09d}" for indice in range(args.clientes)]
+    nomes = {telefone: f"Cliente {indice:05d}" for indice, telefone in enumerate(telefones)}
+    padrao_nome = re.compile(r"Cliente \d{5}")
+
+    # Todos começam a conversa e vão para o remarketing
+    for telefone in telefones:
+        for mensagem in ("Olá", nomes[telefone], telefone, f"{telefone}@email.com", "2"):
+            gerenciador.processar_mensagem(telefone, mensagem)
+        gerenciador.marcar_inativa(telefone)
+
+    erros = []
+    enviadas = [0]
+    parar = threading.Event()
+
+    def remarketing():
+        for _ in range(args.ciclos):
+            for item in motor.gerar(time.time() + 1):
+                enviadas[0] += 1
+                encontrados = set(padrao_nome.findall(item["mensagem"]))
+                if encontrados != {nomes[item["telefone"]]}:
+                    erros.append(("remarketing", item["telefone"], sorted(encontrados)))
+        parar.set()
+
+    thread = threading.Thread(target=remarketing, name="remarketing")
+    aleatorio = random.Random(args.semente)
+    respondidas = 0
+    thread.start()
+    # Clientes voltam, continuam a conversa e saem de novo, enquanto o remarketing corre
+    while not parar.is_set():
+        telefone = aleatorio.choice(telefones)
+        saudacoes = 0
+        for mensagem in ("Oi, voltei", "3", "30, 25, 2"):
+            resposta = gerenciador.processar_mensagem(telefone, mensagem)
+            respondidas += 1
+            saudacoes += "Que bom ver você novamente" in resposta
+            encontrados = set(padrao_nome.findall(resposta))
+            if encontrados - {nomes[telefone]}:
+                erros.append(("conversa", telefone, sorted(encontrados)))
+        sessao = gerenciador.sessoes[telefone]
+        if sessao.nome != nomes[telefone] or sessao.telefone != telefone:
+            erros.append(("sessao", telefone, sessao.nome))
+        # O retorno é retomado uma única vez, a conversa avança e o lead sai da agenda
+        if saudacoes != 1:
+            erros.append(("saudacao", telefone, saudacoes))
+        if decodificar(sessao.estado_atual) == "coletar_idades":
+            erros.append(("estado", telefone, "coletar_idades"))
+        if motor.obter(telefone) is not None:
+            erros.append(("retomado", telefone, "lead continua em remarketing"))
+        gerenciador.marcar_inativa(telefone)
+    thread.join()
+
+    for telefone in telefones:
+        lead = motor.obter(telefone)
+        if lead.nome != nomes[telefone] or lead.dados_cliente["telefone"] != telefone:
+            erros.append(("lead", telefone, lead.nome))
+
+    print(f"Mensagens de remarketing: {enviadas[0]}, respostas de conversa: {respondidas}")
+    if erros:
+        print(f"FALHA: {len(erros)} erros (vazamentos entre clientes ou retornos), ex: {erros[:5]}")
+        raise SystemExit(1)
+    print("OK: nenhuma mensagem ou sessão recebeu dados de outro cliente; cada retorno foi retomado uma vez")
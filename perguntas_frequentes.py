@@ -0,0 +1,99 @@
+"""
+Classificador de Perguntas Frequentes - Plena Saúde
+Compila as palavras-chave de todas as intenções em um autômato Aho-Corasick (uma passada por mensagem)
+"""
+
+import unicodedata
+
+
+def _montar_tabela_acentos():
+    """Tabela para str.translate que remove acentos dos caracteres latinos (compostos ou não)"""
+    tabela = {}
+    for codigo in range(0xC0, 0x250):
+        caractere = chr(codigo)
+        decomposto = unicodedata.normalize("NFKD", caractere)
+        base = "".join(c for c in decomposto if not unicodedata.combining(c))
+        if base != caractere and base:
+            tabela[codigo] = base
+    # Texto decomposto (NFD, comum em teclados do iOS): a letra vem seguida do acento
+    # combinante, que é simplesmente removido ("c" + U+0327 -> "c")
+    for codigo in range(0x300, 0x370):
+        tabela[codigo] = None
+    return tabela
+
+
+TABELA_ACENTOS = _montar_tabela_acentos()
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos ("Carência" -> "carencia")"""
+    return texto.lower().translate(TABELA_ACENTOS)
+
+
+class ClassificadorPerguntas:
+    """Identifica a intenção de pergunta frequente presente em uma mensagem.
+
+    Mantém a regra original: vence a primeira intenção (na ordem do dicionário) que
+    tiver alguma palavra-chave contida na mensagem. As palavras-chave são compiladas
+    uma única vez; alterações posteriores no dicionário exigem um novo classificador.
+    """
+
+    def __init__(self, perguntas_frequentes):
+        self.intencoes = list(perguntas_frequentes)
+
+        # Trie: transições, link de falha e melhor prioridade (menor índice) que termina em cada nó
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._saida = [None]
+
+        for prioridade, palavras_chave in enumerate(perguntas_frequentes.values()):
+            for palavra in palavras_chave:
+                self._inserir(normalizar(palavra), prioridade)
+        self._calcular_falhas()
+
+    def _inserir(self, palavra, prioridade):
+        no = 0
+        for caractere in palavra:
+            proximo = self._transicoes[no].get(caractere)
+            if proximo is None:
+                proximo = len(self._transicoes)
+                self._transicoes.append({})
+                self._falha.append(0)
+                self._saida.append(None)
+                self._transicoes[no][caractere] = proximo
+            no = proximo
+        if self._saida[no] is None or prioridade < self._saida[no]:
+            self._saida[no] = prioridade
+
+    def _calcular_falhas(self):
+        """Calcula os links de falha em largura e propaga as saídas pelos sufixos"""
+        fila = list(self._transicoes[0].values())
+        for no in fila:
+            for caractere, filho in self._transicoes[no].items():
+                fila.append(filho)
+                falha = self._falha[no]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falha[filho] = destino if destino != filho else 0
+                herdada = self._saida[self._falha[filho]]
+                if herdada is not None and (self._saida[filho] is None or herdada < self._saida[filho]):
+                    self._saida[filho] = herdada
+
+    def classificar(self, mensagem):
+        """Retorna a intenção encontrada na mensagem (ex: "carencia") ou None"""
+        transicoes = self._transicoes
+        falha = self._falha
+        saida = self._saida
+        melhor = None
+        no = 0
+        for caractere in normalizar(mensagem):
+            while no and caractere not in transicoes[no]:
+                no = falha[no]
+            no = transicoes[no].get(caractere, 0)
+            prioridade = saida[no]
+            if prioridade is not None and (melhor is None or prioridade < melhor):
+                melhor = prioridade
+                if melhor == 0:
+                    break
+        return None if melhor is None else self.intencoes[melhor]
@@ -0,0 +1,200 @@
+"""
+Servidor com Sessões Particionadas por Telefone - Plena Saúde
+Distribui as conversas entre vários processos (um shard por processo), preservando a ordem das mensagens de cada cliente
+
+Uso:
+    python servidor_shards.py --shards 4 --sessoes 2000
+"""
+
+import argparse
+import bisect
+import hashlib
+import importlib
+import itertools
+import multiprocessing
+import os
+import time
+
+from sessoes import GerenciadorSessoes
+from sistema_cotacao import SistemaCotacaoPlena
+
+# Variantes da IA que podem ser servidas pelos shards
+VARIANTES = {
+    "integrada": "ia_vendedora_integrada",
+    "remarketing": "ia_vendedora_remarketing",
+}
+
+# Operações enviadas aos shards
+MENSAGENS = "mensagens"
+INATIVAR = "inativar"
+REMARKETING = "remarketing"
+
+
+def _hash(texto):
+    """Hash de 64 bits estável entre processos (hash() muda com PYTHONHASHSEED)"""
+    return int.from_bytes(hashlib.blake2b(texto.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class AnelConsistente:
+    """Hash consistente com nós virtuais: telefone -> índice do shard.
+
+    Ao mudar a quantidade de shards, apenas cerca de 1/N dos telefones troca de shard.
+    """
+
+    def __init__(self, quantidade_shards, replicas=64):
+        if quantidade_shards < 1:
+            raise ValueError("É necessário pelo menos um shard")
+        pontos = sorted((_hash(f"shard-{shard}-{replica}"), shard)
+                        for shard in range(quantidade_shards) for replica in range(replicas))
+        self.quantidade_shards = quantidade_shards
+        self._pontos = [ponto for ponto, _ in pontos]
+        self._shards = [shard for _, shard in pontos]
+
+    def shard(self, telefone):
+        indice = bisect.bisect(self._pontos, _hash(telefone))
+        return self._shards[indice % len(self._shards)]
+
+
+def _executar_shard(indice, variante, entrada, saida):
+    """Laço de um processo shard: dono exclusivo das sessões dos seus telefones"""
+    # Um sistema de cotação por processo, usado apenas para leitura por todas as sessões do shard
+    sistema = SistemaCotacaoPlena()
+    modulo = importlib.import_module(VARIANTES[variante])
+    ia = modulo.IAVendedoraPlenaIntegrada(sistema_cotacao=sistema)
+    gerenciador = GerenciadorSessoes(ia=ia, sistema_cotacao=sistema)
+
+    while True:
+        pedido = entrada.get()
+        if pedido is None:
+            break
+        identificador, operacao, argumentos = pedido
+        try:
+            if operacao == MENSAGENS:
+                resultado = [gerenciador.processar_mensagem(telefone, mensagem)
+                             for telefone, mensagem in argumentos]
+            elif operacao == INATIVAR:
+                resultado = gerenciador.marcar_inativa(argumentos)
+            elif operacao == REMARKETING:
+                resultado = gerenciador.verificar_inatividade()
+            else:
+                raise ValueError(f"Operação desconhecida: {operacao}")
+            saida.put((identificador, indice, True, resultado))
+        except Exception as erro:
+            saida.put((identificador, indice, False, f"{type(erro).__name__}: {erro}"))
+
+
+class RoteadorShards:
+    """Encaminha cada mensagem ao shard dono do telefone e coleta as respostas.
+
+    Cada shard processa sua fila em ordem, então as mensagens de um mesmo cliente
+    são respondidas na ordem de chegada; clientes de shards diferentes andam em paralelo.
+    """
+
+    def __init__(self, quantidade_shards=None, variante="integrada"):
+        if variante not in VARIANTES:
+            raise ValueError(f"Variante inválida: {variante}")
+        self.quantidade_shards = quantidade_shards or os.cpu_count() or 1
+        self.variante = variante
+        self.anel = AnelConsistente(self.quantidade_shards)
+
+        self._saida = multiprocessing.Queue()
+        self._entradas = [multiprocessing.Queue() for _ in range(self.quantidade_shards)]
+        self._processos = [
+            multiprocessing.Process(target=_executar_shard, name=f"shard-{indice}",
+                                    args=(indice, variante, entrada, self._saida), daemon=True)
+            for indice, entrada in enumerate(self._entradas)
+        ]
+        for processo in self._processos:
+            processo.start()
+
+        self._identificadores = itertools.count()
+        self._recebidos = {}
+
+    def _enviar(self, shard, operacao, argumentos):
+        identificador = next(self._identificadores)
+        self._entradas[shard].put((identificador, operacao, argumentos))
+        return identificador
+
+    def _receber(self, identificador):
+        """Aguarda o resultado do pedido, guardando os que chegarem antes"""
+        while identificador not in self._recebidos:
+            recebido, shard, sucesso, resultado = self._saida.get()
+            self._recebidos[recebido] = (shard, sucesso, resultado)
+        shard, sucesso, resultado = self._recebidos.pop(identificador)
+        if not sucesso:
+            raise RuntimeError(f"Erro no shard {shard}: {resultado}")
+        return resultado
+
+    def processar_mensagem(self, telefone, mensagem):
+        """Processa uma mensagem no shard do telefone e retorna a resposta"""
+        identificador = self._enviar(self.anel.shard(telefone), MENSAGENS, [(telefone, mensagem)])
+        return self._receber(identificador)[0]
+
+    def processar_lote(self, mensagens):
+        """Processa [(telefone, mensagem), ...] em paralelo e retorna as respostas na mesma ordem"""
+        por_shard = {}
+        for posicao, (telefone, mensagem) in enumerate(mensagens):
+            por_shard.setdefault(self.anel.shard(telefone), []).append((posicao, telefone, mensagem))
+
+        # Um único pedido por shard: todos os shards trabalham ao mesmo tempo
+        pedidos = [(self._enviar(shard, MENSAGENS, [(telefone, mensagem) for _, telefone, mensagem in itens]),
+                    itens) for shard, itens in por_shard.items()]
+
+        respostas = [None] * len(mensagens)
+        for identificador, itens in pedidos:
+            for (posicao, _, _), resposta in zip(itens, self._receber(identificador)):
+                respostas[posicao] = resposta
+        return respostas
+
+    def marcar_inativa(self, telefone):
+        """Coloca a conversa do telefone na lista de remarketing do seu shard"""
+        return self._receber(self._enviar(self.anel.shard(telefone), INATIVAR, telefone))
+
+    def verificar_inatividade(self):
+        """Executa o ciclo de remarketing em todos os shards, cada um sobre os próprios leads"""
+        identificadores = [self._enviar(shard, REMARKETING, None) for shard in range(self.quantidade_shards)]
+        mensagens = []
+        for identificador in identificadores:
+            mensagens.extend(self._receber(identificador))
+        return mensagens
+
+    def encerrar(self):
+        """Encerra os processos shard"""
+        for entrada in self._entradas:
+            entrada.put(None)
+        for processo in self._processos:
+            processo.join()
+
+
+# Comparação de vazão entre um shard e vários shards
+if __name__ == "__main__":
+    from benchmark_conversas import ROTEIROS
+
+    parser = argparse.ArgumentParser(description="Servidor de conversas particionado por telefone")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="quantidade de processos shard")
+    parser.add_argument("--sessoes", type=int, default=2000, help="total de conversas reproduzidas")
+    parser.add_argument("--concorrencia", type=int, default=500, help="conversas intercaladas por onda")
+    args = parser.parse_args()
+
+    roteiros = list(ROTEIROS.values())
+
+    def executar(quantidade_shards):
+        roteador = RoteadorShards(quantidade_shards)
+        try:
+            mensagens = 0
+            inicio = time.perf_counter()
+            for primeira in range(0, args.sessoes, args.concorrencia):
+                onda = range(primeira, min(args.sessoes, primeira + args.concorrencia))
+                for passo in range(max(len(roteiro) for roteiro in roteiros)):
+                    lote = [(f"5511{indice:09d}", roteiros[indice % len(roteiros)][passo]) for indice in onda
+                            if passo < len(roteiros[indice % len(roteiros)])]
+                    roteador.processar_lote(lote)
+                    mensagens += len(lote)
+            duracao = time.perf_counter() - inicio
+        finally:
+            roteador.encerrar()
+        print(f"{quantidade_shards:>3} shard(s): {mensagens / duracao:10.0f} mensagens/s")
+
+    executar(1)
+    if args.shards > 1:
+        executar(args.shards)
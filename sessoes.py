@@ -0,0 +1,380 @@
+"""
+Gerenciador de Sessões da IA Vendedora - Plena Saúde
+Atende várias conversas de WhatsApp ao mesmo tempo com uma única IA e um único sistema de cotação
+"""
+
+import atexit
+import time
+from collections.abc import MutableMapping
+from enum import IntEnum
+
+from armazenamento_sessoes import GravacaoAdiada
+from fluxo_conversa import FLUXO
+from ia_vendedora_integrada import IAVendedoraPlenaIntegrada
+from sistema_cotacao import SistemaCotacaoPlena
+
+
+# Estados da conversa: os ids das etapas do fluxo compilado (o nome em minúsculas é o nome da etapa)
+Estado = IntEnum("Estado", [(nome.upper(), id_estado) for id_estado, nome in enumerate(FLUXO.nomes)])
+_ESTADOS = tuple(Estado)
+
+
+class TipoPlano(IntEnum):
+    NENHUM = 0
+    INDIVIDUAL = 1
+    FAMILIAR = 2
+    EMPRESARIAL = 3
+
+
+class TipoCobertura(IntEnum):
+    BASICO = 0
+    INTERMEDIARIO = 1
+    COMPLETO = 2
+
+
+class Coparticipacao(IntEnum):
+    SEM = 0
+    COM = 1
+
+
+def _textos(enum):
+    """Tabela código -> texto de um enum ("" para NENHUM)"""
+    return tuple("" if membro.name == "NENHUM" else membro.name.lower() for membro in enum)
+
+
+# Conversões entre os textos usados em dados_cliente e os códigos da sessão
+TEXTOS = {enum: _textos(enum) for enum in (Estado, TipoPlano, TipoCobertura, Coparticipacao)}
+CODIGOS = {enum: {texto: enum(codigo) for codigo, texto in enumerate(textos)} for enum, textos in TEXTOS.items()}
+
+
+def codificar(enum, texto):
+    """Converte o texto (ex: "familiar") no código do enum; levanta ValueError se desconhecido"""
+    try:
+        return CODIGOS[enum][texto]
+    except KeyError:
+        raise ValueError(f"Valor inválido para {enum.__name__}: {texto!r}") from None
+
+
+def decodificar(codigo):
+    """Converte o código do enum de volta no texto usado pelas IAs"""
+    return TEXTOS[type(codigo)][codigo]
+
+
+class SessaoCliente:
+    """Estado compacto de uma conversa (substitui estado_atual + dados_cliente por cliente)"""
+
+    __slots__ = ("telefone", "estado_atual", "nome", "telefone_contato", "email", "tipo_plano",
+                 "quantidade_vidas", "vidas_por_faixa", "empresa", "cnpj_ativo", "regiao",
+                 "preferencia_hospital", "tipo_cobertura", "coparticipacao", "cotacao",
+                 "ultima_interacao", "tentativas_remarketing", "conversa_ativa", "extras")
+
+    # Chave de dados_cliente -> (atributo da sessão, enum usado para codificar o valor)
+    CAMPOS = {
+        "nome": ("nome", None),
+        "telefone": ("telefone_contato", None),
+        "email": ("email", None),
+        "tipo_plano": ("tipo_plano", TipoPlano),
+        "quantidade_vidas": ("quantidade_vidas", None),
+        "vidas_por_faixa": ("vidas_por_faixa", None),
+        "empresa": ("empresa", None),
+        "cnpj_ativo": ("cnpj_ativo", None),
+        "regiao": ("regiao", None),
+        "preferencia_hospital": ("preferencia_hospital", None),
+        "tipo_cobertura": ("tipo_cobertura", TipoCobertura),
+        "coparticipacao": ("coparticipacao", Coparticipacao),
+        "cotacao": ("cotacao", None),
+        "ultima_interacao": ("ultima_interacao", None),
+        "tentativas_remarketing": ("tentativas_remarketing", None),
+        "conversa_ativa": ("conversa_ativa", None)
+    }
+
+    def __init__(self, telefone):
+        self.telefone = telefone
+        self.estado_atual = Estado.INICIO
+        self.nome = ""
+        self.telefone_contato = ""
+        self.email = ""
+        self.tipo_plano = TipoPlano.NENHUM
+        self.quantidade_vidas = 0
+        self.vidas_por_faixa = ()  # vidas por faixa etária (histograma da cotação)
+        self.empresa = ""
+        self.cnpj_ativo = False
+        self.regiao = ""
+        self.preferencia_hospital = ""
+        self.tipo_cobertura = TipoCobertura.INTERMEDIARIO
+        self.coparticipacao = Coparticipacao.SEM
+        self.cotacao = None
+        self.ultima_interacao = 0.0
+        self.tentativas_remarketing = 0
+        self.conversa_ativa = True
+        self.extras = None  # Campos usados só por algumas variantes da IA, criado sob demanda
+
+    def clonar(self):
+        """Retorna uma cópia rasa da sessão"""
+        copia = SessaoCliente.__new__(SessaoCliente)
+        for atributo in SessaoCliente.__slots__:
+            setattr(copia, atributo, getattr(self, atributo))
+        if self.extras is not None:
+            copia.extras = dict(self.extras)
+        return copia
+
+    def para_registro(self):
+        """Converte a sessão em um dicionário serializável (JSON) para persistência"""
+        registro = {atributo: getattr(self, atributo) for atributo in SessaoCliente.__slots__}
+        registro["vidas_por_faixa"] = list(self.vidas_por_faixa)
+        return registro
+
+    @classmethod
+    def de_registro(cls, registro):
+        """Reconstrói a sessão a partir de um registro gerado por para_registro"""
+        sessao = cls(registro["telefone"])
+        for atributo in SessaoCliente.__slots__:
+            if atributo in registro:
+                setattr(sessao, atributo, registro[atributo])
+        sessao.estado_atual = Estado(sessao.estado_atual)
+        sessao.tipo_plano = TipoPlano(sessao.tipo_plano)
+        sessao.tipo_cobertura = TipoCobertura(sessao.tipo_cobertura)
+        sessao.coparticipacao = Coparticipacao(sessao.coparticipacao)
+        sessao.vidas_por_faixa = tuple(sessao.vidas_por_faixa)
+        return sessao
+
+    @property
+    def dados_cliente(self):
+        """Visão em forma de dicionário, compatível com o dados_cliente das IAs"""
+        return DadosClienteSessao(self)
+
+
+class DadosClienteSessao(MutableMapping):
+    """Visão em forma de dicionário (dados_cliente) sobre uma SessaoCliente"""
+
+    __slots__ = ("sessao",)
+
+    def __init__(self, sessao):
+        self.sessao = sessao
+
+    def __getitem__(self, chave):
+        campo = SessaoCliente.CAMPOS.get(chave)
+        if campo is not None:
+            atributo, enum = campo
+            valor = getattr(self.sessao, atributo)
+            if enum is not None:
+                return decodificar(valor)
+            if atributo == "cotacao":
+                return {} if valor is None else valor
+            return valor
+        if self.sessao.extras is None or chave not in self.sessao.extras:
+            raise KeyError(chave)
+        return self.sessao.extras[chave]
+
+    def __setitem__(self, chave, valor):
+        campo = SessaoCliente.CAMPOS.get(chave)
+        if campo is None:
+            if self.sessao.extras is None:
+                self.sessao.extras = {}
+            self.sessao.extras[chave] = valor
+            return
+
+        atributo, enum = campo
+        if enum is not None:
+            valor = codificar(enum, valor)
+        elif atributo == "vidas_por_faixa":
+            valor = tuple(valor)
+        elif atributo == "cotacao":
+            valor = valor or None
+        setattr(self.sessao, atributo, valor)
+
+    def __delitem__(self, chave):
+        if self.sessao.extras is None or chave not in self.sessao.extras:
+            raise KeyError(chave)
+        del self.sessao.extras[chave]
+
+    def __iter__(self):
+        yield from SessaoCliente.CAMPOS
+        if self.sessao.extras:
+            yield from self.sessao.extras
+
+    def __len__(self):
+        return len(SessaoCliente.CAMPOS) + (len(self.sessao.extras) if self.sessao.extras else 0)
+
+    def copy(self):
+        """Cópia independente, também apoiada em uma sessão compacta"""
+        return DadosClienteSessao(self.sessao.clonar())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class GerenciadorSessoes:
+    """Processa pares (telefone, mensagem) com uma IA sem estado próprio e sessões compactas"""
+
+    TABELA = "sessoes"
+
+    def __init__(self, ia=None, sistema_cotacao=None, armazenamento=None):
+        # Um único sistema de cotação e uma única IA para todas as conversas
+        self.sistema_cotacao = sistema_cotacao if sistema_cotacao is not None else SistemaCotacaoPlena()
+        self.ia = ia if ia is not None else IAVendedoraPlenaIntegrada(sistema_cotacao=self.sistema_cotacao)
+
+        # Sessões abertas por telefone
+        self.sessoes = {}
+
+        # Armazenamento persistente opcional (ArmazenamentoSQLite, ArmazenamentoMemoria ou GravacaoAdiada)
+        if armazenamento is not None and not isinstance(armazenamento, GravacaoAdiada):
+            armazenamento = GravacaoAdiada(armazenamento)
+        self.armazenamento = armazenamento
+        if armazenamento is not None:
+            atexit.register(self.fechar)
+
+    def obter_sessao(self, telefone):
+        """Retorna a sessão do telefone, recuperando-a do armazenamento ou criando uma nova"""
+        sessao = self.sessoes.get(telefone)
+        if sessao is None:
+            registro = self.armazenamento.ler(self.TABELA, telefone) if self.armazenamento else None
+            sessao = SessaoCliente.de_registro(registro) if registro else SessaoCliente(telefone)
+            self.sessoes[telefone] = sessao
+        return sessao
+
+    def restaurar_sessoes(self, desde=None):
+        """Carrega do armazenamento as sessões ativas desde o instante informado (todas se None)"""
+        if self.armazenamento is None:
+            return 0
+        restauradas = 0
+        for telefone, registro in self.armazenamento.ler_recentes(self.TABELA, desde):
+            if telefone not in self.sessoes:
+                self.sessoes[telefone] = SessaoCliente.de_registro(registro)
+                restauradas += 1
+        return restauradas
+
+    def descarregar(self):
+        """Grava no armazenamento as alterações de sessão ainda pendentes"""
+        if self.armazenamento is not None:
+            self.armazenamento.descarregar()
+
+    def fechar(self):
+        """Grava as sessões pendentes e fecha o armazenamento (também chamado na saída do processo)"""
+        if self.armazenamento is not None:
+            atexit.unregister(self.fechar)
+            self.armazenamento.fechar()
+
+    def processar_mensagem(self, telefone, mensagem):
+        """Processa a mensagem de um cliente no contexto da sua sessão e retorna a resposta"""
+        sessao = self.obter_sessao(telefone)
+        dados = DadosClienteSessao(sessao)
+
+        # A IA é apenas emprestada à sessão durante o processamento da mensagem
+        ia = self.ia
+        ia.id_estado = sessao.estado_atual
+        ia.dados_cliente = dados
+        try:
+            if hasattr(ia, "motor_remarketing") and not sessao.conversa_ativa:
+                # Primeira mensagem desde marcar_inativa: a IA retoma o lead do remarketing
+                resposta = ia.processar_mensagem(mensagem, telefone)
+            else:
+                resposta = ia.processar_mensagem(mensagem)
+        finally:
+            sessao.estado_atual = _ESTADOS[ia.id_estado]
+            if ia.dados_cliente is not dados:
+                # A IA substituiu o dicionário (ex: retorno de remarketing); copiar para a sessão
+                for chave, valor in ia.dados_cliente.items():
+                    dados[chave] = valor
+            ia.dados_cliente = None
+            sessao.ultima_interacao = time.time()
+            if self.armazenamento is not None:
+                # Serializada apenas quando o lote for gravado
+                self.armazenamento.marcar(self.TABELA, telefone, sessao.para_registro)
+
+        return resposta
+
+    def encerrar_sessao(self, telefone):
+        """Remove a sessão do telefone, se existir (também do armazenamento)"""
+        self.sessoes.pop(telefone, None)
+        if self.armazenamento is not None:
+            self.armazenamento.marcar(self.TABELA, telefone, None)
+
+    def marcar_inativa(self, telefone):
+        """Coloca a sessão na lista de remarketing da IA (apenas na variante com remarketing)"""
+        motor = getattr(self.ia, "motor_remarketing", None)
+        sessao = self.sessoes.get(telefone)
+        if sessao is None or motor is None:
+            return False
+
+        sessao.conversa_ativa = False
+        motor.inscrever(telefone, DadosClienteSessao(sessao), decodificar(sessao.estado_atual),
+                        sessao.ultima_interacao)
+        return True
+
+    def verificar_inatividade(self):
+        """Executa o ciclo de remarketing da IA sobre os leads deste gerenciador"""
+        return list(self.gerar_remarketing())
+
+    def gerar_remarketing(self):
+        """Gerador das mensagens de remarketing vencidas, consumido sob demanda.
+
+        Usa só o MotorRemarketing da IA (nenhuma conversa é emprestada à IA), então
+        pode ser consumido em outra thread enquanto as sessões são atendidas.
+        """
+        motor = getattr(self.ia, "motor_remarketing", None)
+        if motor is None or not self.ia.remarketing_ativo:
+            return iter(())
+        return motor.gerar()
+
+    def __len__(self):
+        return len(self.sessoes)
+
+
+# Exemplo de uso do gerenciador com duas conversas intercaladas
+if __name__ == "__main__":
+    gerenciador = GerenciadorSessoes()
+
+    conversas = [
+        ("5511987654321", "Olá"),
+        ("5511912345678", "Oi"),
+        ("5511987654321", "Maria Silva"),
+        ("5511912345678", "João Souza"),
+        ("5511987654321", "11 98765-4321"),
+        ("5511912345678", "11 91234-5678"),
+    ]
+
+    for telefone, mensagem in conversas:
+        resposta = gerenciador.processar_mensagem(telefone, mensagem)
+        print(f"[{telefone}] Cliente: {mensagem}")
+        print(f"[{telefone}] IA: {resposta}")
+        print("-" * 70)
+
+    for telefone, sessao in gerenciador.sessoes.items():
+        print(f"{telefone}: estado={decodificar(sessao.estado_atual)}, nome={sessao.nome}")
+
+    # Reinício com armazenamento: as conversas continuam de onde pararam
+    from armazenamento_sessoes import ArmazenamentoMemoria
+    armazenamento = ArmazenamentoMemoria()
+    gerenciador = GerenciadorSessoes(armazenamento=armazenamento)
+    for telefone, mensagem in conversas:
+        gerenciador.processar_mensagem(telefone, mensagem)
+    gerenciador.fechar()
+
+    reiniciado = GerenciadorSessoes(armazenamento=armazenamento)
+    print(f"Sessões restauradas após reinício: {reiniciado.restaurar_sessoes()}")
+
+    # Sem novas mensagens, as alterações pendentes chegam ao armazenamento após o intervalo
+    armazenamento = ArmazenamentoMemoria()
+    gravacao = GravacaoAdiada(armazenamento, intervalo=0.2)
+    ocioso = GerenciadorSessoes(armazenamento=gravacao)
+    ocioso.processar_mensagem("5511955554444", "Olá")
+    antes = armazenamento.ler(GerenciadorSessoes.TABELA, "5511955554444")
+    time.sleep(2 * gravacao.intervalo)
+    depois = armazenamento.ler(GerenciadorSessoes.TABELA, "5511955554444")
+    assert antes is None and depois is not None and gravacao.pendentes == 0, "gravação adiada não ocorreu"
+    print(f"Gravada após {gravacao.intervalo}s sem mensagens: estado={decodificar(Estado(depois['estado_atual']))}")
+    ocioso.fechar()
+
+    # Cliente que volta após o remarketing: retomado uma única vez, e a conversa avança
+    from ia_vendedora_remarketing import IAVendedoraPlenaIntegrada
+    com_remarketing = GerenciadorSessoes(ia=IAVendedoraPlenaIntegrada())
+    telefone = "5511933332222"
+    for mensagem in ("Olá", "Ana Lima", "11 93333-2222", "ana@email.com", "2"):
+        com_remarketing.processar_mensagem(telefone, mensagem)
+    com_remarketing.marcar_inativa(telefone)
+    respostas = [com_remarketing.processar_mensagem(telefone, mensagem) for mensagem in ("Oi, voltei", "3", "30, 25, 2")]
+    estado = decodificar(com_remarketing.sessoes[telefone].estado_atual)
+    assert sum("Que bom ver você novamente" in resposta for resposta in respostas) == 1, respostas
+    assert respostas[0].startswith("Que bom ver você novamente") and estado != "coletar_idades", estado
+    print(f"Retorno após remarketing: saudação única, conversa seguiu para {estado}")
@@ -3,78 +3,67 @@ Sistema de Cotação para Planos de Saúde da Plena Saúde
 Implementação detalhada para cálculo de valores de planos nas regiões de Francisco Morato, Caieiras e Perus
 """
 
+import math
+import operator
+import time
+from collections import OrderedDict
+
+from centavos import BASE, arredondar, reais
+from importacao_vidas import importar_vidas
+from tabelas_precos import FonteTabelas, TabelasPrecos, fonte_padrao
+
+try:
+    import numpy as np  # Opcional: acelera a cotação em lote
+except ImportError:
+    np = None
+
+
+def _somar_faixas(histograma, valores):
+    """Soma de vidas x valor de cada faixa etária (custo proporcional ao número de faixas, não de vidas)"""
+    return sum(map(operator.mul, histograma, valores))
+
+
 class SistemaCotacaoPlena:
-    def __init__(self):
-        # Tabela de preços por faixa etária para planos individuais/familiares
-        # Valores fictícios baseados em médias de mercado (devem ser substituídos pelos valores reais)
-        self.tabela_precos_individual = {
-            # Faixa etária: valor base
-            "0-18": 120.00,
-            "19-23": 150.00,
-            "24-28": 180.00,
-            "29-33": 210.00,
-            "34-38": 240.00,
-            "39-43": 270.00,
-            "44-48": 320.00,
-            "49-53": 380.00,
-            "54-58": 450.00,
-            "59+": 550.00
-        }
-        
-        # Tabela de preços para planos empresariais (PME)
-        # Valores por vida, variando conforme quantidade de vidas
-        self.tabela_precos_empresarial = {
-            # Faixa de vidas: {faixa etária: valor}
-            "2-9": {
-                "0-18": 100.00,
-                "19-23": 130.00,
-                "24-28": 160.00,
-                "29-33": 190.00,
-                "34-38": 220.00,
-                "39-43": 250.00,
-                "44-48": 290.00,
-                "49-53": 340.00,
-                "54-58": 410.00,
-                "59+": 500.00
-            },
-            "10-29": {
-                "0-18": 90.00,
-                "19-23": 120.00,
-                "24-28": 150.00,
-                "29-33": 180.00,
-                "34-38": 210.00,
-                "39-43": 240.00,
-                "44-48": 280.00,
-                "49-53": 330.00,
-                "54-58": 390.00,
-                "59+": 480.00
-            },
-            "30+": {
-                "0-18": 80.00,
-                "19-23": 110.00,
-                "24-28": 140.00,
-                "29-33": 170.00,
-                "34-38": 200.00,
-                "39-43": 230.00,
-                "44-48": 270.00,
-                "49-53": 320.00,
-                "54-58": 380.00,
-                "59+": 460.00
-            }
-        }
-        
-        # Fatores de ajuste para diferentes tipos de planos
-        self.fatores_plano = {
-            "basico": 1.0,
-            "intermediario": 1.3,
-            "completo": 1.6
-        }
+    # Códigos usados pela cotação em lote (a posição na tupla é o código inteiro)
+    CODIGOS_CONTRATO = ("individual", "familiar", "empresarial")
+    CODIGOS_COBERTURA = ("basico", "intermediario", "completo")
+    CODIGOS_COPARTICIPACAO = ("sem", "com")
+    
+    # Desconto familiar em pontos-base: (mínimo de vidas, fator), do maior para o menor
+    DESCONTOS_FAMILIARES = ((5, 9000), (3, 9500))  # 10% para 5+ vidas, 5% para 3+ vidas
+    
+    # Nome comercial de cada tipo de cobertura
+    NOMES_PLANOS = {
+        "basico": "Plena Essencial",
+        "intermediario": "Plena Plus",
+        "completo": "Plena Premium"
+    }
+
+    def __init__(self, tamanho_cache=0, ttl_cache=3600, tabelas=None):
+        """Cria o sistema de cotação.
+
+        ``tabelas`` pode ser o caminho de um arquivo de tabelas, uma FonteTabelas
+        (compartilhada, recarregável) ou um retrato TabelasPrecos fixo; por padrão
+        usa a fonte compartilhada do arquivo tabelas_precos.json.
+        """
+        # Cache de cotações (LRU com expiração), desativado por padrão (tamanho_cache=0): a partir
+        # do histograma, recalcular é mais rápido que montar a chave e buscar no cache
+        self.tamanho_cache = tamanho_cache
+        self.ttl_cache = ttl_cache
+        self.cache_cotacoes = OrderedDict()
+        self.estatisticas_cache = {"acertos": 0, "falhas": 0, "remocoes": 0, "expiracoes": 0}
         
-        # Fatores de ajuste para coparticipação
-        self.fatores_coparticipacao = {
-            "sem": 1.0,
-            "com": 0.8  # 20% de desconto para planos com coparticipação
-        }
+        # Tabelas de preços: retrato imutável, trocado inteiro quando a fonte publica outra versão
+        if tabelas is None:
+            tabelas = fonte_padrao()
+        elif isinstance(tabelas, str):
+            tabelas = FonteTabelas(tabelas)
+        if isinstance(tabelas, TabelasPrecos):
+            self.fonte_tabelas = None
+            self.tabelas = tabelas
+        else:
+            self.fonte_tabelas = tabelas
+            self.tabelas = tabelas.atual
         
         # Hospitais disponíveis por região
         self.hospitais_por_regiao = {
@@ -82,36 +71,96 @@ class SistemaCotacaoPlena:
             "Caieiras": ["Hospital Previna Caieiras", "Hospital Municipal de Caieiras"],
             "Perus": ["Hospital Previna Perus", "Hospital Municipal Dr. Moyses Deutsch"]
         }
-        
-        # Hospitais premium (com adicional de valor)
-        self.hospitais_premium = {
-            "Hospital Previna Premium": 1.15,  # 15% adicional
-            "Hospital São Camilo": 1.25,       # 25% adicional
-            "Hospital Samaritano": 1.30        # 30% adicional
-        }
+    
+    def _tabelas_atuais(self):
+        """Retorna o retrato das tabelas em uso, adotando uma nova versão publicada na fonte.
+
+        Cada cálculo lê o retrato uma única vez e o usa até o fim, então uma troca
+        de versão no meio de uma cotação não mistura tabelas antigas e novas.
+        """
+        if self.fonte_tabelas is not None:
+            atual = self.fonte_tabelas.atual
+            if atual is not self.tabelas:
+                self.tabelas = atual
+                self.limpar_cache()
+        return self.tabelas
+    
+    def publicar_tabelas(self, tabelas):
+        """Passa a usar outro retrato das tabelas (na fonte, se houver, para todas as instâncias)"""
+        if self.fonte_tabelas is not None:
+            self.fonte_tabelas.publicar(tabelas)
+        else:
+            self.tabelas = tabelas
+            self.limpar_cache()
+    
+    def alterar_tabelas(self, **tabelas):
+        """Publica uma cópia das tabelas em uso com as tabelas informadas substituídas.
+
+        Ex: ``alterar_tabelas(fatores_coparticipacao={"sem": 1.0, "com": 0.75})``.
+        As tabelas em uso nunca são alteradas no lugar.
+        """
+        novas = self._tabelas_atuais().alterar(**tabelas)
+        self.publicar_tabelas(novas)
+        return novas
+    
+    # Leitura das tabelas em uso (somente leitura; para alterar use alterar_tabelas)
+    @property
+    def tabela_precos_individual(self):
+        return self._tabelas_atuais().tabela_precos_individual
+    
+    @property
+    def tabela_precos_empresarial(self):
+        return self._tabelas_atuais().tabela_precos_empresarial
+    
+    @property
+    def fatores_plano(self):
+        return self._tabelas_atuais().fatores_plano
+    
+    @property
+    def fatores_coparticipacao(self):
+        return self._tabelas_atuais().fatores_coparticipacao
+    
+    @property
+    def hospitais_premium(self):
+        return self._tabelas_atuais().hospitais_premium
+    
+    @property
+    def faixas_etarias(self):
+        return self._tabelas_atuais().faixas_etarias
+    
+    @property
+    def idade_inicial_faixa(self):
+        return self._tabelas_atuais().idade_inicial_faixa
+    
+    @property
+    def faixa_por_idade(self):
+        return self._tabelas_atuais().faixa_por_idade
+    
+    @property
+    def precos_individuais(self):
+        return self._tabelas_atuais().precos_individuais
+    
+    @property
+    def precos_empresariais(self):
+        return self._tabelas_atuais().precos_empresariais
+    
+    @property
+    def versao_tabelas(self):
+        """Identificador do retrato em uso (muda a cada nova versão publicada)"""
+        return self._tabelas_atuais().geracao
+    
+    def limpar_cache(self):
+        """Descarta todas as cotações em cache"""
+        self.cache_cotacoes.clear()
+    
+    def obter_indice_faixa(self, idade):
+        """Retorna o id da faixa etária (posição em ``faixas_etarias``) para a idade"""
+        return self._tabelas_atuais().indice_faixa(idade)
     
     def obter_faixa_etaria(self, idade):
         """Determina a faixa etária com base na idade"""
-        if idade <= 18:
-            return "0-18"
-        elif idade <= 23:
-            return "19-23"
-        elif idade <= 28:
-            return "24-28"
-        elif idade <= 33:
-            return "29-33"
-        elif idade <= 38:
-            return "34-38"
-        elif idade <= 43:
-            return "39-43"
-        elif idade <= 48:
-            return "44-48"
-        elif idade <= 53:
-            return "49-53"
-        elif idade <= 58:
-            return "54-58"
-        else:
-            return "59+"
+        tabelas = self._tabelas_atuais()
+        return tabelas.faixas_etarias[tabelas.indice_faixa(idade)]
     
     def obter_faixa_vidas(self, quantidade_vidas):
         """Determina a faixa de quantidade de vidas para planos empresariais"""
@@ -124,85 +173,249 @@ class SistemaCotacaoPlena:
     
     def calcular_valor_individual(self, idade, tipo_plano="intermediario", coparticipacao="sem", hospital_premium=None):
         """Calcula o valor para um beneficiário individual"""
-        faixa_etaria = self.obter_faixa_etaria(idade)
-        valor_base = self.tabela_precos_individual[faixa_etaria]
-        
-        # Aplicar fator do tipo de plano
-        valor = valor_base * self.fatores_plano[tipo_plano]
-        
-        # Aplicar fator de coparticipação
-        valor = valor * self.fatores_coparticipacao[coparticipacao]
-        
-        # Aplicar adicional de hospital premium, se aplicável
-        if hospital_premium and hospital_premium in self.hospitais_premium:
-            valor = valor * self.hospitais_premium[hospital_premium]
-        
-        return round(valor, 2)
+        return self._valor_individual(self._tabelas_atuais(), idade, tipo_plano, coparticipacao, hospital_premium)
     
     def calcular_valor_familiar(self, idades, tipo_plano="intermediario", coparticipacao="sem", hospital_premium=None):
         """Calcula o valor para um plano familiar com múltiplos beneficiários"""
-        valor_total = 0
+        tabelas = self._tabelas_atuais()
+        return self._valor_familiar(tabelas, tabelas.histograma(idades), tipo_plano, coparticipacao, hospital_premium)
+    
+    def calcular_valor_empresarial(self, idades, tipo_plano="intermediario", coparticipacao="com", hospital_premium=None):
+        """Calcula o valor para um plano empresarial com múltiplos beneficiários"""
+        tabelas = self._tabelas_atuais()
+        return self._valor_empresarial(tabelas, tabelas.histograma(idades), tipo_plano, coparticipacao,
+                                       hospital_premium)
+    
+    def _valor_individual(self, tabelas, idade, tipo_plano, coparticipacao, hospital_premium):
+        centavos = tabelas.centavos_faixas(tipo_plano, coparticipacao, tabelas.pontos_hospitais.get(hospital_premium))
+        return reais(centavos[tabelas.indice_faixa(idade)])
+    
+    # O preço depende apenas de quantas vidas há em cada faixa etária: os cálculos abaixo
+    # recebem o histograma (vidas por faixa) e custam o mesmo para 5 ou 5.000 vidas.
+    # Todo o cálculo é feito em inteiros (centavos e pontos-base; veja centavos). O hospital
+    # premium fora da tabela (ou None) é a rede padrão: pontos_hospitais.get(...) é None
+    
+    def _valor_familiar(self, tabelas, histograma, tipo_plano, coparticipacao, hospital_premium):
+        # Valor de cada vida arredondado, somado em centavos (soma exata)
+        centavos = tabelas.centavos_faixas(tipo_plano, coparticipacao, tabelas.pontos_hospitais.get(hospital_premium))
+        return reais(self._centavos_familiar(_somar_faixas(histograma, centavos), sum(histograma)))
+    
+    @classmethod
+    def _centavos_familiar(cls, centavos, quantidade_vidas):
+        """Total familiar com o desconto por quantidade de vidas"""
+        for minimo_vidas, desconto in cls.DESCONTOS_FAMILIARES:
+            if quantidade_vidas >= minimo_vidas:
+                return arredondar(centavos * desconto, BASE)
+        return centavos
+    
+    def _valor_empresarial(self, tabelas, histograma, tipo_plano, coparticipacao, hospital_premium):
+        # Valor exato de cada vida na tabela da faixa de vidas, com os fatores de plano e coparticipação
+        numeradores, denominador = tabelas.fracoes_faixas(self.obter_faixa_vidas(sum(histograma)), tipo_plano,
+                                                          coparticipacao)
+        return reais(self._centavos_empresarial(_somar_faixas(histograma, numeradores), denominador,
+                                                tabelas.pontos_hospitais.get(hospital_premium)))
+    
+    @staticmethod
+    def _centavos_empresarial(numerador, denominador, pontos_hospital):
+        """Total empresarial (numerador / denominador centavos) com o adicional do hospital, arredondado uma única vez"""
+        if pontos_hospital is None:
+            return arredondar(numerador, denominador)
+        return arredondar(numerador * pontos_hospital, denominador * BASE)
+    
+    def gerar_cotacao(self, tipo_plano_contrato, idades, tipo_cobertura="intermediario", 
+                     coparticipacao="sem", hospital_premium=None):
+        """Gera uma cotação completa com base nos parâmetros fornecidos.
+
+        O preço depende apenas de quantas vidas há em cada faixa etária, então as
+        idades são convertidas nesse histograma antes do cálculo; com o cache
+        ativo (``tamanho_cache``), cotações equivalentes são servidas por ele.
+        """
+        tabelas = self._tabelas_atuais()
+        return self._cotacao_histograma(tabelas, tipo_plano_contrato, tabelas.histograma(idades),
+                                        tipo_cobertura, coparticipacao, hospital_premium)
+    
+    def gerar_cotacao_histograma(self, tipo_plano_contrato, histograma, tipo_cobertura="intermediario",
+                                 coparticipacao="sem", hospital_premium=None):
+        """Como ``gerar_cotacao``, a partir das vidas por faixa etária (ex: ``importar_vidas``)"""
+        tabelas = self._tabelas_atuais()
+        if len(histograma) != len(tabelas.faixas_etarias):
+            raise ValueError(f"O histograma deve ter {len(tabelas.faixas_etarias)} faixas etárias")
+        return self._cotacao_histograma(tabelas, tipo_plano_contrato, histograma,
+                                        tipo_cobertura, coparticipacao, hospital_premium)
+    
+    def importar_vidas(self, arquivo, data_referencia=None, delimitador=None):
+        """Lê a planilha de beneficiários da empresa direto para o histograma (veja importacao_vidas)"""
+        return importar_vidas(arquivo, self._tabelas_atuais(), data_referencia, delimitador)
+    
+    def _cotacao_histograma(self, tabelas, tipo_plano_contrato, histograma, tipo_cobertura,
+                            coparticipacao, hospital_premium):
+        chave = (tabelas.geracao, tipo_plano_contrato, tuple(histograma), tipo_cobertura,
+                 coparticipacao, hospital_premium)
         
-        # Calcular valor individual para cada beneficiário
-        for idade in idades:
-            valor_total += self.calcular_valor_individual(idade, tipo_plano, coparticipacao, hospital_premium)
+        if self.tamanho_cache > 0:
+            cotacao = self._buscar_cache(chave)
+            if cotacao is not None:
+                return self._copiar_cotacao(cotacao)
         
-        # Aplicar desconto para planos familiares (5% para 3+ vidas, 10% para 5+ vidas)
-        if len(idades) >= 5:
-            valor_total = valor_total * 0.9  # 10% de desconto
-        elif len(idades) >= 3:
-            valor_total = valor_total * 0.95  # 5% de desconto
+        cotacao = self._montar_cotacao(tabelas, tipo_plano_contrato, histograma, tipo_cobertura,
+                                       coparticipacao, hospital_premium)
         
-        return round(valor_total, 2)
+        if self.tamanho_cache > 0 and "erro" not in cotacao:
+            self._guardar_cache(chave, cotacao)
+            return self._copiar_cotacao(cotacao)
+        return cotacao
     
-    def calcular_valor_empresarial(self, idades, tipo_plano="intermediario", coparticipacao="com", hospital_premium=None):
-        """Calcula o valor para um plano empresarial com múltiplos beneficiários"""
-        valor_total = 0
-        quantidade_vidas = len(idades)
-        faixa_vidas = self.obter_faixa_vidas(quantidade_vidas)
+    @staticmethod
+    def _copiar_cotacao(cotacao):
+        """Cópia da cotação em cache que o chamador pode alterar (inclusive a lista de cobertura)"""
+        copia = dict(cotacao)
+        copia["cobertura"] = list(copia["cobertura"])
+        return copia
+    
+    def gerar_matriz_cotacoes(self, tipo_plano_contrato, idades, tipos_cobertura=None,
+                              coparticipacoes=None, hospitais_premium=None):
+        """Calcula o valor mensal de todas as combinações de opções em uma única passada.
+
+        Por padrão cobre todas as coberturas, com e sem coparticipação, e a rede padrão
+        (None) mais cada hospital premium. Retorna {(tipo_cobertura, coparticipacao,
+        hospital_premium): valor_mensal}, com os mesmos valores de ``gerar_cotacao``.
+        Com o cache ativo, matrizes equivalentes (mesmo histograma de faixas) também são servidas por ele.
+        """
+        return self.gerar_matriz_cotacoes_histograma(tipo_plano_contrato, self.calcular_histograma(idades),
+                                                     tipos_cobertura, coparticipacoes, hospitais_premium)
+    
+    def gerar_matriz_cotacoes_histograma(self, tipo_plano_contrato, histograma, tipos_cobertura=None,
+                                         coparticipacoes=None, hospitais_premium=None):
+        """Como ``gerar_matriz_cotacoes``, a partir das vidas por faixa etária"""
+        tabelas = self._tabelas_atuais()
+        if len(histograma) != len(tabelas.faixas_etarias):
+            raise ValueError(f"O histograma deve ter {len(tabelas.faixas_etarias)} faixas etárias")
+        if tipo_plano_contrato not in self.CODIGOS_CONTRATO:
+            raise ValueError(f"Tipo de plano inválido: {tipo_plano_contrato}")
+        if tipos_cobertura is None:
+            tipos_cobertura = self.CODIGOS_COBERTURA
+        if coparticipacoes is None:
+            coparticipacoes = self.CODIGOS_COPARTICIPACAO
+        if hospitais_premium is None:
+            hospitais_premium = [None] + list(tabelas.hospitais_premium)
         
-        # Calcular valor para cada beneficiário com base na tabela empresarial
-        for idade in idades:
-            faixa_etaria = self.obter_faixa_etaria(idade)
-            valor_base = self.tabela_precos_empresarial[faixa_vidas][faixa_etaria]
-            
-            # Aplicar fator do tipo de plano
-            valor = valor_base * self.fatores_plano[tipo_plano]
-            
-            # Aplicar fator de coparticipação
-            valor = valor * self.fatores_coparticipacao[coparticipacao]
-            
-            # Adicionar ao valor total
-            valor_total += valor
+        chave_cache = ("matriz", tabelas.geracao, tipo_plano_contrato, tuple(histograma), tuple(tipos_cobertura),
+                       tuple(coparticipacoes), tuple(hospitais_premium))
+        if self.tamanho_cache > 0:
+            matriz = self._buscar_cache(chave_cache)
+            if matriz is not None:
+                return dict(matriz)
         
-        # Aplicar adicional de hospital premium, se aplicável
-        if hospital_premium and hospital_premium in self.hospitais_premium:
-            valor_total = valor_total * self.hospitais_premium[hospital_premium]
+        quantidade_vidas = sum(histograma)
+        empresarial = tipo_plano_contrato == "empresarial"
+        pontos_hospitais = [tabelas.pontos_hospitais.get(hospital) for hospital in hospitais_premium]
         
-        return round(valor_total, 2)
+        # Empresarial: o hospital multiplica o total, então basta somar cobertura x coparticipação.
+        # Individual/familiar: o hospital entra no valor arredondado de cada vida.
+        if empresarial:
+            faixa_vidas = self.obter_faixa_vidas(quantidade_vidas)
+            opcoes = [(cobertura, coparticipacao, None, None)
+                      for cobertura in tipos_cobertura for coparticipacao in coparticipacoes]
+        else:
+            faixa_vidas = None
+            opcoes = [(cobertura, coparticipacao, hospital, pontos) for cobertura in tipos_cobertura
+                      for coparticipacao in coparticipacoes
+                      for hospital, pontos in zip(hospitais_premium, pontos_hospitais)]
+        # Valor por faixa de cada opção (guardado no próprio retrato das tabelas) vezes
+        # as vidas da faixa, com a mesma aritmética de gerar_cotacao
+        totais = []
+        for cobertura, coparticipacao, _, pontos in opcoes:
+            if empresarial:
+                numeradores, denominador = tabelas.fracoes_faixas(faixa_vidas, cobertura, coparticipacao)
+                totais.append((_somar_faixas(histograma, numeradores), denominador))
+            else:
+                totais.append(_somar_faixas(histograma, tabelas.centavos_faixas(cobertura, coparticipacao, pontos)))
+        
+        matriz = {}
+        if empresarial:
+            for (cobertura, coparticipacao, _, _), (numerador, denominador) in zip(opcoes, totais):
+                for hospital, pontos in zip(hospitais_premium, pontos_hospitais):
+                    matriz[(cobertura, coparticipacao, hospital)] = reais(
+                        self._centavos_empresarial(numerador, denominador, pontos))
+        else:
+            for (cobertura, coparticipacao, hospital, _), centavos in zip(opcoes, totais):
+                matriz[(cobertura, coparticipacao, hospital)] = reais(self._centavos_familiar(centavos,
+                                                                                              quantidade_vidas))
+        
+        if self.tamanho_cache > 0:
+            self._guardar_cache(chave_cache, matriz)
+            return dict(matriz)
+        return matriz
     
-    def gerar_cotacao(self, tipo_plano_contrato, idades, tipo_cobertura="intermediario", 
-                     coparticipacao="sem", hospital_premium=None):
-        """Gera uma cotação completa com base nos parâmetros fornecidos"""
+    
+    def criar_cotacao(self, tipo_plano_contrato, idades, tipo_cobertura="intermediario",
+                      coparticipacao="sem", hospital_premium=None):
+        """Cria uma CotacaoIncremental, que pode ser ajustada sem recalcular todas as vidas"""
+        return CotacaoIncremental(self, tipo_plano_contrato, idades, tipo_cobertura,
+                                  coparticipacao, hospital_premium)
+    
+    def calcular_histograma(self, idades):
+        """Conta quantas vidas há em cada faixa etária (posição = id da faixa)"""
+        return self._tabelas_atuais().histograma(idades)
+    
+    def idades_do_histograma(self, histograma):
+        """Gera uma idade representativa por vida, em ordem crescente de faixa"""
+        return self._idades_do_histograma(self._tabelas_atuais(), histograma)
+    
+    def _idades_do_histograma(self, tabelas, histograma):
+        idades = []
+        for indice, quantidade in enumerate(histograma):
+            idades.extend([tabelas.idade_inicial_faixa[indice]] * quantidade)
+        return idades
+    
+    def _buscar_cache(self, chave):
+        """Retorna a cotação em cache (ou None), respeitando a expiração"""
+        entrada = self.cache_cotacoes.get(chave)
+        if entrada is None:
+            self.estatisticas_cache["falhas"] += 1
+            return None
+        
+        instante, cotacao = entrada
+        if self.ttl_cache is not None and time.monotonic() - instante > self.ttl_cache:
+            del self.cache_cotacoes[chave]
+            self.estatisticas_cache["expiracoes"] += 1
+            self.estatisticas_cache["falhas"] += 1
+            return None
         
-        if tipo_plano_contrato == "individual" and len(idades) == 1:
-            valor = self.calcular_valor_individual(idades[0], tipo_cobertura, coparticipacao, hospital_premium)
-            tipo_texto = "Individual"
-        elif tipo_plano_contrato in ["individual", "familiar"]:
-            valor = self.calcular_valor_familiar(idades, tipo_cobertura, coparticipacao, hospital_premium)
-            tipo_texto = "Familiar" if len(idades) > 1 else "Individual"
+        self.cache_cotacoes.move_to_end(chave)
+        self.estatisticas_cache["acertos"] += 1
+        return cotacao
+    
+    def _guardar_cache(self, chave, cotacao):
+        """Guarda a cotação no cache, removendo as menos usadas se estiver cheio"""
+        self.cache_cotacoes[chave] = (time.monotonic(), cotacao)
+        self.cache_cotacoes.move_to_end(chave)
+        while len(self.cache_cotacoes) > self.tamanho_cache:
+            self.cache_cotacoes.popitem(last=False)
+            self.estatisticas_cache["remocoes"] += 1
+    
+    def _montar_cotacao(self, tabelas, tipo_plano_contrato, histograma, tipo_cobertura, coparticipacao,
+                        hospital_premium):
+        """Calcula o valor (a partir das vidas por faixa etária) e monta o dicionário da cotação"""
+        quantidade_vidas = sum(histograma)
+        if tipo_plano_contrato in ["individual", "familiar"]:
+            # Uma única vida é o valor individual, que é o mesmo do cálculo familiar
+            valor = self._valor_familiar(tabelas, histograma, tipo_cobertura, coparticipacao, hospital_premium)
+            tipo_texto = "Familiar" if quantidade_vidas > 1 else "Individual"
         elif tipo_plano_contrato == "empresarial":
-            valor = self.calcular_valor_empresarial(idades, tipo_cobertura, coparticipacao, hospital_premium)
+            valor = self._valor_empresarial(tabelas, histograma, tipo_cobertura, coparticipacao, hospital_premium)
             tipo_texto = "Empresarial/PME"
         else:
             return {"erro": "Tipo de plano inválido"}
         
+        return self._dicionario_cotacao(tipo_texto, quantidade_vidas, valor, tipo_cobertura,
+                                        coparticipacao, hospital_premium)
+    
+    def _dicionario_cotacao(self, tipo_texto, quantidade_vidas, valor, tipo_cobertura,
+                            coparticipacao, hospital_premium):
+        """Monta o dicionário de resposta da cotação"""
         # Determinar nome do plano com base no tipo de cobertura
-        nome_plano = {
-            "basico": "Plena Essencial",
-            "intermediario": "Plena Plus",
-            "completo": "Plena Premium"
-        }.get(tipo_cobertura, "Plena Plus")
+        nome_plano = self.NOMES_PLANOS.get(tipo_cobertura, "Plena Plus")
         
         # Determinar texto de coparticipação
         texto_coparticipacao = "Com Coparticipação" if coparticipacao == "com" else "Sem Coparticipação"
@@ -212,7 +425,7 @@ class SistemaCotacaoPlena:
             "tipo_plano": tipo_texto,
             "nome_plano": nome_plano,
             "coparticipacao": texto_coparticipacao,
-            "quantidade_vidas": len(idades),
+            "quantidade_vidas": quantidade_vidas,
             "valor_mensal": valor,
             "hospital_premium": hospital_premium if hospital_premium else "Rede padrão Plena Saúde",
             "cobertura": self.obter_cobertura(tipo_cobertura)
@@ -220,6 +433,190 @@ class SistemaCotacaoPlena:
         
         return cotacao
     
+    def gerar_cotacoes_em_lote(self, tipos_contrato, idades, quantidades_vidas=None,
+                               tipos_cobertura="intermediario", coparticipacoes="sem",
+                               hospitais_premium=None):
+        """Calcula o valor mensal de muitas cotações de uma só vez.
+
+        As idades são colunares: uma lista única com as idades de todas as cotações
+        em sequência e ``quantidades_vidas`` com o número de vidas de cada cotação
+        (ou, se ``quantidades_vidas`` for None, uma lista de listas de idades).
+        As demais colunas aceitam os mesmos textos de ``gerar_cotacao`` ou os códigos
+        inteiros de ``CODIGOS_*`` (hospital: 0 = rede padrão, 1.. = ``hospitais_premium``),
+        e um valor único é repetido para todas as cotações.
+
+        Retorna a lista de ``valor_mensal`` na ordem de entrada, idêntica ao que
+        ``gerar_cotacao`` retornaria para cada cotação (None para tipo de plano inválido).
+        """
+        tabelas = self._tabelas_atuais()
+        if quantidades_vidas is None:
+            quantidades_vidas = [len(grupo) for grupo in idades]
+            idades = [idade for grupo in idades for idade in grupo]
+        total_cotacoes = len(quantidades_vidas)
+        if set(map(type, idades)) - {int}:
+            # Idades fracionárias (ex: 18.5) sobem para o inteiro seguinte, como em indice_faixa
+            idades = [idade if idade.__class__ is int else math.ceil(idade) for idade in idades]
+
+        lista_hospitais = list(tabelas.hospitais_premium)
+        contratos = self._codificar_coluna(tipos_contrato, self.CODIGOS_CONTRATO, total_cotacoes, None)
+        coberturas = self._codificar_coluna(tipos_cobertura, self.CODIGOS_COBERTURA, total_cotacoes)
+        coparticipacoes = self._codificar_coluna(coparticipacoes, self.CODIGOS_COPARTICIPACAO, total_cotacoes)
+        hospitais = self._codificar_coluna(hospitais_premium, [None] + lista_hospitais, total_cotacoes, 0)
+
+        # Tabelas pequenas [cobertura][coparticipação][hospital|faixa de vidas][faixa etária]
+        # em inteiros, as mesmas do cálculo unitário (individual/familiar em centavos,
+        # empresarial em numeradores da fração de centavo), para que o lote seja igual a gerar_cotacao
+        indice_por_idade = tabelas.faixa_por_idade
+        codigos_faixa_vidas = {faixa: codigo for codigo, faixa in enumerate(tabelas.precos_empresariais)}
+        faixas_vidas = [codigos_faixa_vidas[self.obter_faixa_vidas(quantidade)] for quantidade in quantidades_vidas]
+        pontos_hospitais = [None] + [tabelas.pontos_hospitais[h] for h in lista_hospitais]
+        valores_individuais = [
+            [
+                [tabelas.centavos_faixas(cobertura, coparticipacao, pontos) for pontos in pontos_hospitais]
+                for coparticipacao in self.CODIGOS_COPARTICIPACAO
+            ]
+            for cobertura in self.CODIGOS_COBERTURA
+        ]
+        fracoes_empresariais = [
+            [
+                [tabelas.fracoes_faixas(faixa_vidas, cobertura, coparticipacao)
+                 for coparticipacao in self.CODIGOS_COPARTICIPACAO]
+                for cobertura in self.CODIGOS_COBERTURA
+            ]
+            for faixa_vidas in tabelas.precos_empresariais
+        ]
+        valores_empresariais = [[[numeradores for numeradores, _ in linha] for linha in tabela]
+                                for tabela in fracoes_empresariais]
+        denominadores_empresariais = [[[denominador for _, denominador in linha] for linha in tabela]
+                                      for tabela in fracoes_empresariais]
+        colunas = (contratos, coberturas, coparticipacoes, hospitais, quantidades_vidas, faixas_vidas)
+
+        if np is not None:
+            somas = self._somar_lote_numpy(contratos, coberturas, coparticipacoes, hospitais,
+                                           idades, quantidades_vidas, faixas_vidas, indice_por_idade,
+                                           valores_individuais, valores_empresariais,
+                                           len(pontos_hospitais))
+            if somas is not None:
+                return self._finalizar_lote_numpy(somas, colunas, denominadores_empresariais, pontos_hospitais)
+        somas = self._somar_lote_python(contratos, coberturas, coparticipacoes, hospitais,
+                                        idades, quantidades_vidas, faixas_vidas, indice_por_idade,
+                                        valores_individuais, valores_empresariais)
+        return self._finalizar_lote_python(somas, colunas, denominadores_empresariais, pontos_hospitais)
+
+    def _codificar_coluna(self, coluna, vocabulario, tamanho, padrao=-1):
+        """Converte uma coluna de textos (ou códigos) na lista de códigos inteiros"""
+        if coluna is None or isinstance(coluna, (str, int)):
+            coluna = [coluna] * tamanho
+        codigos = []
+        for valor in coluna:
+            if isinstance(valor, int) and not isinstance(valor, bool):
+                codigos.append(valor if 0 <= valor < len(vocabulario) else padrao)
+            elif valor in vocabulario:
+                codigos.append(vocabulario.index(valor))
+            else:
+                codigos.append(padrao)
+        if -1 in codigos:
+            raise ValueError(f"Valor inválido na coluna; valores aceitos: {', '.join(map(str, vocabulario))}")
+        return codigos
+
+    def _somar_lote_python(self, contratos, coberturas, coparticipacoes, hospitais, idades,
+                           quantidades_vidas, faixas_vidas, indice_por_idade, valores_individuais,
+                           valores_empresariais):
+        """Soma inteira (vidas x valor por faixa) de cada cotação, usando apenas as tabelas pré-calculadas"""
+        somas = []
+        inicio = 0
+        ultima_idade = len(indice_por_idade) - 1
+        for i, quantidade in enumerate(quantidades_vidas):
+            grupo = idades[inicio:inicio + quantidade]
+            inicio += quantidade
+            contrato = contratos[i]
+            if contrato is None:
+                somas.append(None)
+                continue
+
+            if contrato == 2:
+                valores = valores_empresariais[faixas_vidas[i]][coberturas[i]][coparticipacoes[i]]
+            else:
+                valores = valores_individuais[coberturas[i]][coparticipacoes[i]][hospitais[i]]
+            # Soma inteira (exata): vida a vida dá o mesmo total que pelo histograma
+            somas.append(sum([valores[indice_por_idade[min(max(idade, 0), ultima_idade)]] for idade in grupo]))
+        return somas
+
+    def _finalizar_lote_python(self, somas, colunas, denominadores_empresariais, pontos_hospitais):
+        """Desconto familiar e adicional de hospital no empresarial, com o arredondamento do cálculo unitário"""
+        valores = []
+        for i, (contrato, cobertura, coparticipacao, hospital, quantidade, faixa_vidas) in enumerate(zip(*colunas)):
+            if contrato is None:
+                valores.append(None)
+            elif contrato == 2:
+                denominador = denominadores_empresariais[faixa_vidas][cobertura][coparticipacao]
+                valores.append(reais(self._centavos_empresarial(somas[i], denominador, pontos_hospitais[hospital])))
+            else:
+                valores.append(reais(self._centavos_familiar(somas[i], quantidade)))
+        return valores
+
+    def _somar_lote_numpy(self, contratos, coberturas, coparticipacoes, hospitais, idades,
+                          quantidades_vidas, faixas_vidas, indice_por_idade, valores_individuais,
+                          valores_empresariais, quantidade_hospitais):
+        """Soma inteira de cada cotação com operações vetorizadas do NumPy (int64); None se não couber em int64"""
+        contratos_validos = [-1 if c is None else c for c in contratos]
+        contratos = np.asarray(contratos_validos, dtype=np.int64)
+        coberturas = np.asarray(coberturas, dtype=np.int64)
+        coparticipacoes = np.asarray(coparticipacoes, dtype=np.int64)
+        hospitais = np.asarray(hospitais, dtype=np.int64)
+        quantidades = np.asarray(quantidades_vidas, dtype=np.int64)
+
+        # Histograma de cada cotação: uma contagem por (cotação, faixa etária)
+        faixas_etarias = max(indice_por_idade) + 1
+        bandas = np.asarray(indice_por_idade, dtype=np.int64)[np.clip(np.asarray(idades, dtype=np.int64), 0, len(indice_por_idade) - 1)]
+        cotacao_por_vida = np.repeat(np.arange(len(quantidades)), quantidades)
+        histogramas = np.bincount(cotacao_por_vida * faixas_etarias + bandas,
+                                  minlength=len(quantidades) * faixas_etarias).reshape(-1, faixas_etarias)
+
+        # Valores por faixa de cada cotação: uma linha da tabela achatada
+        faixas_vidas = np.asarray(faixas_vidas, dtype=np.int64)
+        empresarial = contratos == 2
+        tabela_individual = np.asarray(valores_individuais, dtype=np.int64).reshape(-1, faixas_etarias)
+        tabela_empresarial = np.asarray(valores_empresariais, dtype=np.int64).reshape(-1, faixas_etarias)
+        tabela = np.concatenate([tabela_individual, tabela_empresarial])
+
+        # Soma exata em int64: cada soma é no máximo vidas x maior valor por faixa, verificado antes
+        # de multiplicar (numeradores reduzidos: no pior caso, fatores com 4 casas decimais, cabe até
+        # cerca de 1 milhão de vidas por cotação); acima disso, o lote usa inteiros do Python
+        if len(quantidades) and int(quantidades.max()) * int(tabela.max()) >= 2 ** 63:
+            return None
+
+        linhas = np.where(
+            empresarial,
+            len(tabela_individual) + (faixas_vidas * 3 + coberturas) * 2 + coparticipacoes,
+            (coberturas * 2 + coparticipacoes) * quantidade_hospitais + hospitais,
+        )
+
+        return (histogramas * tabela[linhas]).sum(axis=1)
+
+    def _finalizar_lote_numpy(self, somas, colunas, denominadores_empresariais, pontos_hospitais):
+        """Como ``_finalizar_lote_python``, vetorizado: uma divisão arredondada (meio centavo para o par) por cotação"""
+        contratos, coberturas, coparticipacoes, hospitais, quantidades_vidas, faixas_vidas = colunas
+        empresarial = np.asarray([contrato == 2 for contrato in contratos], dtype=bool)
+        quantidades = np.asarray(quantidades_vidas, dtype=np.int64)
+
+        # Familiar: centavos x desconto / BASE. Empresarial: numerador x hospital / (denominador x BASE),
+        # com o hospital valendo BASE na rede padrão
+        pontos = np.asarray([BASE if p is None else p for p in pontos_hospitais], dtype=np.int64)
+        multiplicadores = np.where(empresarial, pontos[np.asarray(hospitais, dtype=np.int64)], BASE)
+        for minimo_vidas, desconto in reversed(self.DESCONTOS_FAMILIARES):
+            multiplicadores = np.where(~empresarial & (quantidades >= minimo_vidas), desconto, multiplicadores)
+        if len(somas) and int(somas.max()) * int(multiplicadores.max()) >= 2 ** 62:
+            # Fora do alcance do int64 (grupos enormes): inteiros do Python
+            return self._finalizar_lote_python(somas.tolist(), colunas, denominadores_empresariais, pontos_hospitais)
+
+        tabela_denominadores = np.asarray(denominadores_empresariais, dtype=np.int64)
+        denominadores = np.where(empresarial, tabela_denominadores[faixas_vidas, coberturas, coparticipacoes] * BASE,
+                                 BASE)
+        quocientes, restos = np.divmod(somas * multiplicadores, denominadores)
+        quocientes += (2 * restos > denominadores) | ((2 * restos == denominadores) & (quocientes % 2 == 1))
+        return [None if contrato is None else centavos / 100 for contrato, centavos in zip(contratos, quocientes.tolist())]
+
     def obter_cobertura(self, tipo_cobertura):
         """Retorna a descrição da cobertura com base no tipo de plano"""
         coberturas = {
@@ -260,10 +657,119 @@ class SistemaCotacaoPlena:
             return f"Região não encontrada. Regiões disponíveis: {', '.join(regioes_disponiveis)}"
 
 
+
+_MANTER = object()
+
+
+class CotacaoIncremental:
+    """Cotação que guarda a quantidade de vidas e o subtotal de cada faixa etária.
+
+    Alterar cobertura, coparticipação ou hospital recalcula só os valores por faixa
+    (O(faixas)) e incluir ou remover uma vida atualiza uma única faixa (O(1)), em vez
+    de percorrer todas as vidas de novo. O valor é o mesmo de ``gerar_cotacao``, que
+    também calcula sobre o histograma de faixas.
+    """
+    
+    def __init__(self, sistema, tipo_plano_contrato, idades, tipo_cobertura="intermediario",
+                 coparticipacao="sem", hospital_premium=None):
+        if tipo_plano_contrato not in sistema.CODIGOS_CONTRATO:
+            raise ValueError(f"Tipo de plano inválido: {tipo_plano_contrato}")
+        self.sistema = sistema
+        self.tipo_plano_contrato = tipo_plano_contrato
+        self.empresarial = tipo_plano_contrato == "empresarial"
+        self.tipo_cobertura = tipo_cobertura
+        self.coparticipacao = coparticipacao
+        self.hospital_premium = hospital_premium
+        self._tabelas = sistema._tabelas_atuais()
+        self.histograma = self._tabelas.histograma(idades)
+        self.quantidade_vidas = len(idades)
+        self._recalcular_faixas()
+    
+    def _recalcular_faixas(self):
+        """Recalcula o valor por vida e o subtotal de cada faixa etária"""
+        tabelas = self._tabelas
+        pontos_hospital = tabelas.pontos_hospitais.get(self.hospital_premium)
+        
+        if self.empresarial:
+            # Valor exato por vida; o adicional de hospital incide sobre o total
+            self._faixa_vidas = self.sistema.obter_faixa_vidas(self.quantidade_vidas)
+            self._valores, self._denominador = tabelas.fracoes_faixas(self._faixa_vidas, self.tipo_cobertura,
+                                                                      self.coparticipacao)
+            self._pontos_total = pontos_hospital
+        else:
+            # Valor por vida arredondado, em centavos
+            self._valores = tabelas.centavos_faixas(self.tipo_cobertura, self.coparticipacao, pontos_hospital)
+            self._pontos_total = None
+        self.subtotais = [quantidade * valor for quantidade, valor in zip(self.histograma, self._valores)]
+    
+    def alterar(self, tipo_cobertura=None, coparticipacao=None, hospital_premium=_MANTER):
+        """Altera cobertura, coparticipação e/ou hospital premium (None = rede padrão)"""
+        if tipo_cobertura is not None:
+            self.tipo_cobertura = tipo_cobertura
+        if coparticipacao is not None:
+            self.coparticipacao = coparticipacao
+        if hospital_premium is not _MANTER:
+            self.hospital_premium = hospital_premium
+        self._recalcular_faixas()
+        return self
+    
+    def adicionar_vida(self, idade):
+        """Inclui uma vida na cotação"""
+        self._atualizar_faixa(self._tabelas.indice_faixa(idade), 1)
+        return self
+    
+    def remover_vida(self, idade):
+        """Remove uma vida da faixa etária da idade informada"""
+        faixa = self._tabelas.indice_faixa(idade)
+        if not self.histograma[faixa]:
+            raise ValueError(f"Não há vidas na faixa etária {self._tabelas.faixas_etarias[faixa]}")
+        self._atualizar_faixa(faixa, -1)
+        return self
+    
+    def _atualizar_faixa(self, faixa, variacao):
+        self.histograma[faixa] += variacao
+        self.quantidade_vidas += variacao
+        if self.empresarial and self.sistema.obter_faixa_vidas(self.quantidade_vidas) != self._faixa_vidas:
+            # Mudou a faixa de vidas: outra tabela de preços empresarial
+            self._recalcular_faixas()
+        else:
+            self.subtotais[faixa] = self.histograma[faixa] * self._valores[faixa]
+    
+    @property
+    def valor_mensal(self):
+        tabelas = self.sistema._tabelas_atuais()
+        if tabelas is not self._tabelas:
+            # Nova versão das tabelas publicada: recalcular sobre o novo retrato
+            # (as faixas etárias podem ter mudado, então o histograma é refeito)
+            idades = self.sistema._idades_do_histograma(self._tabelas, self.histograma)
+            self._tabelas = tabelas
+            self.histograma = tabelas.histograma(idades)
+            self._recalcular_faixas()
+        
+        total = sum(self.subtotais)
+        if self.empresarial:
+            return reais(self.sistema._centavos_empresarial(total, self._denominador, self._pontos_total))
+        return reais(self.sistema._centavos_familiar(total, self.quantidade_vidas))
+    
+    def como_dicionario(self):
+        """Cotação no mesmo formato de ``gerar_cotacao``"""
+        if self.empresarial:
+            tipo_texto = "Empresarial/PME"
+        else:
+            tipo_texto = "Familiar" if self.quantidade_vidas > 1 else "Individual"
+        return self.sistema._dicionario_cotacao(tipo_texto, self.quantidade_vidas, self.valor_mensal,
+                                                self.tipo_cobertura, self.coparticipacao,
+                                                self.hospital_premium)
+
+
 # Exemplo de uso do sistema de cotação
 if __name__ == "__main__":
     sistema = SistemaCotacaoPlena()
     
+    # Tabelas carregadas de tabelas_precos.json (versão em uso)
+    print(f"Tabelas de preços: versão {sistema.tabelas.versao}")
+    print("-" * 50)
+    
     # Exemplo 1: Cotação individual
     print("Exemplo 1: Cotação Individual")
     cotacao_individual = sistema.gerar_cotacao("individual", [35], "intermediario", "sem")
@@ -318,3 +824,42 @@ if __name__ == "__main__":
         for hospital in hospitais:
             print(f"- {hospital}")
         print()
+    
+    # Exemplo 6: Cotação em lote (recálculo de vários leads de uma vez)
+    print("Exemplo 6: Cotação em lote")
+    valores = sistema.gerar_cotacoes_em_lote(
+        ["individual", "familiar", "empresarial"],
+        [[35], [35, 32, 5], idades_empresa],
+        tipos_cobertura=["intermediario", "completo", "intermediario"],
+        coparticipacoes=["sem", "com", "com"]
+    )
+    for valor in valores:
+        print(f"- R$ {valor:.2f}")
+    print("-" * 50)
+    
+    # Exemplo 7: Cotação incremental (cliente reconsidera as opções)
+    print("Exemplo 7: Cotação incremental")
+    cotacao = sistema.criar_cotacao("empresarial", idades_empresa, "intermediario", "com")
+    print(f"Plena Plus com coparticipação: R$ {cotacao.valor_mensal:.2f}")
+    cotacao.alterar(tipo_cobertura="completo", coparticipacao="sem")
+    print(f"Plena Premium sem coparticipação: R$ {cotacao.valor_mensal:.2f}")
+    cotacao.adicionar_vida(52)
+    print(f"Com mais uma vida (52 anos): R$ {cotacao.valor_mensal:.2f}")
+    print("-" * 50)
+    
+    # Exemplo 8: Matriz de opções (coberturas x coparticipação x hospitais) em uma chamada
+    print("Exemplo 8: Matriz de cotações")
+    matriz = sistema.gerar_matriz_cotacoes("familiar", [35, 32, 5])
+    for (cobertura, coparticipacao, hospital), valor in matriz.items():
+        print(f"- {sistema.NOMES_PLANOS[cobertura]}, {coparticipacao} coparticipação, "
+              f"{hospital or 'rede padrão'}: R$ {valor:.2f}")
+    print("-" * 50)
+    
+    # Exemplo 9: Nova versão das tabelas (reajuste) sem reiniciar o sistema
+    print("Exemplo 9: Reajuste publicado como nova versão das tabelas")
+    antes = sistema.gerar_cotacao("familiar", [35, 32, 5], "completo", "com")["valor_mensal"]
+    fatores = dict(sistema.fatores_plano, completo=1.7)
+    sistema_teste = SistemaCotacaoPlena(tabelas=sistema.tabelas)  # retrato próprio, não afeta a fonte compartilhada
+    sistema_teste.alterar_tabelas(fatores_plano=fatores)
+    depois = sistema_teste.gerar_cotacao("familiar", [35, 32, 5], "completo", "com")["valor_mensal"]
+    print(f"Plena Premium familiar: R$ {antes:.2f} -> R$ {depois:.2f}")
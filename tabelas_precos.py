@@ -0,0 +1,294 @@
+"""
+Tabelas de Preços da Plena Saúde
+Carrega as tabelas de um arquivo versionado, compila em um retrato imutável e troca a versão em uso sem reinício
+"""
+
+import itertools
+import json
+import math
+import os
+import threading
+from types import MappingProxyType
+
+from centavos import BASE, arredondar, para_centavos, para_pontos_base
+
+ARQUIVO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tabelas_precos.json")
+
+# Tabelas que definem o preço das cotações
+TABELAS = ("tabela_precos_individual", "tabela_precos_empresarial",
+           "fatores_plano", "fatores_coparticipacao", "hospitais_premium")
+
+# Número sequencial de cada retrato compilado neste processo
+_geracoes = itertools.count(1)
+
+
+class TabelasPrecos:
+    """Retrato imutável e compilado das tabelas de preços.
+
+    Pode ser compartilhado por todas as conversas e threads sem travas: uma nova
+    versão das tabelas é sempre um novo retrato (veja ``alterar`` e ``FonteTabelas``).
+    Além das tabelas (somente leitura), guarda os vetores por faixa etária:
+    ``faixa_por_idade`` (idade -> id da faixa, de 0 até o início da última faixa),
+    ``faixas_etarias`` (id -> rótulo), ``precos_individuais`` (id -> valor) e
+    ``precos_empresariais`` (faixa de vidas -> valores por id), e as mesmas tabelas
+    em inteiros para o cálculo em ponto fixo (veja centavos): ``centavos_individuais``,
+    ``centavos_empresariais``, ``pontos_plano``, ``pontos_coparticipacao`` e
+    ``pontos_hospitais``.
+    """
+
+    __slots__ = TABELAS + ("versao", "geracao", "faixas_etarias", "idade_inicial_faixa", "faixa_por_idade",
+                           "precos_individuais", "precos_empresariais", "centavos_individuais",
+                           "centavos_empresariais", "pontos_plano", "pontos_coparticipacao", "pontos_hospitais",
+                           "_valores_faixas")
+
+    def __init__(self, dados, versao=None):
+        """Compila as tabelas de ``dados``.
+
+        Levanta ValueError se faltar alguma tabela, se as faixas tiverem lacunas,
+        sobreposições ou divergirem entre a tabela individual e as empresariais, ou
+        se um preço tiver mais de 2 casas decimais (um fator, mais de 4).
+        """
+        faltando = [nome for nome in TABELAS if nome not in dados]
+        if faltando:
+            raise ValueError(f"Tabelas ausentes: {', '.join(faltando)}")
+
+        definir = object.__setattr__
+        definir(self, "versao", versao)
+        definir(self, "geracao", next(_geracoes))
+        for nome in TABELAS:
+            if nome == "tabela_precos_empresarial":
+                tabela = {faixa: MappingProxyType(dict(valores)) for faixa, valores in dados[nome].items()}
+            else:
+                tabela = dict(dados[nome])
+            definir(self, nome, MappingProxyType(tabela))
+
+        limites = []
+        for faixa in self.tabela_precos_individual:
+            if faixa.endswith("+"):
+                inicio, fim = int(faixa[:-1]), None
+            else:
+                inicio, fim = (int(parte) for parte in faixa.split("-"))
+                if fim < inicio:
+                    raise ValueError(f"Faixa etária inválida: {faixa}")
+            limites.append((inicio, fim, faixa))
+        limites.sort(key=lambda limite: limite[0])
+
+        esperado = 0
+        for inicio, fim, faixa in limites:
+            if inicio > esperado:
+                raise ValueError(f"Lacuna nas faixas etárias antes de {faixa}")
+            if inicio < esperado:
+                raise ValueError(f"Sobreposição nas faixas etárias em {faixa}")
+            if fim is None and faixa != limites[-1][2]:
+                raise ValueError(f"Faixa aberta {faixa} deve ser a última")
+            esperado = fim + 1 if fim is not None else None
+        if esperado is not None:
+            raise ValueError("A última faixa etária deve ser aberta (ex: 59+)")
+
+        faixas_etarias = tuple(faixa for _, _, faixa in limites)
+        faixa_por_idade = []
+        for indice, (inicio, fim, _) in enumerate(limites):
+            faixa_por_idade.extend([indice] * ((fim if fim is not None else inicio) - inicio + 1))
+
+        precos_empresariais = {}
+        for faixa_vidas, tabela in self.tabela_precos_empresarial.items():
+            if set(tabela) != set(faixas_etarias):
+                raise ValueError(f"Faixas etárias da tabela empresarial {faixa_vidas} diferem da tabela individual")
+            precos_empresariais[faixa_vidas] = tuple(tabela[faixa] for faixa in faixas_etarias)
+
+        definir(self, "faixas_etarias", faixas_etarias)
+        definir(self, "idade_inicial_faixa", tuple(inicio for inicio, _, _ in limites))
+        definir(self, "faixa_por_idade", tuple(faixa_por_idade))
+        definir(self, "precos_individuais", tuple(self.tabela_precos_individual[faixa] for faixa in faixas_etarias))
+        definir(self, "precos_empresariais", MappingProxyType(precos_empresariais))
+
+        # Preços em centavos e fatores em pontos-base (conversão exata)
+        definir(self, "centavos_individuais", tuple(map(para_centavos, self.precos_individuais)))
+        definir(self, "centavos_empresariais", MappingProxyType({
+            faixa_vidas: tuple(map(para_centavos, precos)) for faixa_vidas, precos in precos_empresariais.items()}))
+        for nome, tabela in (("pontos_plano", "fatores_plano"), ("pontos_coparticipacao", "fatores_coparticipacao"),
+                             ("pontos_hospitais", "hospitais_premium")):
+            definir(self, nome, MappingProxyType({chave: para_pontos_base(fator)
+                                                  for chave, fator in getattr(self, tabela).items()}))
+        # Valores por faixa já com os fatores aplicados, calculados sob demanda
+        definir(self, "_valores_faixas", {})
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("As tabelas de preços são imutáveis; publique uma nova versão")
+
+    def __repr__(self):
+        return f"TabelasPrecos(versao={self.versao!r}, geracao={self.geracao})"
+
+    def como_dados(self):
+        """Cópia das tabelas em dicionários comuns (mesmo formato do arquivo)"""
+        dados = {"versao": self.versao}
+        for nome in TABELAS:
+            tabela = getattr(self, nome)
+            dados[nome] = {chave: dict(valor) if isinstance(valor, MappingProxyType) else valor
+                           for chave, valor in tabela.items()}
+        return dados
+
+    def alterar(self, versao=None, **tabelas):
+        """Novo retrato com algumas tabelas substituídas (este continua inalterado)"""
+        desconhecidas = set(tabelas) - set(TABELAS)
+        if desconhecidas:
+            raise ValueError(f"Tabelas desconhecidas: {', '.join(sorted(desconhecidas))}")
+        dados = self.como_dados()
+        dados.update(tabelas)
+        return TabelasPrecos(dados, self.versao if versao is None else versao)
+
+    def indice_faixa(self, idade):
+        """Retorna o id da faixa etária (posição em ``faixas_etarias``) para a idade"""
+        if idade.__class__ is not int:
+            idade = math.ceil(idade)
+        if idade < 0:
+            return 0
+        if idade >= len(self.faixa_por_idade):
+            return self.faixa_por_idade[-1]
+        return self.faixa_por_idade[idade]
+
+    def histograma(self, idades):
+        """Conta quantas vidas há em cada faixa etária (posição = id da faixa)"""
+        histograma = [0] * len(self.faixas_etarias)
+        faixa_por_idade = self.faixa_por_idade
+        ultima_idade = len(faixa_por_idade) - 1
+        for idade in idades:
+            if idade.__class__ is int and 0 <= idade <= ultima_idade:
+                histograma[faixa_por_idade[idade]] += 1
+            else:
+                histograma[self.indice_faixa(idade)] += 1
+        return histograma
+
+    def centavos_faixas(self, tipo_plano, coparticipacao, pontos_hospital=None):
+        """Valor de uma vida em cada faixa etária da tabela individual, em centavos.
+
+        Plano, coparticipação e hospital (pontos-base; None = rede padrão) são aplicados
+        em inteiros e o valor de cada vida é arredondado uma vez. Guardado neste retrato.
+        """
+        chave = (None, tipo_plano, coparticipacao, pontos_hospital)
+        valores = self._valores_faixas.get(chave)
+        if valores is None:
+            fator = self.pontos_plano[tipo_plano] * self.pontos_coparticipacao[coparticipacao]
+            if pontos_hospital is None:
+                valores = tuple(arredondar(centavos * fator, BASE ** 2) for centavos in self.centavos_individuais)
+            else:
+                valores = tuple(arredondar(centavos * fator * pontos_hospital, BASE ** 3)
+                                for centavos in self.centavos_individuais)
+            self._valores_faixas[chave] = valores
+        return valores
+
+    def fracoes_faixas(self, faixa_vidas, tipo_plano, coparticipacao):
+        """Valor exato de uma vida em cada faixa etária da tabela empresarial: (numeradores, denominador) em centavos.
+
+        Sem arredondamento (o total do grupo é arredondado só no fim). A fração é
+        reduzida para manter os inteiros pequenos. Guardado neste retrato.
+        """
+        chave = (faixa_vidas, tipo_plano, coparticipacao)
+        fracoes = self._valores_faixas.get(chave)
+        if fracoes is None:
+            fator = self.pontos_plano[tipo_plano] * self.pontos_coparticipacao[coparticipacao]
+            divisor = math.gcd(fator, BASE ** 2)
+            fracoes = (tuple(centavos * (fator // divisor) for centavos in self.centavos_empresariais[faixa_vidas]),
+                       BASE ** 2 // divisor)
+            self._valores_faixas[chave] = fracoes
+        return fracoes
+
+def carregar_tabelas(caminho=ARQUIVO_PADRAO):
+    """Lê o arquivo JSON de tabelas e retorna o retrato compilado"""
+    with open(caminho, encoding="utf-8") as arquivo:
+        dados = json.load(arquivo)
+    return TabelasPrecos(dados, dados.get("versao"))
+
+
+class FonteTabelas:
+    """Fonte das tabelas em uso, com troca atômica de versão (estilo RCU).
+
+    Quem lê apenas pega a referência ``atual`` e usa aquele retrato até o fim do
+    cálculo; a publicação de uma nova versão é uma única atribuição, sem travas
+    para os leitores. Um arquivo inválido é ignorado (a versão anterior continua
+    em uso) e o erro fica registrado em ``ultimo_erro``.
+    """
+
+    def __init__(self, caminho=ARQUIVO_PADRAO, intervalo_verificacao=None):
+        self.caminho = caminho
+        self.atual = None
+        self.recargas = 0
+        self.ultimo_erro = None
+        self._assinatura = None
+        self._trava_escrita = threading.Lock()  # serializa apenas as recargas
+        self._parar = threading.Event()
+        self._thread = None
+
+        self.recarregar()
+        if intervalo_verificacao:
+            self.iniciar_monitoramento(intervalo_verificacao)
+
+    def _assinatura_arquivo(self):
+        estado = os.stat(self.caminho)
+        return (estado.st_mtime_ns, estado.st_size)
+
+    def recarregar(self, forcar=False):
+        """Recarrega o arquivo se ele mudou; retorna True se uma nova versão foi publicada"""
+        with self._trava_escrita:
+            try:
+                assinatura = self._assinatura_arquivo()
+            except OSError as erro:
+                return self._registrar_falha(erro)
+            if not forcar and assinatura == self._assinatura:
+                return False
+
+            # Não reprocessar o mesmo arquivo (válido ou não) a cada verificação
+            self._assinatura = assinatura
+            try:
+                tabelas = carregar_tabelas(self.caminho)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as erro:
+                return self._registrar_falha(erro)
+
+            self.ultimo_erro = None
+            self.atual = tabelas
+            self.recargas += 1
+            return True
+
+    def _registrar_falha(self, erro):
+        """Mantém a versão em uso; sem nenhuma versão carregada, o erro é propagado"""
+        if self.atual is None:
+            raise erro
+        self.ultimo_erro = f"{type(erro).__name__}: {erro}"
+        return False
+
+    def publicar(self, tabelas):
+        """Publica uma versão das tabelas criada em código (ex: TabelasPrecos.alterar)"""
+        with self._trava_escrita:
+            self.atual = tabelas
+
+    def iniciar_monitoramento(self, intervalo=5.0):
+        """Verifica o arquivo a cada ``intervalo`` segundos em uma thread de fundo"""
+        if self._thread is not None:
+            return
+        self._parar.clear()
+
+        def monitorar():
+            while not self._parar.wait(intervalo):
+                self.recarregar()
+
+        self._thread = threading.Thread(target=monitorar, name="fonte-tabelas", daemon=True)
+        self._thread.start()
+
+    def parar_monitoramento(self):
+        if self._thread is not None:
+            self._parar.set()
+            self._thread.join()
+            self._thread = None
+
+
+_fonte_padrao = None
+_trava_fonte_padrao = threading.Lock()
+
+
+def fonte_padrao():
+    """Fonte compartilhada do arquivo padrão: todas as instâncias usam o mesmo retrato"""
+    global _fonte_padrao
+    with _trava_fonte_padrao:
+        if _fonte_padrao is None:
+            _fonte_padrao = FonteTabelas(ARQUIVO_PADRAO)
+        return _fonte_padrao